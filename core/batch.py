@@ -0,0 +1,154 @@
+import contextvars
+import io
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import orjson
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import Resolver404, resolve
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .db_routers import pick_read_database, use_replica
+from .middleware import replica_allowed, stick_to_primary
+
+BATCH_MAX_REQUESTS = 20
+BATCH_PATH = '/api/batch/'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+RESPONSE_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Location')
+# Заголовки исходного запроса, которые не должны попадать в подзапросы: тело и аутентификация у каждого свои
+_DROPPED_META = ('CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_AUTHORIZATION', 'HTTP_IF_NONE_MATCH',
+                 'HTTP_IF_MODIFIED_SINCE', 'QUERY_STRING', 'wsgi.input')
+
+
+class BatchError(ValueError):
+    pass
+
+
+def parse_batch(data):
+    """Проверяет тело {"requests": [{"id", "method", "path", "body", "headers"}]} и нормализует подзапросы."""
+    items = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise BatchError("requests must be a non-empty list")
+    if len(items) > BATCH_MAX_REQUESTS:
+        raise BatchError(f"at most {BATCH_MAX_REQUESTS} requests per batch")
+
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            raise BatchError(f"requests[{index}] needs a path")
+        url = urlsplit(item['path'])
+        if url.scheme or url.netloc or not url.path.startswith('/api/') or url.path.startswith(BATCH_PATH):
+            raise BatchError(f"requests[{index}]: only /api/ paths are allowed (and no nested batches)")
+        headers = item.get('headers') or {}
+        if not isinstance(headers, dict):
+            raise BatchError(f"requests[{index}]: headers must be an object")
+        parsed.append({'id': str(item.get('id', index)), 'method': str(item.get('method', 'GET')).upper(),
+                       'path': url.path, 'query': url.query, 'body': item.get('body'), 'headers': headers})
+    return parsed
+
+
+def build_request(parent, sub, user):
+    """
+    HttpRequest подзапроса на основе исходного: тот же клиент и хост, свои метод, путь, тело и заголовки.
+    Уже аутентифицированный пользователь передаётся DRF через _force_auth_user — JWT повторно не проверяется.
+    """
+    body = b'' if sub['body'] is None else orjson.dumps(sub['body'])
+    environ = {key: value for key, value in parent.META.items() if key not in _DROPPED_META}
+    environ.update({'REQUEST_METHOD': sub['method'], 'PATH_INFO': sub['path'], 'SCRIPT_NAME': '',
+                    'QUERY_STRING': sub['query'], 'CONTENT_TYPE': 'application/json',
+                    'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body)})
+    for name, value in sub['headers'].items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = str(value)
+    request = WSGIRequest(environ)
+    if user is not None:
+        request._force_auth_user = user
+    return request
+
+
+def run_one(parent, sub, user):
+    """
+    Выполняет подзапрос в обход стека middleware, поэтому маршрутизацию чтений делает сам, как
+    ReplicaRoutingMiddleware. Вызывается внутри contextvars.copy_context().run: use_replica подзапроса
+    не протекает ни в исходный запрос, ни в соседние подзапросы.
+    """
+    try:
+        match = resolve(sub['path'])
+    except Resolver404:
+        return {'id': sub['id'], 'status': 404, 'headers': {}, 'body': {'detail': 'Not found'}}
+
+    request = build_request(parent, sub, user)
+    allowed = replica_allowed(sub['method'], match.func, user.pk if user is not None else None)
+    use_replica.set(pick_read_database() if allowed else None)
+    response = match.func(request, *match.args, **match.kwargs)
+    stick_to_primary(sub['method'], response, getattr(request, 'user', None))
+    if getattr(response, 'streaming', False):
+        return {'id': sub['id'], 'status': 400, 'headers': {},
+                'body': {'detail': 'Streaming responses are not supported in a batch'}}
+    if hasattr(response, 'render'):
+        response.render()
+
+    content = response.content
+    if response.get('Content-Type', '').startswith('application/json') and content:
+        body = orjson.loads(content)
+    else:
+        body = content.decode(response.charset or settings.DEFAULT_CHARSET, errors='replace') or None
+    return {'id': sub['id'], 'status': response.status_code,
+            'headers': {name: response[name] for name in RESPONSE_HEADERS if response.has_header(name)},
+            'body': body}
+
+
+def _run_isolated(parent, sub, user):
+    return contextvars.copy_context().run(run_one, parent, sub, user)
+
+
+def _run_in_thread(context, parent, sub, user):
+    try:
+        return context.run(run_one, parent, sub, user)
+    finally:
+        # С DB_POOL это возврат соединения в пул, а не закрытие
+        connections.close_all()
+
+
+def user_from_tokens(result):
+    """Пользователь из ответа auth/tma/: дальнейшие подзапросы пакета выполняются от его имени."""
+    body = result['body']
+    access = body.get('tokens', {}).get('access') if result['status'] == 200 and isinstance(body, dict) else None
+    if not access:
+        return None
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(access))
+    except (InvalidToken, TokenError):
+        return None
+
+
+def run_batch(parent, subs, user, max_workers=4):
+    """
+    Выполняет подзапросы в процессе, по порядку. Идущие подряд безопасные (GET) подзапросы независимы
+    и при DB_POOL выполняются параллельно; запись — барьер, выполняется в текущем потоке и видит всё,
+    что было до неё. Без пула каждый поток открывал бы новое соединение с базой, поэтому GET идут подряд.
+    """
+    results = []
+    index = 0
+    while index < len(subs):
+        group = [subs[index]]
+        while (subs[index]['method'] in SAFE_METHODS and index + len(group) < len(subs)
+               and subs[index + len(group)]['method'] in SAFE_METHODS):
+            group.append(subs[index + len(group)])
+        index += len(group)
+
+        if len(group) == 1 or not settings.DB_POOL:
+            for sub in group:
+                result = _run_isolated(parent, sub, user)
+                results.append(result)
+                user = user_from_tokens(result) or user
+            continue
+        # Контекст копируется в вызывающем потоке: потоки пула не наследуют contextvars сами
+        contexts = [contextvars.copy_context() for _ in group]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(group))) as executor:
+            results.extend(executor.map(lambda context, sub: _run_in_thread(context, parent, sub, user),
+                                        contexts, group))
+    return results
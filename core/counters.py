@@ -0,0 +1,71 @@
+import atexit
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Case, F, Value, When
+
+
+class CounterBuffer:
+    """
+    Буфер приращений счётчиков в памяти процесса. Горячие строки не блокируются на каждое
+    изменение: приращения суммируются и раз в COUNTER_FLUSH_INTERVAL секунд записываются
+    одним UPDATE ... SET field = field + CASE pk ... на модель и поле.
+    При падении процесса несброшенные приращения теряются — их поправляет периодическая сверка.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.pending = defaultdict(float)
+        self.lock = threading.Lock()
+        self.timer = None
+        self.writers = {}
+
+    def register_writer(self, model, field, writer):
+        """Своя запись для поля вместо field = field + delta: writer({pk: delta}) вызывается при сбросе."""
+        self.writers[(model, field)] = writer
+
+    def add(self, model, pk, field, delta=1):
+        with self.lock:
+            self.pending[(model, field, pk)] += delta
+            if self.timer is None and self.interval > 0:
+                self.timer = threading.Timer(self.interval, self._flush_from_timer)
+                self.timer.daemon = True
+                self.timer.start()
+        if self.interval <= 0:
+            self.flush()
+
+    def _flush_from_timer(self):
+        from django.db import connections
+
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+    def flush(self):
+        """Записывает накопленные приращения; возвращает число затронутых (модель, поле, pk)."""
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(float)
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+        grouped = defaultdict(dict)
+        for (model, field, pk), delta in pending.items():
+            if delta:
+                grouped[(model, field)][pk] = delta
+        for (model, field), deltas in grouped.items():
+            if (model, field) in self.writers:
+                self.writers[(model, field)](deltas)
+                continue
+            model_field = model._meta.get_field(field)
+            cast = float if model_field.get_internal_type() == 'FloatField' else int
+            model.objects.filter(pk__in=deltas).update(**{field: F(field) + Case(
+                *[When(pk=pk, then=Value(cast(delta))) for pk, delta in deltas.items()],
+                default=Value(cast(0)), output_field=model_field)})
+        return sum(len(deltas) for deltas in grouped.values())
+
+
+counters = CounterBuffer(settings.COUNTER_FLUSH_INTERVAL)
+atexit.register(counters.flush)
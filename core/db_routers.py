@@ -0,0 +1,46 @@
+import random
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY = 'default'
+
+# База для чтений текущего read-only запроса (см. pick_read_database); None — читать с primary.
+# Выставляется ReplicaRoutingMiddleware и core.batch только на время запроса
+use_replica = ContextVar('use_replica', default=None)
+
+# Распределение чтений по базам в рамках процесса
+read_counts = Counter()
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica_')]
+
+
+def pick_read_database():
+    """
+    Случайная реплика (без реплик — primary), выбранная один раз на запрос: ETag и тело ответа
+    читаются с одной базы и видят одно и то же отставание.
+    """
+    replicas = replica_aliases()
+    return random.choice(replicas) if replicas else PRIMARY
+
+
+class PrimaryReplicaRouter:
+    """Записи всегда на primary; чтения — на базу, выбранную для запроса, если он разрешил реплики."""
+
+    def db_for_read(self, model, **hints):
+        alias = use_replica.get() or PRIMARY
+        read_counts[alias] += 1
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -0,0 +1,35 @@
+def lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets: прореживает ряд [(x, y, ...), ...], отсортированный по x,
+    до threshold точек, сохраняя форму графика (пики и провалы). Первая и последняя точки остаются,
+    лишние элементы кортежей (например, исходная дата) передаются как есть.
+    """
+    if threshold < 3:
+        raise ValueError("threshold must be at least 3")
+    n = len(points)
+    if threshold >= n:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        next_start, next_end = end, min(int((i + 2) * bucket_size) + 1, n)
+        next_bucket = points[next_start:next_end] or [points[-1]]
+        avg_x = sum(point[0] for point in next_bucket) / len(next_bucket)
+        avg_y = sum(point[1] for point in next_bucket) / len(next_bucket)
+
+        ax, ay = points[a][0], points[a][1]
+        best_area, best = -1, start
+        for j in range(start, end):
+            x, y = points[j][0], points[j][1]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best_area, best = area, j
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
@@ -0,0 +1,40 @@
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+
+
+def parse_fields(raw, allowed):
+    """
+    Разбирает ?fields=a,b в кортеж полей в порядке allowed; id возвращается всегда.
+    None — параметр не передан, нужны все поля.
+    """
+    if raw is None:
+        return None
+    requested = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = sorted(requested - set(allowed))
+    if unknown:
+        raise ValidationError({FIELDS_PARAM: f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"})
+    return tuple(name for name in allowed if name in requested or name == 'id')
+
+
+class SparseFieldsMixin:
+    """
+    ?fields= для APIView: выбранные поля лежат в self.requested_fields. Неизвестные поля
+    отклоняются в initial() — до аутентификации и любых запросов к БД.
+    """
+    sparse_fields = ()
+    requested_fields = None
+
+    def initial(self, request, *args, **kwargs):
+        self.requested_fields = parse_fields(request.query_params.get(FIELDS_PARAM), self.sparse_fields)
+        super().initial(request, *args, **kwargs)
+
+
+class SparseFieldsSerializerMixin:
+    """Сериализатор с аргументом fields: остальные поля убираются и не вычисляются."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
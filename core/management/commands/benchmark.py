@@ -0,0 +1,248 @@
+import asyncio
+import gzip
+import resource
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from django.db.models import Count, Sum
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.renderers import ORJSONRenderer
+from dishes.models import Dish, DishCooccurrence, DishNeighbors, SavedDish
+from dishes.recommendations import rebuild_cooccurrence, refresh_neighbors
+from dishes.serializers import DishSerializer, dish_rows
+from training.archive import ARCHIVE_BATCH_USERS, archive_users, iter_history
+from training.models import Training
+from users.models import Notification, User
+from users.notifications import GLOBAL_RATE, send_reminders
+
+
+def timed(function, repeat):
+    """Время вызовов function в мс: (медиана, p95)."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[max(0, int(len(samples) * 0.95) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Замеры производительности на данных generate_synthetic_data. Запросы идут через тестовый клиент '
+            'в процессе от имени пользователя с наибольшим числом сохранённых блюд; сценарии, которые '
+            'меняют данные, откатывают свою транзакцию.')
+
+    SCENARIOS = ('connections', 'dish_lists', 'conditional_get', 'archive', 'reminders', 'recommendations')
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f"Сценарии (по умолчанию все): {', '.join(self.SCENARIOS)}")
+        parser.add_argument('--repeat', type=int, default=200, help='Сколько раз повторять каждый замер')
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(self.SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        self.user = User.objects.annotate(saves=Count('saveddish')).order_by('-saves', 'id').first()
+        if self.user is None:
+            raise CommandError("No users: run generate_synthetic_data first")
+        self.client = Client(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(self.user).access_token))
+        self.repeat = options['repeat']
+
+        self.stdout.write(f"database: {connection.vendor}, user {self.user.pk}, repeat {self.repeat}")
+        for scenario in options['scenarios'] or self.SCENARIOS:
+            self.stdout.write(f"\n[{scenario}]")
+            getattr(self, f'bench_{scenario}')()
+        self.stdout.write(self.style.SUCCESS("\nDone"))
+
+    def report(self, label, function):
+        median, p95 = timed(function, self.repeat)
+        self.stdout.write(f"  {label:<56} median {median:8.2f} ms   p95 {p95:8.2f} ms")
+        return median
+
+    def bench_connections(self, threads=8):
+        """
+        GET профиля из threads параллельных клиентов: новое соединение на каждый запрос (CONN_MAX_AGE=0),
+        постоянные соединения потоков (CONN_MAX_AGE) и пул psycopg 3 (DB_POOL, только PostgreSQL).
+        """
+        settings_dict = connection.settings_dict
+        original = settings_dict['CONN_MAX_AGE'], settings_dict['OPTIONS'].get('pool')
+        modes = [('new connection per request', 0, None), ('persistent connections', 600, None)]
+        if connection.vendor == 'postgresql' and is_psycopg3:
+            modes.append(('pool', 0, {'min_size': threads, 'max_size': threads}))
+        else:
+            self.stdout.write("  pool: skipped, needs PostgreSQL with psycopg 3")
+
+        token = 'Bearer ' + str(RefreshToken.for_user(self.user).access_token)
+        requests = max(1, self.repeat // threads)
+
+        def client_thread(samples):
+            client = Client(HTTP_AUTHORIZATION=token)
+            try:
+                for _ in range(requests):
+                    started = time.perf_counter()
+                    client.get('/api/profile/')
+                    samples.append((time.perf_counter() - started) * 1000)
+            finally:
+                # Соединения потоковые: без закрытия постоянные соединения потока останутся открытыми
+                connections.close_all()
+
+        try:
+            for label, max_age, pool in modes:
+                connection.close()
+                settings_dict['CONN_MAX_AGE'] = max_age
+                settings_dict['OPTIONS'].pop('pool', None)
+                if pool:
+                    settings_dict['OPTIONS']['pool'] = pool
+                samples = []
+                started = time.perf_counter()
+                with ThreadPoolExecutor(threads) as executor:
+                    list(executor.map(client_thread, [samples] * threads))
+                elapsed = time.perf_counter() - started
+                if pool:
+                    connection.close_pool()
+                samples.sort()
+                median, p95 = samples[len(samples) // 2], samples[max(0, int(len(samples) * 0.95) - 1)]
+                self.stdout.write(f"  GET /api/profile/, {label:<28} {threads} threads: {len(samples) / elapsed:7.1f} "
+                                  f"req/s   median {median:8.2f} ms   p95 {p95:8.2f} ms")
+        finally:
+            connection.close()
+            settings_dict['CONN_MAX_AGE'] = original[0]
+            settings_dict['OPTIONS'].pop('pool', None)
+            if original[1] is not None:
+                settings_dict['OPTIONS']['pool'] = original[1]
+
+    def bench_dish_lists(self, query='Борщ'):
+        """Список блюд: DishSerializer по экземплярам + JSONRenderer против values()-строк + orjson."""
+        dishes = Dish.objects.filter(name__icontains=query).order_by('id')
+        context = {'request': SimpleNamespace(user=self.user)}
+        self.stdout.write(f"  {dishes.count()} dishes matching {query!r}")
+        self.report('DishSerializer + JSONRenderer',
+                    lambda: JSONRenderer().render(DishSerializer(dishes, many=True, context=context).data))
+        self.report('dish_rows + ORJSONRenderer', lambda: ORJSONRenderer().render(dish_rows(dishes, self.user)))
+        self.report(f'GET /api/dishes/?q={query}', lambda: self.client.get('/api/dishes/', {'q': query}))
+
+        body = self.client.get('/api/dishes/', {'q': query}).content
+        self.stdout.write(f"  response body: {len(body)} bytes, gzip {len(gzip.compress(body))} bytes")
+
+    def bench_conditional_get(self):
+        """Полный ответ против 304 по If-None-Match для профиля и списка сохранённых блюд."""
+        for path in ('/api/profile/', '/api/dishes/my/'):
+            etag = self.client.get(path)['ETag']
+            for label, headers in (('200', {}), ('304', {'HTTP_IF_NONE_MATCH': etag})):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(path, **headers)
+                if str(response.status_code) != label:
+                    raise CommandError(f"GET {path} answered {response.status_code}, expected {label}")
+                self.stdout.write(f"  {path} {label}: {len(queries)} queries, {len(response.content)} bytes")
+                self.report(f'GET {path} -> {label}', lambda: self.client.get(path, **headers))
+
+    def bench_archive(self, older_than_days=180):
+        """Архивация тренировок старше older_than_days: размер горячей таблицы и чтения до и после."""
+        def measure(stage):
+            self.stdout.write(f"  {stage}: {Training.objects.count()} rows in Training")
+            self.report(f'{stage}: Sum(callories) over Training', lambda: Training.objects.aggregate(Sum('callories')))
+            self.report(f'{stage}: history, first 100', lambda: list(islice(iter_history(self.user), 100)))
+            self.report(f'{stage}: history, all', lambda: list(iter_history(self.user)))
+
+        cutoff = timezone.now() - timedelta(days=older_than_days)
+        with transaction.atomic():
+            measure('before')
+            user_ids = list(Training.objects.filter(created_at__lt=cutoff).order_by('user_id')
+                            .values_list('user_id', flat=True).distinct())
+            started = time.perf_counter()
+            totals = [0, 0, 0]
+            for start in range(0, len(user_ids), ARCHIVE_BATCH_USERS):
+                archived = archive_users(user_ids[start:start + ARCHIVE_BATCH_USERS], cutoff)
+                totals = [total + value for total, value in zip(totals, archived)]
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"  archived {totals[0]} trainings of {len(user_ids)} users in {elapsed:.1f}s "
+                              f"({totals[0] / elapsed:.0f} rows/s): {totals[1] / 1024:.0f} KiB JSON -> "
+                              f"{totals[2] / 1024:.0f} KiB compressed")
+            measure('after')
+            transaction.set_rollback(True)
+
+    def bench_reminders(self, recipients=300, latency=0.05):
+        """Рассылка напоминаний recipients пользователям через stub Bot API с задержкой ответа latency секунд."""
+        import httpx
+
+        async def bot_api(request):
+            await asyncio.sleep(latency)
+            return httpx.Response(200, json={'ok': True})
+
+        with transaction.atomic():
+            ids = list(User.objects.filter(telegram_id__isnull=False).order_by('id').values_list('id', flat=True)
+                       [:recipients])
+            User.objects.filter(id__in=ids).update(trial_status=User.TrialStatus.IN_PROGRESS,
+                                                   trial_end_date=timezone.now() + timedelta(hours=12))
+            started = time.perf_counter()
+            sent, failed = send_reminders(Notification.Kind.TRIAL_EXPIRY, timedelta(hours=24),
+                                          transport=httpx.MockTransport(bot_api))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"  {sent} sent, {failed} failed in {elapsed:.2f}s: {sent / elapsed:.1f} msg/s "
+                              f"(limit {GLOBAL_RATE} msg/s, stub latency {latency * 1000:.0f} ms)")
+            transaction.set_rollback(True)
+
+    def bench_recommendations(self):
+        """
+        Рекомендации: полная сборка матрицы совместных сохранений и соседей (время, пик памяти Python,
+        размер матрицы), инкрементальное обновление на одно сохранение и чтение рекомендаций.
+        """
+        def build(label, function):
+            tracemalloc.start()
+            started = time.perf_counter()
+            result = function()
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.stdout.write(f"  {label}: {elapsed:.1f}s, Python heap peak {peak / 2 ** 20:.1f} MiB")
+            return result
+
+        saves = SavedDish.objects.filter(is_saved=True)
+        self.stdout.write(f"  {User.objects.count()} users, {Dish.objects.count()} dishes, {saves.count()} saves")
+        with transaction.atomic():
+            build('rebuild_cooccurrence', rebuild_cooccurrence)
+            cells = DishCooccurrence.objects.count()
+            self.stdout.write(f"  matrix: {cells} non-zero cells ({cells / max(1, Dish.objects.count()) ** 2:.2e} "
+                              f"density){self.relation_size(DishCooccurrence)}")
+            refreshed = build('refresh_neighbors', refresh_neighbors)
+            self.stdout.write(f"  neighbors: {refreshed} dishes{self.relation_size(DishNeighbors)}")
+            self.stdout.write(f"  process max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+
+            # Одно сохранение: инкрементальное обновление матрицы + пересчёт соседей только помеченных блюд
+            saved_ids = set(saves.filter(user=self.user).values_list('dish_id', flat=True))
+            candidates = Dish.objects.exclude(id__in=saved_ids).order_by('-save_count', 'id')
+            state = {'dish': candidates.values_list('id', flat=True)[0], 'saved': False}
+
+            def toggle(refresh):
+                state['saved'] = not state['saved']
+                self.client.post('/api/dishes/my/', {'id': state['dish'], 'is_saved': state['saved']},
+                                 content_type='application/json')
+                if refresh:
+                    refresh_neighbors()
+
+            self.stdout.write(f"  user {self.user.pk} has {len(saved_ids)} saves, toggling dish {state['dish']}")
+            self.report('POST /api/dishes/my/ save toggle', lambda: toggle(False))
+            refresh_neighbors()
+            self.report('save toggle + refresh_neighbors of marked dishes', lambda: toggle(True))
+            self.report('GET /api/dishes/recommended/', lambda: self.client.get('/api/dishes/recommended/'))
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def relation_size(model):
+        if connection.vendor != 'postgresql':
+            return ''
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_total_relation_size(%s)", [model._meta.db_table])
+            return f", {cursor.fetchone()[0] / 2 ** 20:.0f} MiB on disk"
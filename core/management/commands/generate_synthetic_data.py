@@ -0,0 +1,93 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max
+
+from core.synthetic import chunks, reset_sequences, write_dishes_chunk, write_users_chunk
+from dishes.models import CatalogVersion, Dish
+from dishes.popularity import reconcile_save_counts
+from dishes.recommendations import rebuild_cooccurrence, refresh_neighbors
+from users.models import User
+
+
+def _init_worker():
+    # На платформах со spawn (Windows, macOS) дочерний процесс стартует без настроенного Django
+    django.setup()
+
+
+def _run(function, *args):
+    return function(*args)
+
+
+class Command(BaseCommand):
+    help = ('Генерирует детерминированный синтетический набор данных: пользователи, блюда, сохранённые блюда и '
+            'тренировки. Один и тот же --seed и --anchor-date на пустой базе дают одинаковые данные. '
+            'Производные данные (счётчики сохранений, матрица совместных сохранений, соседи) пересчитываются '
+            'в конце, если не указан --skip-derived.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Число пользователей (от 1k до 10M)')
+        parser.add_argument('--dishes', type=int, help='Число блюд (по умолчанию users / 10, но не меньше 500)')
+        parser.add_argument('--saved-per-user', type=int, default=5, help='Среднее число сохранённых блюд')
+        parser.add_argument('--trainings-per-user', type=int, default=10, help='Среднее число тренировок')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--anchor-date', type=date.fromisoformat, default=date.today(),
+                            help='Дата «сегодня» для генерируемых дат, YYYY-MM-DD')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Пользователей (или блюд) в одном чанке')
+        parser.add_argument('--workers', type=int, default=4, help='Число процессов (на SQLite всегда 1)')
+        parser.add_argument('--skip-derived', action='store_true',
+                            help='Не пересчитывать счётчики и рекомендации (например, чтобы замерить их отдельно)')
+
+    def handle(self, *args, **options):
+        users_total = options['users']
+        dishes_total = options['dishes'] if options['dishes'] is not None else max(500, users_total // 10)
+        if users_total < 0 or dishes_total < 0 or options['chunk_size'] < 1:
+            raise CommandError("--users, --dishes and --chunk-size must be positive")
+        seed, anchor = options['seed'], options['anchor_date']
+
+        # SQLite допускает только одного писателя, параллельные чанки упрутся в блокировку
+        workers = 1 if connection.vendor == 'sqlite' else max(1, options['workers'])
+        first_dish = (Dish.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        first_user = (User.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+        tasks = [(write_dishes_chunk, seed, chunk, first_id, count, anchor)
+                 for chunk, first_id, count in chunks(first_dish, dishes_total, options['chunk_size'])]
+        user_tasks = [(write_users_chunk, seed, chunk, first_id, count, (first_dish, dishes_total), anchor,
+                       options['saved_per_user'], options['trainings_per_user'])
+                      for chunk, first_id, count in chunks(first_user, users_total, options['chunk_size'])]
+
+        started = time.monotonic()
+        # Блюда пишем раньше пользователей: на них ссылаются сохранённые блюда
+        self._execute(tasks, workers)
+        self.stdout.write(f"dishes: {dishes_total} in {time.monotonic() - started:.1f}s")
+        totals = [0, 0, 0]
+        for written in self._execute(user_tasks, workers):
+            totals = [total + count for total, count in zip(totals, written)]
+        reset_sequences()
+        CatalogVersion.bump()
+
+        if not options['skip_derived']:
+            # write_rows пишет строки напрямую (COPY или executemany) в обход буфера счётчиков и матрицы —
+            # пересчитываем их из SavedDish.
+            # trend_score остаётся нулевым: у сгенерированных сохранений нет времени
+            derived_started = time.monotonic()
+            reconcile_save_counts()
+            rebuild_cooccurrence()
+            refresh_neighbors()
+            self.stdout.write(f"derived data in {time.monotonic() - derived_started:.1f}s")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {dishes_total} dishes, {totals[0]} users, {totals[1]} saved dishes, {totals[2]} trainings "
+            f"in {time.monotonic() - started:.1f}s"))
+
+    def _execute(self, tasks, workers):
+        if workers == 1 or len(tasks) < 2:
+            return [_run(*task) for task in tasks]
+        # Соединения родителя не должны наследоваться форкнутыми воркерами
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            return list(executor.map(_run, *zip(*tasks)))
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Холодный старт воркера: настройки + реестр приложений, затем WSGI-обработчик с middleware и URLconf
+STARTUP_SNIPPET = (
+    "import time\n"
+    "t0 = time.perf_counter()\n"
+    "import django\n"
+    "django.setup()\n"
+    "t1 = time.perf_counter()\n"
+    "from django.core.wsgi import get_wsgi_application\n"
+    "application = get_wsgi_application()\n"
+    "from django.urls import get_resolver\n"
+    "get_resolver().url_patterns\n"
+    "t2 = time.perf_counter()\n"
+    "print(f'{t1 - t0} {t2 - t0}')\n"
+)
+
+
+def parse_importtime(stderr):
+    """
+    Разбирает вывод `python -X importtime`: строки вида
+    "import time:  self [us] | cumulative | imported package".
+    Возвращает список (module, self_us, cumulative_us).
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Профилирует холодный старт воркера: время импорта модулей и готовности приложений.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=25, help='Сколько самых тяжёлых модулей показать')
+        parser.add_argument('--budget', type=float, default=None,
+                            help='Бюджет старта в секундах; при превышении команда завершается с ошибкой')
+        parser.add_argument('--top-level', action='store_true',
+                            help='Показывать только пакеты верхнего уровня (django, rest_framework, ...)')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_SNIPPET], env=env,
+                                cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(f"Startup failed:\n{result.stderr[-2000:]}")
+
+        setup_time, total_time = (float(value) for value in result.stdout.split()[-2:])
+        rows = parse_importtime(result.stderr)
+        if options['top_level']:
+            rows = [row for row in rows if '.' not in row[0]]
+
+        self.stdout.write(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for module, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:options['limit']]:
+            self.stdout.write(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {module}")
+
+        self.stdout.write('')
+        self.stdout.write(f"django.setup() (settings + apps ready): {setup_time * 1000:.1f} ms")
+        self.stdout.write(f"WSGI application + URLconf loaded:      {total_time * 1000:.1f} ms")
+
+        budget = options['budget']
+        if budget is not None:
+            if total_time > budget:
+                raise CommandError(f"Startup took {total_time:.3f}s, budget is {budget:.3f}s")
+            self.stdout.write(self.style.SUCCESS(f"Within budget of {budget:.3f}s"))
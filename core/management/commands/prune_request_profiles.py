@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core.profiling import prune_profiles
+
+
+class Command(BaseCommand):
+    help = ('Удаляет профили запросов старше PROFILING_RETENTION_DAYS и сверх PROFILING_MAX_ROWS. '
+            'Middleware чистит таблицу и сама, но редко — для точного лимита запускать периодически.')
+
+    def handle(self, *args, **options):
+        deleted = prune_profiles()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} request profiles"))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import get_sink, prune_published, publish_batch, publisher_lag
+
+# Как часто публикатор чистит опубликованные события, секунд
+PRUNE_INTERVAL = 600
+
+
+class Command(BaseCommand):
+    help = ('Публикует события из outbox пачками (Kafka или другой приёмник из OUTBOX_SINK) и удаляет '
+            'опубликованные старше OUTBOX_RETENTION_DAYS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно, а не до опустошения outbox')
+        parser.add_argument('--interval', type=float, default=1.0, help='Пауза при пустом outbox в режиме --loop')
+
+    def handle(self, *args, **options):
+        sink = get_sink()
+        sent_total = compacted_total = 0
+        started = time.monotonic()
+        pruned_at = None
+        while True:
+            lag = publisher_lag()
+            sent, compacted = publish_batch(sink, batch_size=options['batch_size'])
+            sent_total += sent
+            compacted_total += compacted
+            if sent or compacted:
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"sent {sent} compacted {compacted}, lag {lag:.1f}s, "
+                                  f"throughput {(sent_total + compacted_total) / elapsed:.0f} events/s")
+                continue
+            # Чистим, когда outbox разобран: удаление не отнимает время у отстающей публикации
+            if pruned_at is None or time.monotonic() - pruned_at > PRUNE_INTERVAL:
+                pruned = prune_published()
+                pruned_at = time.monotonic()
+                if pruned:
+                    self.stdout.write(f"pruned {pruned} published events")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Published {sent_total} events, compacted {compacted_total}"))
@@ -0,0 +1,129 @@
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.settings import api_settings
+
+from .db_routers import pick_read_database, use_replica
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_KEY = 'db:sticky:{user_id}'
+
+
+def _token_user_id(request):
+    """
+    id пользователя из JWT без проверки подписи: нужен только для выбора базы
+    до аутентификации DRF, подделка лишь отправит чтения на primary.
+    """
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return None
+    try:
+        payload = jwt.decode(header[7:], options={'verify_signature': False})
+    except jwt.InvalidTokenError:
+        return None
+    return payload.get(api_settings.USER_ID_CLAIM)
+
+
+def replica_allowed(method, view_func, user_id):
+    """Можно ли читать с реплики: безопасный метод, view с use_read_replica и пользователь не прилип к primary."""
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if method not in SAFE_METHODS or not getattr(view_class, 'use_read_replica', False):
+        return False
+    return not (user_id is not None and cache.get(STICKY_KEY.format(user_id=user_id)))
+
+
+def stick_to_primary(method, response, user):
+    """После успешной записи чтения пользователя REPLICA_STICKY_SECONDS идут на primary."""
+    if method not in SAFE_METHODS and response.status_code < 400 and user is not None and user.is_authenticated:
+        cache.set(STICKY_KEY.format(user_id=user.pk), True, timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Разрешает чтение с реплик для безопасных запросов к view с use_read_replica = True; реплика
+    выбирается одна на весь запрос.
+    После успешной записи пользователь «прилипает» к primary на REPLICA_STICKY_SECONDS,
+    чтобы не увидеть устаревшие данные. Подзапросы пакета (core.batch) маршрутизируются теми же функциями.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        # Пакет сам по себе ничего не пишет: прилипание решают его подзапросы
+        request._routes_subrequests = getattr(view_class, 'routes_subrequests', False)
+        if replica_allowed(request.method, view_func, _token_user_id(request)):
+            request._replica_token = use_replica.set(pick_read_database())
+        return None
+
+    def process_response(self, request, response):
+        token = getattr(request, '_replica_token', None)
+        if token is not None:
+            use_replica.reset(token)
+        elif not getattr(request, '_routes_subrequests', False):
+            # DRF переносит пользователя из JWT в исходный HttpRequest
+            stick_to_primary(request.method, response, getattr(request, 'user', None))
+        return response
+
+
+class RouteProfileMiddleware:
+    """
+    Запускает SESSION_MIDDLEWARE только для маршрутов, которым нужны сессии (админка).
+    Запросы с префиксами из LEAN_MIDDLEWARE_PREFIXES (JWT API) идут мимо этой цепочки сразу дальше.
+    Хуки process_view/process_exception/process_template_response вложенных middleware
+    вызываются в том же порядке, в каком их вызвал бы Django, стой они прямо в MIDDLEWARE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.view_hooks, self.template_response_hooks, self.exception_hooks = [], [], []
+
+        handler = convert_exception_to_response(get_response)
+        for path in reversed(settings.SESSION_MIDDLEWARE):
+            try:
+                middleware = import_string(path)(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(middleware, 'process_view'):
+                self.view_hooks.insert(0, middleware.process_view)
+            if hasattr(middleware, 'process_template_response'):
+                self.template_response_hooks.append(middleware.process_template_response)
+            if hasattr(middleware, 'process_exception'):
+                self.exception_hooks.append(middleware.process_exception)
+            handler = convert_exception_to_response(middleware)
+        self.session_chain = handler
+
+    @staticmethod
+    def is_lean(request):
+        return request.path_info.startswith(settings.LEAN_MIDDLEWARE_PREFIXES)
+
+    def __call__(self, request):
+        if self.is_lean(request):
+            return self.get_response(request)
+        return self.session_chain(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.is_lean(request):
+            return None
+        for hook in self.view_hooks:
+            response = hook(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_template_response(self, request, response):
+        if not self.is_lean(request):
+            for hook in self.template_response_hooks:
+                response = hook(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        if self.is_lean(request):
+            return None
+        for hook in self.exception_hooks:
+            response = hook(request, exception)
+            if response is not None:
+                return response
+        return None
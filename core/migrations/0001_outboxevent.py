@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:13
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(max_length=64, verbose_name='Тип события')),
+                ('key', models.CharField(max_length=64, verbose_name='Ключ партиционирования')),
+                ('compaction_key', models.CharField(blank=True, max_length=128, null=True, verbose_name='Ключ компакции')),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Данные')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('published_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата публикации')),
+            ],
+            options={
+                'verbose_name': 'Событие outbox',
+                'verbose_name_plural': 'События outbox',
+                'indexes': [models.Index(fields=['published_at', 'id'], name='core_outbox_publish_5b3c29_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_outboxevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('path', models.CharField(max_length=255, verbose_name='Путь')),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='Код ответа')),
+                ('duration_ms', models.FloatField(db_index=True, verbose_name='Длительность, мс')),
+                ('sql_count', models.PositiveIntegerField(default=0, verbose_name='SQL-запросов')),
+                ('sql_ms', models.FloatField(default=0, verbose_name='Время SQL, мс')),
+                ('samples', models.PositiveIntegerField(default=0, verbose_name='Сэмплов стека')),
+                ('stacks', models.BinaryField(verbose_name='Стеки (zlib, collapsed)')),
+                ('queries', models.BinaryField(verbose_name='SQL (zlib, JSON)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_changes(apps, schema_editor):
+    # Текущее состояние попадает в журнал одной вставкой INSERT ... SELECT на тип сущности,
+    # чтобы клиент мог начать синхронизацию с since=0
+    SyncChange = apps.get_model('core', 'SyncChange')
+    sources = [
+        ('profile', apps.get_model('users', 'User'), 'id', 'id', ''),
+        ('saved_dish', apps.get_model('dishes', 'SavedDish'), 'user_id', 'dish_id', ' WHERE is_saved = %s'),
+        ('training', apps.get_model('training', 'Training'), 'user_id', 'id', ''),
+        ('measurement', apps.get_model('users', 'BodyMeasurement'), 'user_id', 'id', ''),
+    ]
+    quote = schema_editor.quote_name
+    now = timezone.now()
+    with schema_editor.connection.cursor() as cursor:
+        for entity, model, user_column, id_column, where in sources:
+            params = [entity, False, now] + ([True] if where else [])
+            cursor.execute(
+                f"INSERT INTO {quote(SyncChange._meta.db_table)} (user_id, entity, entity_id, deleted, created_at) "
+                f"SELECT {quote(user_column)}, %s, {quote(id_column)}, %s, %s FROM {quote(model._meta.db_table)}"
+                f"{where} ORDER BY {quote(id_column)}", params)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_requestprofile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('users', '0008_user_friends'),
+        ('dishes', '0004_dish_image'),
+        ('training', '0003_trainingarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=32, verbose_name='Тип сущности')),
+                ('entity_id', models.BigIntegerField(verbose_name='id сущности')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Удалена')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата изменения')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Изменение для синхронизации',
+                'verbose_name_plural': 'Изменения для синхронизации',
+                'indexes': [models.Index(fields=['user', 'id'], name='core_syncch_user_id_921deb_idx')],
+                'unique_together': {('user', 'entity', 'entity_id')},
+            },
+        ),
+        migrations.RunPython(backfill_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def backfill_sequences(apps, schema_editor):
+    # Старые токены клиентов — глобальные id журнала: seq = id и счётчик с максимума их не обесценивают
+    SyncChange = apps.get_model('core', 'SyncChange')
+    SyncSequence = apps.get_model('core', 'SyncSequence')
+    SyncChange.objects.update(seq=F('id'))
+    SyncSequence.objects.bulk_create(
+        [SyncSequence(user_id=user_id, value=last) for user_id, last in
+         SyncChange.objects.values('user_id').annotate(last=Max('id')).values_list('user_id', 'last').order_by()],
+        batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_syncchange'),
+        ('users', '0008_user_friends'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncSequence',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Последний номер')),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='syncchange',
+            name='core_syncch_user_id_921deb_idx',
+        ),
+        migrations.AddField(
+            model_name='syncchange',
+            name='seq',
+            field=models.BigIntegerField(default=0, verbose_name='Номер изменения'),
+        ),
+        migrations.AddIndex(
+            model_name='syncchange',
+            index=models.Index(fields=['user', 'seq'], name='syncchange_user_seq_idx'),
+        ),
+        migrations.RunPython(backfill_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class OutboxEvent(models.Model):
+    """
+    Доменное событие, записанное в той же транзакции, что и изменение данных.
+    Публикатор (publish_outbox) вычитывает неопубликованные события пачками по возрастанию id.
+    """
+    event_type = models.CharField(max_length=64, verbose_name='Тип события')
+    key = models.CharField(max_length=64, verbose_name='Ключ партиционирования')  # обычно id пользователя
+    compaction_key = models.CharField(max_length=128, null=True, blank=True, verbose_name='Ключ компакции')
+    payload = models.JSONField(encoder=DjangoJSONEncoder, default=dict, verbose_name='Данные')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    published_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Событие outbox'
+        verbose_name_plural = 'События outbox'
+        indexes = [models.Index(fields=['published_at', 'id'])]
+
+    def __str__(self):
+        return f"{self.event_type} [{self.key}]"
+
+
+class RequestProfile(models.Model):
+    """Профиль выборочного запроса: сжатые collapsed-стеки (для flamegraph) и выполненный SQL."""
+    method = models.CharField(max_length=10, verbose_name='Метод')
+    path = models.CharField(max_length=255, verbose_name='Путь')
+    status_code = models.PositiveSmallIntegerField(verbose_name='Код ответа')
+    duration_ms = models.FloatField(db_index=True, verbose_name='Длительность, мс')
+    sql_count = models.PositiveIntegerField(default=0, verbose_name='SQL-запросов')
+    sql_ms = models.FloatField(default=0, verbose_name='Время SQL, мс')
+    samples = models.PositiveIntegerField(default=0, verbose_name='Сэмплов стека')
+    stacks = models.BinaryField(verbose_name='Стеки (zlib, collapsed)')
+    queries = models.BinaryField(verbose_name='SQL (zlib, JSON)')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата')
+
+    class Meta:
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+
+    def __str__(self):
+        return f"{self.method} {self.path} {self.duration_ms:.0f} мс"
+
+
+class SyncSequence(models.Model):
+    """
+    Счётчик номеров журнала синхронизации пользователя. Отдельная строка, а не строка пользователя:
+    запись номеров не конкурирует с правками профиля и другими UPDATE пользователя.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name='+', verbose_name='Пользователь')
+    value = models.BigIntegerField(default=0, verbose_name='Последний номер')
+
+
+class SyncChange(models.Model):
+    """
+    Журнал изменений для дельта-синхронизации. seq — монотонный номер изменения в пределах пользователя;
+    на каждую сущность пользователя хранится одна строка с последним номером, поэтому журнал растёт
+    с числом сущностей, а не правок.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+',
+                             verbose_name='Пользователь')
+    seq = models.BigIntegerField(default=0, verbose_name='Номер изменения')
+    entity = models.CharField(max_length=32, verbose_name='Тип сущности')
+    entity_id = models.BigIntegerField(verbose_name='id сущности')
+    deleted = models.BooleanField(default=False, verbose_name='Удалена')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата изменения')
+
+    class Meta:
+        verbose_name = 'Изменение для синхронизации'
+        verbose_name_plural = 'Изменения для синхронизации'
+        unique_together = ('user', 'entity', 'entity_id')
+        indexes = [models.Index(fields=['user', 'seq'], name='syncchange_user_seq_idx')]
+
+    def __str__(self):
+        return f"{self.entity}:{self.entity_id} [{self.user_id}]"
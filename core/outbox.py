@@ -0,0 +1,140 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent
+
+# Ключ advisory-блокировки публикатора outbox в Postgres
+PUBLISHER_LOCK_ID = 7_305_869_112
+
+
+def publish_event(event_type, key, payload, compaction_key=None):
+    """
+    Записывает событие в outbox. Вызывать внутри transaction.atomic() вместе с изменением,
+    которое оно описывает: событие появится тогда и только тогда, когда изменение закоммичено.
+    """
+    return OutboxEvent.objects.create(event_type=event_type, key=str(key), payload=payload,
+                                      compaction_key=compaction_key)
+
+
+def publish_events(events):
+    """
+    Пакетный вариант publish_event одним INSERT.
+    events — итерируемое кортежей (event_type, key, payload, compaction_key).
+    """
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(event_type=event_type, key=str(key), payload=payload, compaction_key=compaction_key)
+        for event_type, key, payload, compaction_key in events])
+
+
+class MemorySink:
+    """Приёмник для тестов: складывает сообщения в список."""
+
+    def __init__(self, **options):
+        self.messages = []
+
+    def send(self, topic, key, value):
+        self.messages.append((topic, key, value))
+
+    def flush(self):
+        pass
+
+
+class FileSink:
+    """Пишет сообщения в файл JSON Lines."""
+
+    def __init__(self, path='outbox.jsonl', **options):
+        self.path = path
+        self.buffer = []
+
+    def send(self, topic, key, value):
+        self.buffer.append(json.dumps({'topic': topic, 'key': key, 'value': value}, ensure_ascii=False))
+
+    def flush(self):
+        with open(self.path, 'a', encoding='utf-8') as output:
+            output.writelines(line + '\n' for line in self.buffer)
+        self.buffer = []
+
+
+class KafkaSink:
+    """Kafka через confluent-kafka; ключ сообщения — id пользователя, поэтому порядок внутри партиции сохраняется."""
+
+    def __init__(self, **options):
+        from confluent_kafka import Producer  # импорт только в процессе публикатора
+
+        self.producer = Producer({'enable.idempotence': True, **options})
+        self.errors = []
+
+    def _on_delivery(self, error, message):
+        if error is not None:
+            self.errors.append(error)
+
+    def send(self, topic, key, value):
+        self.producer.produce(topic, key=key.encode(), value=value.encode(), on_delivery=self._on_delivery)
+        self.producer.poll(0)
+
+    def flush(self):
+        remaining = self.producer.flush(30)
+        if remaining or self.errors:
+            errors, self.errors = self.errors, []
+            raise RuntimeError(f"Kafka delivery failed: {remaining} undelivered, errors: {errors[:3]}")
+
+
+def get_sink():
+    return import_string(settings.OUTBOX_SINK)(**settings.OUTBOX_SINK_OPTIONS)
+
+
+def acquire_publisher_lock():
+    """
+    Публикатор должен быть один: два процесса со skip_locked разобрали бы события одного ключа
+    по разным пачкам и отправили бы их не по порядку. На Postgres берётся advisory-блокировка до конца
+    транзакции; второй публикатор в это время получает пустую пачку. SQLite и так сериализует запись.
+    """
+    if connection.vendor != 'postgresql':
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', [PUBLISHER_LOCK_ID])
+        return cursor.fetchone()[0]
+
+
+def publish_batch(sink, batch_size=500):
+    """
+    Публикует следующую пачку событий. Доставка at-least-once: события помечаются
+    опубликованными только после flush() приёмника. Внутри пачки из событий с одинаковым
+    compaction_key отправляется только последнее — промежуточные состояния никому не нужны.
+    Возвращает (отправлено, схлопнуто).
+    """
+    with transaction.atomic():
+        if not acquire_publisher_lock():
+            return 0, 0
+        events = list(OutboxEvent.objects.filter(published_at__isnull=True).order_by('id')[:batch_size])
+        if not events:
+            return 0, 0
+
+        latest = {event.compaction_key: event.id for event in events if event.compaction_key}
+        to_send = [event for event in events if not event.compaction_key or latest[event.compaction_key] == event.id]
+        for event in to_send:
+            value = json.dumps({'id': event.id, 'type': event.event_type, 'created_at': event.created_at.isoformat(),
+                                'payload': event.payload}, ensure_ascii=False, default=str)
+            sink.send(settings.OUTBOX_TOPIC, event.key, value)
+        sink.flush()
+
+        OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(published_at=timezone.now())
+    return len(to_send), len(events) - len(to_send)
+
+
+def publisher_lag():
+    """Возраст самого старого неопубликованного события в секундах."""
+    oldest = (OutboxEvent.objects.filter(published_at__isnull=True).order_by('id')
+              .values_list('created_at', flat=True).first())
+    return (timezone.now() - oldest).total_seconds() if oldest else 0.0
+
+
+def prune_published():
+    """Удаляет события, опубликованные раньше OUTBOX_RETENTION_DAYS дней назад. Возвращает число удалённых строк."""
+    cutoff = timezone.now() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+    return OutboxEvent.objects.filter(published_at__lt=cutoff).delete()[0]
@@ -0,0 +1,138 @@
+import random
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import ExitStack
+from datetime import timedelta
+
+import orjson
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+from .models import RequestProfile
+
+PROFILE_HEADER = 'X-Debug-Profile'
+PROFILE_SIGNING_SALT = 'core.profiling'
+PROFILE_TOKEN_MAX_AGE = 600
+# Доля записей профиля, после которых заодно чистится таблица: хватает и без периодической команды
+PRUNE_PROBABILITY = 0.01
+
+
+def make_profile_token():
+    """Значение заголовка X-Debug-Profile, которое принудительно профилирует запрос (живёт 10 минут)."""
+    return signing.TimestampSigner(salt=PROFILE_SIGNING_SALT).sign('profile')
+
+
+def _has_valid_token(request):
+    token = request.headers.get(PROFILE_HEADER)
+    if not token:
+        return False
+    try:
+        signing.TimestampSigner(salt=PROFILE_SIGNING_SALT).unsign(token, max_age=PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def prune_profiles():
+    """
+    Удаляет профили старше PROFILING_RETENTION_DAYS и всё сверх PROFILING_MAX_ROWS самых свежих.
+    Возвращает число удалённых строк.
+    """
+    deleted, _ = RequestProfile.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=settings.PROFILING_RETENTION_DAYS)).delete()
+    cutoff = (RequestProfile.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+              [settings.PROFILING_MAX_ROWS:settings.PROFILING_MAX_ROWS + 1].first())
+    if cutoff is not None:
+        deleted += RequestProfile.objects.filter(id__lte=cutoff).delete()[0]
+    return deleted
+
+
+class StackSampler:
+    """
+    Статистический сэмплер: фоновый поток раз в interval снимает стек потока запроса
+    через sys._current_frames() и считает одинаковые стеки (формат collapsed для flamegraph).
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.counts = Counter()
+        self.thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return '\n'.join(f"{stack} {count}" for stack, count in self.counts.most_common())
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует долю PROFILING_SAMPLE_RATE запросов и любой запрос с подписанным заголовком
+    X-Debug-Profile. Сохраняет стеки и SQL в RequestProfile после отправки ответа. Если сэмплирование выключено
+    и PROFILING_ALLOW_HEADER = False, middleware отключается целиком и ничего не стоит.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_SAMPLE_RATE and not settings.PROFILING_ALLOW_HEADER:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (random.random() < settings.PROFILING_SAMPLE_RATE
+                or settings.PROFILING_ALLOW_HEADER and PROFILE_HEADER in request.headers and _has_valid_token(request)):
+            return self.get_response(request)
+
+        queries = []
+
+        def capture_sql(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append({'db': context['connection'].alias, 'sql': sql,
+                                'ms': round((time.perf_counter() - started) * 1000, 3)})
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(capture_sql))
+            sampler = stack.enter_context(StackSampler(settings.PROFILING_INTERVAL))
+            response = self.get_response(request)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        def save_profile():
+            RequestProfile.objects.create(
+                method=request.method, path=request.path[:255], status_code=response.status_code,
+                duration_ms=duration_ms, sql_count=len(queries), sql_ms=sum(query['ms'] for query in queries),
+                samples=sum(sampler.counts.values()), stacks=zlib.compress(sampler.collapsed().encode()),
+                queries=zlib.compress(orjson.dumps(queries)))
+            if random.random() < PRUNE_PROBABILITY:
+                prune_profiles()
+
+        # Сжатие и INSERT — после отправки ответа: WSGI-сервер вызывает response.close() уже после тела
+        response._resource_closers.append(save_profile)
+        return response
@@ -0,0 +1,76 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, When
+
+from .models import SyncChange, SyncSequence
+
+
+def next_sequence(user_id, count):
+    """
+    Выделяет count номеров журнала пользователя и возвращает первый. UPDATE держит блокировку строки
+    счётчика до конца транзакции, поэтому транзакции одного пользователя коммитятся в порядке номеров
+    и клиент не пропустит изменение с меньшим номером, закоммиченное позже большего.
+    """
+    if not SyncSequence.objects.filter(user_id=user_id).update(value=F('value') + count):
+        SyncSequence.objects.get_or_create(user_id=user_id)
+        SyncSequence.objects.filter(user_id=user_id).update(value=F('value') + count)
+    return SyncSequence.objects.filter(user_id=user_id).values_list('value', flat=True).get() - count + 1
+
+
+def record_changes(user_id, entity, entity_ids, deleted=False):
+    """
+    Отмечает сущности пользователя изменёнными (или удалёнными — deleted=True) под новыми номерами журнала.
+    Прежние строки этих сущностей удаляются, так что в журнале остаётся только последнее состояние.
+    Вызывать в той же транзакции, что и само изменение.
+    """
+    entity_ids = list(entity_ids)
+    if not entity_ids:
+        return
+    with transaction.atomic():
+        first = next_sequence(user_id, len(entity_ids))
+        SyncChange.objects.filter(user_id=user_id, entity=entity, entity_id__in=entity_ids).delete()
+        SyncChange.objects.bulk_create([SyncChange(user_id=user_id, entity=entity, entity_id=entity_id,
+                                                   deleted=deleted, seq=first + offset)
+                                        for offset, entity_id in enumerate(entity_ids)])
+
+
+def record_change(user_id, entity, entity_id, deleted=False):
+    record_changes(user_id, entity, [entity_id], deleted=deleted)
+
+
+SEQUENCE_BATCH_SIZE = 500
+
+
+def record_changes_many(entity, changes):
+    """
+    Пакетный record_changes для многих пользователей сразу: changes — [(user_id, entity_id, deleted), ...].
+    Номера выделяются одним UPDATE с CASE на пачку счётчиков, строки журнала пишутся одним upsert —
+    число запросов зависит от числа пачек, а не пользователей (слияние популярного дубликата).
+    Счётчики блокируются в порядке user_id, как и при поштучной записи одного пользователя.
+    """
+    changes = list(changes)
+    if not changes:
+        return
+    counts = Counter(user_id for user_id, _, _ in changes)
+    user_ids = sorted(counts)
+    with transaction.atomic():
+        SyncSequence.objects.bulk_create([SyncSequence(user_id=user_id) for user_id in user_ids],
+                                         ignore_conflicts=True, batch_size=SEQUENCE_BATCH_SIZE)
+        last = {}
+        for start in range(0, len(user_ids), SEQUENCE_BATCH_SIZE):
+            batch = user_ids[start:start + SEQUENCE_BATCH_SIZE]
+            SyncSequence.objects.filter(user_id__in=batch).update(value=F('value') + Case(
+                *(When(user_id=user_id, then=counts[user_id]) for user_id in batch)))
+            last.update(SyncSequence.objects.filter(user_id__in=batch).values_list('user_id', 'value'))
+
+        # Номера каждого пользователя идут подряд до last[user_id] включительно
+        next_seq = {user_id: last[user_id] - counts[user_id] + 1 for user_id in user_ids}
+        rows = []
+        for user_id, entity_id, deleted in changes:
+            rows.append(SyncChange(user_id=user_id, entity=entity, entity_id=entity_id, deleted=deleted,
+                                   seq=next_seq[user_id]))
+            next_seq[user_id] += 1
+        # Прежняя строка сущности заменяется новой: в журнале остаётся только последнее состояние
+        SyncChange.objects.bulk_create(rows, update_conflicts=True, unique_fields=['user', 'entity', 'entity_id'],
+                                       update_fields=['seq', 'deleted', 'created_at'], batch_size=SEQUENCE_BATCH_SIZE)
@@ -0,0 +1,170 @@
+import math
+import random
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+from dishes.models import Dish, SavedDish
+from dishes.utils import normalize_name
+from training.models import Training
+from users.models import User
+
+# Основа блюда: (белки, жиры, углеводы) на 100 г, как БЖУ в Dish
+DISH_BASES = {
+    'Борщ': (1.5, 2, 5), 'Щи': (1.2, 1.8, 3.5), 'Солянка': (5, 5.5, 2.5), 'Окрошка': (2.5, 3, 4.5),
+    'Омлет': (9.5, 15, 2), 'Сырники': (15, 10, 20), 'Блины': (6, 8, 30), 'Оладьи': (6, 9, 33),
+    'Гречка': (4.5, 2.5, 25), 'Овсянка': (3, 2, 15), 'Каша пшённая': (3, 2.5, 18), 'Плов': (6, 8, 20),
+    'Пельмени': (11, 12, 29), 'Вареники': (6, 3, 30), 'Котлета': (16, 15, 9), 'Голубцы': (6, 6, 8),
+    'Салат': (1.5, 8, 4), 'Винегрет': (1.5, 5, 8), 'Запеканка': (15, 7, 14), 'Курица запечённая': (25, 10, 0.5),
+    'Рыба на пару': (20, 4, 0), 'Макароны': (4, 1.5, 25), 'Картофельное пюре': (2, 3.5, 14), 'Суп': (2, 1.5, 5),
+}
+DISH_MODIFIERS = ('', 'с курицей', 'с говядиной', 'с грибами', 'с сыром', 'овощной', 'домашний', 'по-деревенски',
+                  'со сметаной', 'с индейкой', 'постный', 'с зеленью', 'по-купечески', 'с лососем')
+FIRST_NAMES = {'M': ('Алексей', 'Дмитрий', 'Иван', 'Максим', 'Сергей', 'Андрей', 'Никита', 'Артём'),
+               'F': ('Анна', 'Мария', 'Елена', 'Ольга', 'Дарья', 'Наталья', 'Ксения', 'Полина')}
+SOURCES = (None, 'telegram', 'friends', 'instagram', 'youtube', 'search')
+INTENSITY_FACTORS = {'low': 5, 'medium': 8, 'high': 12}
+
+SYNTHETIC_TELEGRAM_ID_BASE = 10 ** 12
+SYNTHETIC_PASSWORD = UNUSABLE_PASSWORD_PREFIX + 'synthetic'
+
+
+def chunk_rng(seed, kind, chunk):
+    """Отдельный генератор на чанк: результат не зависит от числа воркеров и порядка выполнения чанков."""
+    return random.Random(f'{seed}:{kind}:{chunk}')
+
+
+def _aware(day, rng):
+    return datetime.combine(day, time(rng.randrange(24), rng.randrange(60)), tzinfo=dt_timezone.utc)
+
+
+def generate_dishes(seed, chunk, first_id, count, anchor):
+    rng = chunk_rng(seed, 'dishes', chunk)
+    names = list(DISH_BASES)
+    name_keys = {}
+    for dish_id in range(first_id, first_id + count):
+        base = rng.choice(names)
+        name = f'{base} {rng.choice(DISH_MODIFIERS)}'.strip()
+        proteins, fats, carbohydrates = (round(value * rng.uniform(0.6, 1.5), 1) for value in DISH_BASES[base])
+        if name not in name_keys:
+            name_keys[name] = normalize_name(name)
+        created_at = _aware(anchor - timedelta(days=rng.randrange(730)), rng)
+        yield Dish(id=dish_id, name=name, proteins=proteins, fats=fats, carbohydrates=carbohydrates,
+                   callories=round(proteins * 4 + carbohydrates * 4 + fats * 9), name_key=name_keys[name],
+                   created_at=created_at, updated_at=created_at)
+
+
+def generate_user(rng, user_id, anchor):
+    gender = rng.choice('MF')
+    height = round(rng.gauss(178 if gender == 'M' else 165, 7))
+    weight = Decimal(str(round(max(45.0, rng.gauss(82 if gender == 'M' else 66, 12)), 1)))
+    birth_date = anchor - timedelta(days=rng.randrange(18 * 365, 65 * 365))
+    created_at = _aware(anchor - timedelta(days=rng.randrange(730)), rng)
+
+    user = User(id=user_id, password=SYNTHETIC_PASSWORD, telegram_id=SYNTHETIC_TELEGRAM_ID_BASE + user_id,
+                username=f'user{user_id}', telegram_username=f'user{user_id}', first_name=rng.choice(FIRST_NAMES[gender]),
+                gender=gender, birth_date=birth_date, height=height, weight=weight,
+                meta={'activity': rng.choice(('low', 'light', 'moderate', 'high')),
+                      'goal': rng.choice(('lose', 'keep', 'gain'))},
+                source=rng.choice(SOURCES), date_joined=created_at, created_at=created_at, updated_at=created_at)
+    user.age = anchor.year - birth_date.year - ((anchor.month, anchor.day) < (birth_date.month, birth_date.day))
+    user.bmi = float(user.calculate_bmi())
+
+    # Примерно 40% не начинали пробный период, 20% сейчас в нём, остальные его закончили; 10% с премиумом
+    roll = rng.random()
+    now = datetime.combine(anchor, time(), tzinfo=dt_timezone.utc)
+    if roll < 0.4:
+        user.trial_status = User.TrialStatus.NOT_STARTED
+    elif roll < 0.6:
+        user.trial_status = User.TrialStatus.IN_PROGRESS
+        user.trial_end_date = now + timedelta(hours=rng.randrange(1, 72))
+    else:
+        user.trial_status = User.TrialStatus.ENDED
+        user.trial_end_date = now - timedelta(days=rng.randrange(1, 700))
+    if rng.random() < 0.1:
+        user.is_premium = True
+        user.premium_type = rng.choice(User.PremiumType.values)
+        user.premium_end_date = now + timedelta(days=rng.randrange(1, 365 if user.premium_type == 'YEAR' else 31))
+    return user
+
+
+def generate_users(seed, chunk, first_id, count, dish_range, anchor, saved_per_user, trainings_per_user):
+    """Пользователи чанка вместе с их сохранёнными блюдами и тренировками."""
+    rng = chunk_rng(seed, 'users', chunk)
+    first_dish, dishes_count = dish_range
+    users, saved, trainings = [], [], []
+    for user_id in range(first_id, first_id + count):
+        user = generate_user(rng, user_id, anchor)
+        users.append(user)
+
+        # Популярность блюд перекошена: младшие id сохраняют заметно чаще
+        picked = {first_dish + int(dishes_count * rng.random() ** 3)
+                  for _ in range(rng.randint(0, 2 * saved_per_user))} if dishes_count else set()
+        saved.extend(SavedDish(user_id=user_id, dish_id=dish_id, is_saved=rng.random() < 0.9)
+                     for dish_id in sorted(picked))
+
+        for _ in range(rng.randint(0, 2 * trainings_per_user)):
+            kind = rng.choices(('run', 'gym', 'manual'), weights=(5, 4, 1))[0]
+            duration = rng.randrange(15, 121)
+            intensity = rng.choice(list(INTENSITY_FACTORS))
+            callories = rng.randrange(100, 900) if kind == 'manual' else \
+                round(INTENSITY_FACTORS[intensity] * float(user.weight) * duration / 60)
+            created_at = _aware(anchor - timedelta(days=rng.randrange(max(1, (anchor - user.created_at.date()).days))),
+                                rng)
+            trainings.append(Training(user_id=user_id, type=kind, duration=duration, intensity=intensity,
+                                      callories=callories, created_at=created_at))
+    return users, saved, trainings
+
+
+def write_rows(model, objects, with_pk=True):
+    """
+    Пишет объекты напрямую в таблицу, минуя save() и pre_save, чтобы сохранились заданные даты.
+    На PostgreSQL с psycopg 3 — через COPY, иначе — executemany одним INSERT на пачку.
+    """
+    fields = [field for field in model._meta.concrete_fields if with_pk or not field.primary_key]
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    rows = [[field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields] for obj in objects]
+    if not rows:
+        return 0
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql' and is_psycopg3:
+            with cursor.cursor.copy(f'COPY {table} ({columns}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            placeholders = ', '.join(['%s'] * len(fields))
+            cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', rows)
+    return len(rows)
+
+
+def write_dishes_chunk(seed, chunk, first_id, count, anchor):
+    with transaction.atomic():
+        return write_rows(Dish, generate_dishes(seed, chunk, first_id, count, anchor))
+
+
+def write_users_chunk(seed, chunk, first_id, count, dish_range, anchor, saved_per_user, trainings_per_user):
+    users, saved, trainings = generate_users(seed, chunk, first_id, count, dish_range, anchor, saved_per_user,
+                                             trainings_per_user)
+    with transaction.atomic():
+        return (write_rows(User, users), write_rows(SavedDish, saved, with_pk=False),
+                write_rows(Training, trainings, with_pk=False))
+
+
+def reset_sequences():
+    """После вставки с явными id двигает последовательности PostgreSQL (SQLite это не нужно)."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [Dish, User, SavedDish, Training])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def chunks(first_id, total, chunk_size):
+    """(номер чанка, первый id, размер) для total строк начиная с first_id."""
+    for chunk in range(math.ceil(total / chunk_size)):
+        yield chunk, first_id + chunk * chunk_size, min(chunk_size, total - chunk * chunk_size)
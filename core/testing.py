@@ -0,0 +1,10 @@
+"""Общие помощники тестов приложений."""
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+def make_client(user):
+    """APIClient, который ходит в API с JWT пользователя user."""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(user).access_token))
+    return client
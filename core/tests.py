@@ -0,0 +1,296 @@
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from dishes.models import Dish, DishImage, SavedDish
+from training.models import Training
+from users.models import User
+from .db_routers import PrimaryReplicaRouter, read_counts, use_replica
+from .management.commands.profile_startup import STARTUP_SNIPPET
+from .models import OutboxEvent, RequestProfile
+from .outbox import MemorySink, prune_published, publish_batch, publish_event
+from .profiling import prune_profiles
+from .testing import make_client
+
+
+class ReplicaRoutingTests(TestCase):
+    """
+    Две реплики — отдельные файлы SQLite с таблицами блюд. Строки в них отличаются от primary,
+    поэтому по ответу видно, с какой базы он прочитан.
+    """
+    replicas = ('replica_1', 'replica_2')
+    # Реплики регистрируются в setUpClass, уже после проверок раннера; '__all__' раскрывается позже, вместе с ними
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        for alias in cls.replicas:
+            settings.DATABASES[alias] = {**connections['default'].settings_dict,
+                                         'NAME': os.path.join(cls.directory, f'{alias}.sqlite3')}
+            with connections[alias].schema_editor() as editor:
+                for model in (User, DishImage, Dish):
+                    editor.create_model(model)
+            # bulk_create, а не save(): Dish.save поднимает версию каталога на primary
+            Dish.objects.using(alias).bulk_create([Dish(id=1, name=alias, callories=1, fats=0, proteins=0,
+                                                        carbohydrates=0)])
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in cls.replicas:
+            connections[alias].close()
+            del connections[alias]
+            del settings.DATABASES[alias]
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        cache.clear()
+        Dish.objects.bulk_create([Dish(id=1, name='primary', callories=1, fats=0, proteins=0, carbohydrates=0)])
+
+    def get_recent(self, client):
+        before = Counter(read_counts)
+        response = client.get('/api/dishes/recent/')
+        self.assertEqual(response.status_code, 200)
+        reads = Counter(read_counts)
+        reads.subtract(before)
+        return response.json()[0]['name'], {alias for alias, count in reads.items() if count}
+
+    def test_each_request_reads_from_one_replica(self):
+        for _ in range(10):
+            name, databases = self.get_recent(APIClient())
+            # ETag и тело ответа прочитаны с одной и той же реплики
+            self.assertEqual(databases, {name})
+            self.assertIn(name, self.replicas)
+
+    def test_write_sticks_reads_to_primary(self):
+        user = User.objects.create(telegram_id=1, username='user', password='x')
+        client = make_client(user)
+        response = client.post('/api/dishes/my/', {'id': 1, 'is_saved': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_recent(client), ('primary', {'default'}))
+
+        cache.clear()  # окно REPLICA_STICKY_SECONDS прошло
+        self.assertIn(self.get_recent(APIClient())[0], self.replicas)
+
+
+class BatchRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(telegram_id=1, username='user', password='x')
+        self.client = make_client(self.user)
+        self.dish = Dish.objects.create(name='Борщ', callories=60, fats=3, proteins=2, carbohydrates=6)
+
+    def run_batch(self, requests):
+        seen = []
+
+        def db_for_read(router, model, **hints):
+            # Пользователь самого пакета читается до подзапросов — смотрим только чтения блюд
+            if model is Dish:
+                seen.append(use_replica.get())
+            return 'default'
+
+        with mock.patch.object(PrimaryReplicaRouter, 'db_for_read', db_for_read):
+            response = self.client.post('/api/batch/', {'requests': requests}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['responses'], seen
+
+    def test_reads_are_routed_per_subrequest(self):
+        responses, seen = self.run_batch([{'path': '/api/dishes/recent/'}, {'path': '/api/dishes/popular/'}])
+        self.assertEqual([result['status'] for result in responses], [200, 200])
+        self.assertTrue(seen and all(seen))
+        self.assertFalse(use_replica.get())
+
+    def test_write_sticks_later_reads_to_primary(self):
+        responses, seen = self.run_batch([
+            {'method': 'POST', 'path': '/api/dishes/my/', 'body': {'id': self.dish.id, 'is_saved': True}},
+            {'path': '/api/dishes/recent/'}])
+        self.assertEqual([result['status'] for result in responses], [200, 200])
+        self.assertFalse(any(seen))
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(telegram_id=1, username='user', password='x')
+        self.client = make_client(user)
+        self.dish = Dish.objects.create(name='Борщ', callories=60, fats=3, proteins=2, carbohydrates=6)
+
+    def test_unknown_fields_are_rejected_before_any_query(self):
+        for path in ('/api/dishes/', '/api/dishes/my/', '/api/dishes/recent/'):
+            with self.assertNumQueries(0):
+                response = self.client.get(path, {'fields': 'id,password'})
+            self.assertEqual(response.status_code, 400, path)
+            self.assertIn('password', response.json()['fields'])
+
+    def test_dish_list_selects_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/dishes/', {'q': 'Борщ', 'fields': 'id,name'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{'id': self.dish.id, 'name': 'Борщ'}])
+        select, = [query['sql'] for query in queries if 'FROM "dishes_dish"' in query['sql']]
+        self.assertEqual(select.split(' FROM ')[0], 'SELECT "dishes_dish"."id", "dishes_dish"."name"')
+
+
+class RouteProfileMiddlewareTests(TestCase):
+    def setUp(self):
+        self.admin = User(telegram_id=1, username='admin', is_staff=True, is_superuser=True)
+        self.admin.set_password('secret')
+        self.admin.save()
+        self.client = Client(enforce_csrf_checks=True)
+
+    def login(self, with_token=True):
+        self.client.get('/admin/login/')
+        data = {'username': self.admin.telegram_id, 'password': 'secret', 'next': '/admin/'}
+        if with_token:
+            data['csrfmiddlewaretoken'] = self.client.cookies['csrftoken'].value
+        return self.client.post('/admin/login/', data)
+
+    def test_admin_login_keeps_session_user(self):
+        response = self.login()
+        self.assertRedirects(response, '/admin/', fetch_redirect_response=False)
+        response = self.client.get('/admin/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.user, self.admin)
+
+    def test_admin_post_without_csrf_token_is_rejected(self):
+        self.assertEqual(self.login(with_token=False).status_code, 403)
+
+    def test_api_never_touches_session(self):
+        self.login()
+        with mock.patch.object(SessionMiddleware, 'process_request') as process_request:
+            response = self.client.get('/api/dishes/recent/')
+        self.assertEqual(response.status_code, 200)
+        process_request.assert_not_called()
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+
+class FailingSink(MemorySink):
+    def flush(self):
+        raise RuntimeError('broker unavailable')
+
+
+class OutboxTests(TestCase):
+    def publish(self, sink=None, **kwargs):
+        sink = sink or MemorySink()
+        return publish_batch(sink, **kwargs), [(key, json.loads(value)) for _, key, value in sink.messages]
+
+    def test_only_latest_event_per_compaction_key_is_sent(self):
+        for status in ('a', 'b', 'c'):
+            publish_event('entitlement.trial_started', 1, {'status': status}, compaction_key='entitlement:1')
+        publish_event('training.created', 1, {'id': 5})
+
+        (sent, compacted), messages = self.publish()
+        self.assertEqual((sent, compacted), (2, 2))
+        self.assertEqual([value['payload'] for _, value in messages], [{'status': 'c'}, {'id': 5}])
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=True).exists())
+
+    def test_events_of_a_key_keep_their_order_across_batches(self):
+        for index in range(6):
+            publish_event('training.created', index % 2, {'index': index})
+        messages = self.publish(batch_size=4)[1] + self.publish(batch_size=4)[1]
+        for key in ('0', '1'):
+            ids = [value['id'] for message_key, value in messages if message_key == key]
+            self.assertEqual(ids, sorted(ids))
+            self.assertEqual(len(ids), 3)
+
+    def test_events_stay_unpublished_when_flush_fails(self):
+        publish_event('training.created', 1, {'id': 5})
+        with self.assertRaises(RuntimeError):
+            self.publish(FailingSink())
+        self.assertTrue(OutboxEvent.objects.filter(published_at__isnull=True).exists())
+        # Повторная публикация отправляет то же событие — доставка at-least-once
+        self.assertEqual(self.publish()[0], (1, 0))
+
+    def test_second_publisher_without_lock_gets_nothing(self):
+        publish_event('training.created', 1, {'id': 5})
+        with mock.patch('core.outbox.acquire_publisher_lock', return_value=False):
+            self.assertEqual(self.publish(), ((0, 0), []))
+        self.assertTrue(OutboxEvent.objects.filter(published_at__isnull=True).exists())
+
+    @override_settings(OUTBOX_RETENTION_DAYS=7)
+    def test_prune_removes_only_old_published_events(self):
+        old, recent, pending = (publish_event('training.created', 1, {}) for _ in range(3))
+        OutboxEvent.objects.filter(id=old.id).update(published_at=timezone.now() - timedelta(days=8))
+        OutboxEvent.objects.filter(id=recent.id).update(published_at=timezone.now())
+        self.assertEqual(prune_published(), 1)
+        self.assertEqual(set(OutboxEvent.objects.values_list('id', flat=True)), {recent.id, pending.id})
+
+
+class SyntheticDataTests(TestCase):
+    def snapshot(self):
+        return {model.__name__: list(model.objects.order_by(*ordering).values(*fields))
+                for model, ordering, fields in (
+                    (Dish, ['id'], []),
+                    (User, ['id'], []),
+                    (SavedDish, ['user_id', 'dish_id'], ['user_id', 'dish_id', 'is_saved']),
+                    (Training, ['user_id', 'created_at', 'type'],
+                     ['user_id', 'type', 'duration', 'intensity', 'callories', 'created_at']))}
+
+    def test_same_seed_and_anchor_give_identical_rows(self):
+        options = {'users': 30, 'dishes': 20, 'chunk_size': 7, 'seed': 7, 'anchor_date': timezone.now().date(),
+                   'skip_derived': True, 'stdout': io.StringIO()}
+        call_command('generate_synthetic_data', **options)
+        first = self.snapshot()
+        self.assertEqual(len(first['User']), 30)
+        self.assertTrue(first['SavedDish'] and first['Training'])
+
+        User.objects.all().delete()
+        Dish.objects.all().delete()
+        call_command('generate_synthetic_data', **options)
+        self.assertEqual(self.snapshot(), first)
+
+
+class ProfilingTests(TestCase):
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_profile_is_saved_after_response(self):
+        response = self.client.get('/api/dishes/recent/')
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get()
+        self.assertEqual((profile.path, profile.status_code), ('/api/dishes/recent/', 200))
+
+    @override_settings(PROFILING_RETENTION_DAYS=7, PROFILING_MAX_ROWS=3)
+    def test_prune_keeps_recent_rows_within_cap(self):
+        profiles = RequestProfile.objects.bulk_create([
+            RequestProfile(method='GET', path='/', status_code=200, duration_ms=1, stacks=b'', queries=b'')
+            for _ in range(6)])
+        RequestProfile.objects.filter(id=profiles[-1].id).update(created_at=timezone.now() - timedelta(days=8))
+        self.assertEqual(prune_profiles(), 3)
+        self.assertEqual(set(RequestProfile.objects.values_list('id', flat=True)),
+                         {profile.id for profile in profiles[2:5]})
+
+
+class StartupTests(SimpleTestCase):
+    # Интеграции, которые должны импортироваться при первом использовании, а не на старте воркера
+    LAZY_MODULES = ('openai', 'telegram', 'twisted', 'confluent_kafka')
+
+    def test_startup_fits_budget(self):
+        output = io.StringIO()
+        call_command('profile_startup', budget=settings.STARTUP_BUDGET_SECONDS, limit=0, stdout=output)
+        self.assertIn('Within budget', output.getvalue())
+
+    def test_heavy_integrations_are_not_imported_at_startup(self):
+        snippet = STARTUP_SNIPPET + f"import sys\nprint(sorted(set({self.LAZY_MODULES!r}) & set(sys.modules)))\n"
+        result = subprocess.run([sys.executable, '-c', snippet], cwd=settings.BASE_DIR, capture_output=True, text=True,
+                                env={**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE})
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        self.assertEqual(result.stdout.splitlines()[-1], '[]')
@@ -0,0 +1,145 @@
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+REJECTED_KEY = 'throttle:rejected:{scope}:{kind}'
+
+
+def parse_rate(rate):
+    """'30/min' -> (ёмкость 30, пополнение 0.5 токена в секунду)."""
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+def rejection_counts():
+    """Счётчики отказов по всем корзинам из TOKEN_BUCKET_RATES."""
+    cache = caches[settings.THROTTLE_CACHE]
+    keys = {REJECTED_KEY.format(scope=scope, kind=kind): (scope, kind)
+            for scope, rates in settings.TOKEN_BUCKET_RATES.items() for kind in rates}
+    values = cache.get_many(list(keys))
+    return {f"{scope}:{kind}": values.get(key, 0) for key, (scope, kind) in keys.items()}
+
+
+# Проверка и списание всех корзин запроса одним атомарным шагом на стороне Redis: токен берётся
+# сразу из всех корзин или ни из одной. Возвращает {номер отказавшей корзины или 0, ожидание в секундах}
+TAKE_TOKENS_SCRIPT = """
+local now = tonumber(ARGV[1])
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local capacity, refill = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'updated_at')
+    local tokens = tonumber(bucket[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+    tokens = math.min(capacity, tokens + elapsed * refill)
+    if tokens < 1 then
+        return {i, tostring((1 - tokens) / refill)}
+    end
+    levels[i] = tokens - 1
+end
+for i, key in ipairs(KEYS) do
+    local capacity, refill = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    redis.call('HSET', key, 'tokens', tostring(levels[i]), 'updated_at', ARGV[1])
+    redis.call('EXPIRE', key, math.floor((capacity - levels[i]) / refill) + 1)
+end
+return {0, '0'}
+"""
+
+_local_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def take_tokens_script(alias):
+    """
+    Скрипт TAKE_TOKENS_SCRIPT, зарегистрированный один раз на процесс для кэша alias. Клиент строится
+    из настроек кэша, как у training.leaderboard.RedisStore: первый адрес LOCATION — сервер для записи.
+    Script сам шлёт EVALSHA и подгружает скрипт заново, если Redis его забыл.
+    """
+    import redis
+
+    location = settings.CACHES[alias]['LOCATION']
+    if not isinstance(location, str):
+        location = location[0]
+    client = redis.Redis.from_url(location.split(',')[0])
+    return client.register_script(TAKE_TOKENS_SCRIPT)
+
+
+def take_tokens(alias, buckets, now):
+    """
+    Берёт по токену из каждой корзины [(ключ, ёмкость, пополнение в секунду)] кэша alias, только если
+    во всех есть токен. Возвращает (индекс первой пустой корзины или None, сколько ждать).
+    """
+    cache = caches[alias]
+    if isinstance(cache, RedisCache):
+        keys = [cache.make_and_validate_key(key) for key, _, _ in buckets]
+        args = [repr(now)] + [repr(value) for _, capacity, refill in buckets for value in (capacity, refill)]
+        rejected, wait = take_tokens_script(alias)(keys=keys, args=args)
+        return (int(rejected) - 1, float(wait)) if int(rejected) else (None, None)
+
+    # LocMemCache живёт в памяти процесса — атомарность даёт обычная блокировка
+    with _local_lock:
+        levels = []
+        for index, (key, capacity, refill) in enumerate(buckets):
+            tokens, updated_at = cache.get(key) or (capacity, now)
+            tokens = min(capacity, tokens + max(0, now - updated_at) * refill)
+            if tokens < 1:
+                return index, (1 - tokens) / refill
+            levels.append(tokens - 1)
+        for (key, capacity, refill), tokens in zip(buckets, levels):
+            # Корзина живёт ровно столько, сколько нужно для её полного пополнения
+            cache.set(key, (tokens, now), timeout=int((capacity - tokens) / refill) + 1)
+    return None, None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket в общем кэше (Redis в продакшене, LocMemCache локально и в тестах).
+    Лимиты берутся из settings.TOKEN_BUCKET_RATES[view.throttle_scope][kind]. Корзины запроса
+    (пользователь, IP, весь эндпоинт) списываются вместе: отклонённый по IP запрос не тратит
+    общий токен эндпоинта, поэтому флуд с одного адреса не выедает лимит остальным.
+    При исчерпании DRF отвечает 429 с Retry-After из wait().
+    """
+    kinds = ('user', 'ip', 'endpoint')
+    timer = time.time
+
+    def get_bucket_id(self, kind, request, view):
+        if kind == 'user':
+            return request.user.pk if request.user and request.user.is_authenticated else None
+        if kind == 'ip':
+            # Без NUM_PROXIES get_ident берёт REMOTE_ADDR, а не подделываемый клиентом X-Forwarded-For
+            return self.get_ident(request)
+        return 'all'
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        scope = getattr(view, 'throttle_scope', None)
+        rates = settings.TOKEN_BUCKET_RATES.get(scope, {})
+        buckets, kinds = [], []
+        for kind in self.kinds:
+            bucket_id = self.get_bucket_id(kind, request, view) if kind in rates else None
+            if bucket_id is not None:
+                buckets.append((f'throttle:{scope}:{kind}:{bucket_id}', *parse_rate(rates[kind])))
+                kinds.append(kind)
+        if not buckets:
+            return True
+
+        rejected, self.wait_seconds = take_tokens(settings.THROTTLE_CACHE, buckets, self.timer())
+        if rejected is None:
+            return True
+        cache = caches[settings.THROTTLE_CACHE]
+        rejected_key = REJECTED_KEY.format(scope=scope, kind=kinds[rejected])
+        if not cache.add(rejected_key, 1, timeout=None):
+            cache.incr(rejected_key)
+        return False
+
+    def wait(self):
+        return self.wait_seconds
+
+
+TOKEN_BUCKET_THROTTLES = [TokenBucketThrottle]
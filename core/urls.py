@@ -0,0 +1,15 @@
+from django.urls import path
+
+from .views import (DBPoolStatsView, ThrottleStatsView, RequestProfileListView, RequestProfileFlamegraphView,
+                    RequestProfileQueriesView, ProfileTokenView, BatchView)
+
+urlpatterns = [
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('health/db/', DBPoolStatsView.as_view(), name='db-pool-stats'),
+    path('health/throttle/', ThrottleStatsView.as_view(), name='throttle-stats'),
+    path('debug/profiles/', RequestProfileListView.as_view(), name='request-profiles'),
+    path('debug/profiles/token/', ProfileTokenView.as_view(), name='request-profile-token'),
+    path('debug/profiles/<int:pk>/flamegraph/', RequestProfileFlamegraphView.as_view(),
+         name='request-profile-flamegraph'),
+    path('debug/profiles/<int:pk>/queries/', RequestProfileQueriesView.as_view(), name='request-profile-queries'),
+]
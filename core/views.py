@@ -0,0 +1,98 @@
+import zlib
+
+import orjson
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .batch import BatchError, parse_batch, run_batch
+from .db_routers import read_counts
+from .models import RequestProfile
+from .profiling import PROFILE_HEADER, make_profile_token
+from .renderers import ORJSONRenderer
+from .throttling import rejection_counts
+
+
+class DBPoolStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        databases = {}
+        for conn in connections.all():
+            pool = getattr(conn, 'pool', None)
+            databases[conn.alias] = {"vendor": conn.vendor, "conn_max_age": conn.settings_dict.get('CONN_MAX_AGE'),
+                                     "health_checks": conn.settings_dict.get('CONN_HEALTH_CHECKS'),
+                                     "pooled": pool is not None, "stats": pool.get_stats() if pool else None}
+        return Response({"databases": databases, "reads": dict(read_counts)})
+
+
+class ThrottleStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({"rejected": rejection_counts()})
+
+
+class RequestProfileListView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', 50)), 500)
+        except ValueError:
+            return Response({"detail": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        profiles = (RequestProfile.objects.order_by('-duration_ms')
+                    .values('id', 'method', 'path', 'status_code', 'duration_ms', 'sql_count', 'sql_ms', 'samples',
+                            'created_at')[:limit])
+        return Response(list(profiles))
+
+
+class RequestProfileFlamegraphView(APIView):
+    """Collapsed-стеки: подходят для flamegraph.pl, speedscope и inferno."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, pk):
+        stacks = RequestProfile.objects.filter(pk=pk).values_list('stacks', flat=True).first()
+        if stacks is None:
+            return Response({"detail": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        return HttpResponse(zlib.decompress(stacks), content_type='text/plain; charset=utf-8')
+
+
+class RequestProfileQueriesView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, pk):
+        queries = RequestProfile.objects.filter(pk=pk).values_list('queries', flat=True).first()
+        if queries is None:
+            return Response({"detail": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(orjson.loads(zlib.decompress(queries)))
+
+
+class ProfileTokenView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        return Response({"header": PROFILE_HEADER, "value": make_profile_token()})
+
+
+class BatchView(APIView):
+    """
+    Несколько запросов к API за один round trip: {"requests": [{"id", "method", "path", "body", "headers"}]}.
+    Пакет может начинаться с auth/tma/ (заголовок Authorization: tma ... передаётся в headers подзапроса) —
+    остальные подзапросы выполнятся от имени вошедшего пользователя.
+    """
+    permission_classes = [permissions.AllowAny]
+    renderer_classes = [ORJSONRenderer]
+    # Маршрутизация чтений и прилипание к primary — на каждый подзапрос, см. core.batch.run_one
+    routes_subrequests = True
+    max_workers = 4
+
+    def post(self, request):
+        try:
+            subs = parse_batch(request.data)
+        except BatchError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        user = request.user if request.user.is_authenticated else None
+        return Response({"responses": run_batch(request, subs, user, max_workers=self.max_workers)})
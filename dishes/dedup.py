@@ -0,0 +1,151 @@
+import zlib
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from core.sync import record_changes_many
+from users.models import User
+from .models import CatalogVersion, Dish, DishNeighbors, SavedDish
+from .popularity import rebase_trend_scores, trend_epoch
+from .recipes import recompute_recipes, repoint_ingredients
+from .utils import normalize_name
+
+SHINGLE_SIZE = 3
+NUM_PERM = 30
+BANDS = 10  # 10 полос по 3 строки: пара с Jaccard 0.6 становится кандидатом с вероятностью ~0.9
+ROWS_PER_BAND = NUM_PERM // BANDS
+MIN_JACCARD = 0.6
+MACRO_FIELDS = ('proteins', 'fats', 'carbohydrates')
+
+_MERSENNE_PRIME = (1 << 61) - 1
+# Фиксированные коэффициенты хэш-функций, чтобы сигнатуры были воспроизводимы между запусками
+_PERMUTATIONS = [((i * 0x9E3779B1 + 1) % _MERSENNE_PRIME, (i * 0x85EBCA77 + 7) % _MERSENNE_PRIME)
+                 for i in range(1, NUM_PERM + 1)]
+
+
+def shingles(name_key):
+    padded = f' {name_key} '
+    return {padded[i:i + SHINGLE_SIZE] for i in range(max(1, len(padded) - SHINGLE_SIZE + 1))}
+
+
+def minhash_signature(name_key):
+    hashes = [zlib.crc32(shingle.encode()) for shingle in shingles(name_key)]
+    return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def estimated_jaccard(sig_a, sig_b):
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def macros_close(a, b):
+    """Макросы считаются совпадающими, если отличаются не более чем на 10% (или на 1 г для малых значений)."""
+    for field in MACRO_FIELDS:
+        x, y = float(a[field]), float(b[field])
+        if abs(x - y) > max(1.0, 0.1 * max(x, y)):
+            return False
+    return True
+
+
+def find_existing_duplicate(data):
+    """Проверка при создании: блюдо с тем же ключом названия и близкими макросами (индексный поиск)."""
+    name_key = normalize_name(data.get('name'))
+    for dish in Dish.objects.filter(name_key=name_key).only('id', 'name', 'callories', *MACRO_FIELDS)[:20]:
+        if macros_close(data, {field: getattr(dish, field) for field in MACRO_FIELDS}):
+            return dish
+    return None
+
+
+def find_duplicate_clusters(chunk_size=5000):
+    """
+    Офлайн-поиск кластеров: MinHash/LSH по шинглам названий даёт пары-кандидаты,
+    которые подтверждаются оценкой Jaccard и близостью макросов. Кластеры собираются union-find.
+    Возвращает списки id, отсортированные по возрастанию (первый — канонический).
+    """
+    dishes = {}
+    buckets = defaultdict(list)
+    for row in Dish.objects.values('id', 'name_key', *MACRO_FIELDS).iterator(chunk_size=chunk_size):
+        row['signature'] = minhash_signature(row['name_key'])
+        dishes[row['id']] = row
+        for band in range(BANDS):
+            buckets[band, row['signature'][band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]].append(row['id'])
+
+    parent = {}
+
+    def find(x):
+        while x in parent:
+            x = parent[x]
+        return x
+
+    checked = set()
+    for ids in buckets.values():
+        for i, a in enumerate(ids):
+            for b in ids[i + 1:]:
+                if (a, b) in checked:
+                    continue
+                checked.add((a, b))
+                dish_a, dish_b = dishes[a], dishes[b]
+                if (dish_a['name_key'] == dish_b['name_key']
+                        or estimated_jaccard(dish_a['signature'], dish_b['signature']) >= MIN_JACCARD) \
+                        and macros_close(dish_a, dish_b):
+                    root_a, root_b = find(a), find(b)
+                    if root_a != root_b:
+                        parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters = defaultdict(list)
+    for dish_id in parent:
+        clusters[find(dish_id)].append(dish_id)
+    return [sorted(set(members) | {root}) for root, members in clusters.items()]
+
+
+def merge_dishes(canonical_id, duplicate_ids):
+    """
+    Сливает дубликаты в каноническое блюдо: SavedDish переносятся пакетно, причём
+    если у пользователя уже есть строка канонического блюда, строка дубликата удаляется,
+    а is_saved объединяется по «или».
+    """
+    with transaction.atomic():
+        merged_by_user = defaultdict(list)
+        for user_id, dish_id in SavedDish.objects.filter(dish_id__in=duplicate_ids).values_list('user_id', 'dish_id'):
+            merged_by_user[user_id].append(dish_id)
+        affected_users = SavedDish.objects.filter(dish_id__in=duplicate_ids).values('user_id')
+        User.objects.filter(pk__in=affected_users).update(saved_dishes_version=F('saved_dishes_version') + 1)
+        # Флаги сохранения объединяются: сохранённый дубликат делает сохранённым и каноническое блюдо
+        SavedDish.objects.filter(dish_id=canonical_id, is_saved=False, user_id__in=SavedDish.objects.filter(
+            dish_id__in=duplicate_ids, is_saved=True).values('user_id')).update(is_saved=True)
+        SavedDish.objects.filter(dish_id__in=duplicate_ids,
+                                 user_id__in=SavedDish.objects.filter(dish_id=canonical_id).values('user_id')).delete()
+        # У одного пользователя могут быть сохранены несколько дубликатов — оставляем по одной строке
+        seen_users = set()
+        extra_ids = []
+        for saved_id, user_id in SavedDish.objects.filter(dish_id__in=duplicate_ids).order_by('-is_saved', 'id'
+                                                                                            ).values_list('id', 'user_id'):
+            if user_id in seen_users:
+                extra_ids.append(saved_id)
+            seen_users.add(user_id)
+        SavedDish.objects.filter(id__in=extra_ids).delete()
+        moved = SavedDish.objects.filter(dish_id__in=duplicate_ids).update(dish_id=canonical_id)
+        # Счётчики канонического блюда: сохранения — точным пересчётом, тренд — суммой с дубликатами,
+        # приведёнными к одной эпохе
+        rebase_trend_scores(trend_epoch(timezone.now()))
+        merged_trend = Dish.objects.filter(id__in=duplicate_ids).aggregate(total=Sum('trend_score'))['total'] or 0
+        Dish.objects.filter(id=canonical_id).update(
+            save_count=SavedDish.objects.filter(dish_id=canonical_id, is_saved=True).count(),
+            trend_score=F('trend_score') + merged_trend)
+        repoint_ingredients(canonical_id, duplicate_ids)
+        Dish.objects.filter(id__in=duplicate_ids).delete()
+        CatalogVersion.bump()
+        # Рецепты с дубликатами в составе — предки канонического блюда, их БЖУ пересчитываются вместе с ним
+        recompute_recipes([canonical_id])
+        DishNeighbors.objects.filter(dish_id=canonical_id).update(is_stale=True)
+
+        # Клиенты синхронизации видят удаление дубликатов и актуальное состояние канонического блюда
+        canonical_saved = dict(SavedDish.objects.filter(dish_id=canonical_id, user_id__in=merged_by_user)
+                               .values_list('user_id', 'is_saved'))
+        changes = []
+        for user_id, dish_ids in merged_by_user.items():
+            changes += [(user_id, dish_id, True) for dish_id in dish_ids]
+            changes.append((user_id, canonical_id, not canonical_saved.get(user_id, False)))
+        record_changes_many('saved_dish', changes)
+    return moved
@@ -0,0 +1,137 @@
+import hashlib
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.urls import reverse
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import DishImage
+
+# Ширина вариантов в пикселях: превью в списке, карточка блюда и карточка для экранов с высокой плотностью
+VARIANTS = {'thumb': 160, 'detail': 640, 'retina': 1280}
+ALLOWED_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+# Маленький файл может разворачиваться в гигантский растр, а рендер вариантов декодирует оригинал целиком
+MAX_PIXELS = 40_000_000
+WEBP_QUALITY = 80
+# Адрес варианта зависит только от хэша содержимого, поэтому ответ можно кэшировать навсегда
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def original_path(sha256, extension):
+    return f'dishes/originals/{sha256[:2]}/{sha256}.{extension}'
+
+
+def variant_path(sha256, variant):
+    return f'dishes/variants/{sha256[:2]}/{sha256}/{variant}.webp'
+
+
+def image_url(sha256, variant='thumb'):
+    return reverse('dish-image-variant', args=[sha256, variant]) if sha256 else None
+
+
+def image_urls(sha256):
+    return {variant: image_url(sha256, variant) for variant in VARIANTS} if sha256 else None
+
+
+def store_image(upload):
+    """
+    Сохраняет загруженный файл по хэшу содержимого. Повторная загрузка тех же байтов
+    не пишет файл заново, а только увеличивает счётчик uploads.
+    """
+    content = upload.read(MAX_UPLOAD_BYTES + 1)
+    if len(content) > MAX_UPLOAD_BYTES:
+        raise InvalidImage(f"Image is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    sha256 = hashlib.sha256(content).hexdigest()
+
+    if DishImage.objects.filter(pk=sha256).update(uploads=F('uploads') + 1):
+        return DishImage.objects.get(pk=sha256)
+
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image_format = image.format
+            width, height = image.size
+            image.verify()
+    except Image.DecompressionBombError:
+        raise InvalidImage(f"Image is larger than {MAX_PIXELS} pixels")
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise InvalidImage("File is not a valid image")
+    if width * height > MAX_PIXELS:
+        raise InvalidImage(f"Image is larger than {MAX_PIXELS} pixels")
+    if image_format not in ALLOWED_FORMATS:
+        raise InvalidImage(f"Supported formats: {', '.join(ALLOWED_FORMATS)}")
+
+    path = original_path(sha256, ALLOWED_FORMATS[image_format])
+    if not default_storage.exists(path):
+        default_storage.save(path, ContentFile(content))
+    try:
+        with transaction.atomic():
+            return DishImage.objects.create(sha256=sha256, original=path, width=width, height=height,
+                                            size=len(content))
+    except IntegrityError:
+        # Параллельная загрузка того же файла успела создать запись раньше
+        DishImage.objects.filter(pk=sha256).update(uploads=F('uploads') + 1)
+        return DishImage.objects.get(pk=sha256)
+
+
+def render_variant(original, variant):
+    """Уменьшает оригинал до ширины варианта (без увеличения) и кодирует в WebP."""
+    with default_storage.open(original) as source, Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        width = VARIANTS[variant]
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return output.getvalue()
+
+
+def _generate(original, sha256, variant):
+    path = variant_path(sha256, variant)
+    if not default_storage.exists(path):
+        default_storage.save(path, ContentFile(render_variant(original, variant)))
+    return path
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.DISH_IMAGE_WORKERS,
+                                           thread_name_prefix='dish-images')
+        return _executor
+
+
+def ensure_variant(image, variant):
+    """
+    Путь к варианту в хранилище; при первом запросе вариант генерируется в пуле потоков.
+    Одновременные запросы одного и того же варианта ждут одну задачу, а не рендерят его повторно.
+    """
+    path = variant_path(image.sha256, variant)
+    if default_storage.exists(path):
+        return path
+
+    key = (image.sha256, variant)
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        if future is None:
+            future = _in_flight[key] = get_executor().submit(_generate, image.original, image.sha256, variant)
+            future.add_done_callback(lambda _, key=key: _in_flight.pop(key, None))
+    return future.result()
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from dishes.recommendations import NEIGHBORS_PER_DISH, rebuild_cooccurrence, refresh_neighbors
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает соседей блюд для рекомендаций (по умолчанию только изменившиеся).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Перестроить матрицу совместных сохранений с нуля')
+        parser.add_argument('--top', type=int, default=NEIGHBORS_PER_DISH, help='Сколько соседей хранить на блюдо')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            rebuild_cooccurrence()
+        refreshed = refresh_neighbors(limit=options['top'])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed neighbors for {refreshed} dishes"))
@@ -0,0 +1,48 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F, Sum
+
+from dishes.images import VARIANTS, ensure_variant, render_variant
+from dishes.models import DishImage
+
+
+class Command(BaseCommand):
+    help = ('Заранее генерирует недостающие варианты фото блюд и печатает экономию места от дедупликации. '
+            'С --benchmark только измеряет скорость рендера на одном ядре, ничего не сохраняя.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--variant', choices=list(VARIANTS), action='append',
+                            help='Какие варианты генерировать (по умолчанию все)')
+        parser.add_argument('--benchmark', action='store_true', help='Замерить превью в секунду на ядро')
+        parser.add_argument('--limit', type=int, default=50, help='Сколько фото брать для --benchmark')
+
+    def handle(self, *args, **options):
+        variants = options['variant'] or list(VARIANTS)
+        images = DishImage.objects.order_by('created_at')
+
+        if options['benchmark']:
+            originals = list(images.values_list('original', flat=True)[:options['limit']])
+            for variant in variants:
+                started = time.perf_counter()
+                for original in originals:
+                    render_variant(original, variant)
+                elapsed = time.perf_counter() - started
+                rate = len(originals) / elapsed if elapsed else 0
+                self.stdout.write(f"{variant}: {rate:.1f} images/s per core ({len(originals)} images)")
+        else:
+            started = time.perf_counter()
+            tasks = [(image, variant) for image in images.iterator() for variant in variants]
+            with ThreadPoolExecutor(max_workers=settings.DISH_IMAGE_WORKERS) as executor:
+                generated = len(list(executor.map(lambda task: ensure_variant(*task), tasks)))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"Ensured {generated} variants in {elapsed:.1f}s "
+                              f"with {settings.DISH_IMAGE_WORKERS} workers")
+
+        stats = images.aggregate(stored=Sum('size'), uploaded=Sum(F('size') * F('uploads')))
+        stored, uploaded = stats['stored'] or 0, stats['uploaded'] or 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Originals: {stored} bytes stored for {uploaded} bytes uploaded, "
+            f"dedupe saved {uploaded - stored} bytes"))
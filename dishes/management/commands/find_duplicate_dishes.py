@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from dishes.dedup import find_duplicate_clusters, merge_dishes
+from dishes.models import Dish
+
+
+class Command(BaseCommand):
+    help = 'Ищет кластеры почти одинаковых блюд (MinHash/LSH + близость макросов) и при --merge сливает их.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--merge', action='store_true', help='Слить найденные кластеры в канонические блюда')
+
+    def handle(self, *args, **options):
+        clusters = find_duplicate_clusters()
+        names = dict(Dish.objects.filter(id__in=[pk for cluster in clusters for pk in cluster])
+                     .values_list('id', 'name'))
+
+        for canonical_id, *duplicate_ids in clusters:
+            self.stdout.write(f"{canonical_id} {names.get(canonical_id)!r} <- "
+                              + ', '.join(f"{pk} {names.get(pk)!r}" for pk in duplicate_ids))
+            if options['merge']:
+                moved = merge_dishes(canonical_id, duplicate_ids)
+                self.stdout.write(f"  merged, {moved} saved dishes remapped")
+
+        self.stdout.write(self.style.SUCCESS(f"Found {len(clusters)} clusters"))
+        if options['merge'] and clusters:
+            self.stdout.write("Run `build_dish_recommendations --full` to rebuild co-saves for merged dishes")
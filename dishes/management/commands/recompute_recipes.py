@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dishes.models import Dish
+from dishes.recipes import RecipeCycleError, recompute_recipes
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает БЖУ рецептов после правки блюд (например, в админке): указанные блюда '
+            'и все рецепты, куда они входят. Без --dish пересчитывает все рецепты.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dish', type=int, action='append', help='id изменённого блюда (можно несколько)')
+
+    def handle(self, *args, **options):
+        dish_ids = options['dish'] or list(Dish.objects.filter(is_recipe=True).values_list('id', flat=True))
+        try:
+            recomputed = recompute_recipes(dish_ids)
+        except RecipeCycleError as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f"Recomputed {recomputed} recipes"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from dishes.popularity import reconcile_save_counts
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики сохранений блюд с SavedDish и исправляет разошедшиеся '
+            '(например, после потери несброшенного буфера при рестарте), переводит рейтинг тренда '
+            'в текущую эпоху. Запускать периодически.')
+
+    def handle(self, *args, **options):
+        fixed = reconcile_save_counts()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled save counters, fixed {fixed} dishes"))
@@ -0,0 +1,136 @@
+import hashlib
+import threading
+
+import numpy as np
+from django.core.cache import cache
+
+from .models import CatalogVersion, Dish
+
+# Доли дневной нормы по приёмам пищи
+MEALS = (('breakfast', 0.25), ('lunch', 0.35), ('dinner', 0.30), ('snack', 0.10))
+
+ACTIVITY_FACTORS = {'low': 1.2, 'light': 1.375, 'moderate': 1.55, 'high': 1.725}
+GOAL_FACTORS = {'lose': 0.85, 'keep': 1.0, 'gain': 1.1}
+
+# Шаг округления целей: пользователи с близкими нормами получают один и тот же закэшированный план
+CALORIES_BUCKET = 50
+MACROS_BUCKET = 5
+
+# Веса отклонений по (калории, белки, жиры, углеводы) при оценке блюда
+SCORE_WEIGHTS = np.array([2.0, 1.0, 0.5, 0.5])
+CANDIDATES_PER_MEAL = 8
+# БЖУ в каталоге — на 100 г, поэтому для блюда подбирается вес порции под калории приёма в этих пределах
+PORTION_MIN_GRAMS = 50
+PORTION_MAX_GRAMS = 500
+PORTION_STEP_GRAMS = 10
+PLAN_CACHE_TIMEOUT = 60 * 60 * 24
+
+_catalog = {}
+_catalog_lock = threading.Lock()
+
+
+def daily_targets(user):
+    """
+    Дневная норма калорий и БЖУ по формуле Миффлина — Сан-Жеора.
+    Уровень активности и цель берутся из user.meta ('activity', 'goal'), по умолчанию 'light' и 'keep'.
+    Возвращает None, если в профиле не хватает роста, веса, пола или даты рождения.
+    """
+    age = user.calculate_age()
+    if not (user.height and user.weight and user.gender and age):
+        return None
+
+    weight = float(user.weight)
+    bmr = 10 * weight + 6.25 * user.height - 5 * age + (5 if user.gender == user.Gender.MALE else -161)
+    meta = user.meta or {}
+    calories = bmr * ACTIVITY_FACTORS.get(meta.get('activity'), ACTIVITY_FACTORS['light']) \
+        * GOAL_FACTORS.get(meta.get('goal'), GOAL_FACTORS['keep'])
+
+    proteins = min(1.8 * weight, calories * 0.3 / 4)
+    fats = calories * 0.3 / 9
+    carbohydrates = (calories - proteins * 4 - fats * 9) / 4
+    return {'callories': calories, 'proteins': proteins, 'fats': fats, 'carbohydrates': carbohydrates}
+
+
+def bucket_targets(targets):
+    """Округляет цели до шага корзины, чтобы кэш плана переиспользовался."""
+    return {'callories': round(targets['callories'] / CALORIES_BUCKET) * CALORIES_BUCKET,
+            **{field: round(targets[field] / MACROS_BUCKET) * MACROS_BUCKET
+               for field in ('proteins', 'fats', 'carbohydrates')}}
+
+
+def catalog_version():
+    return CatalogVersion.current()
+
+
+def load_catalog(version):
+    """
+    Каталог в виде массивов NumPy: ids и матрица (калории, белки, жиры, углеводы).
+    Держится в памяти процесса, пока не сменится версия каталога; потоки воркера загружают её один раз.
+    """
+    with _catalog_lock:
+        if _catalog.get('version') != version:
+            rows = Dish.objects.values_list('id', 'callories', 'proteins', 'fats', 'carbohydrates')
+            data = np.array(list(rows), dtype=np.float64).reshape(-1, 5)
+            _catalog.update(version=version, ids=data[:, 0].astype(np.int64), macros=data[:, 1:])
+        return _catalog['ids'], _catalog['macros']
+
+
+def solve_plan(ids, macros, targets, days, seed=0):
+    """
+    Жадный план: для каждого приёма пищи всем блюдам подбирается вес порции под калории приёма,
+    и порции оцениваются одной векторной операцией (взвешенная квадратичная относительная ошибка
+    к цели приёма); из нескольких лучших выбирается одно. macros — на 100 г.
+    Цель следующего приёма учитывает недобор или перебор уже выбранных, поэтому день сходится к норме.
+    Внутри плана блюда не повторяются, пока каталог это позволяет.
+    """
+    target = np.array([targets['callories'], targets['proteins'], targets['fats'], targets['carbohydrates']])
+    scale = SCORE_WEIGHTS / np.maximum(target, 1.0) ** 2
+    rng = np.random.default_rng(seed)
+    used = np.zeros(len(ids), dtype=bool)
+    plan = []
+
+    for _ in range(days):
+        remaining, remaining_share = target.copy(), 1.0
+        meals = []
+        for meal, share in MEALS:
+            meal_target = remaining * (share / remaining_share)
+            grams = np.clip(np.round(meal_target[0] / np.maximum(macros[:, 0], 1.0) * 100 / PORTION_STEP_GRAMS)
+                            * PORTION_STEP_GRAMS, PORTION_MIN_GRAMS, PORTION_MAX_GRAMS)
+            portions = macros * (grams / 100)[:, None]
+            scores = ((portions - meal_target) ** 2) @ scale
+            if used.all():
+                used[:] = False
+            scores[used] = np.inf
+
+            k = min(CANDIDATES_PER_MEAL, len(ids))
+            candidates = np.argpartition(scores, k - 1)[:k]
+            candidates = candidates[np.isfinite(scores[candidates])]
+            best = candidates[np.argsort(scores[candidates])[:max(1, k // 2)]]
+            index = int(rng.choice(best))
+
+            used[index] = True
+            remaining = remaining - portions[index]
+            remaining_share -= share
+            meals.append({'meal': meal, 'dish_id': int(ids[index]), 'grams': int(grams[index])})
+        totals = target - remaining
+        plan.append({'meals': meals, 'totals': dict(zip(('callories', 'proteins', 'fats', 'carbohydrates'),
+                                                        (round(float(value), 1) for value in totals)))})
+    return plan
+
+
+def get_meal_plan(targets, days=1):
+    """План на days дней для целей targets; решения кэшируются по корзине целей и версии каталога."""
+    targets = bucket_targets(targets)
+    version = catalog_version()
+    bucket = f"{days}:{targets['callories']}:{targets['proteins']}:{targets['fats']}:{targets['carbohydrates']}"
+    cache_key = f"mealplan:{version}:{bucket}"
+
+    plan = cache.get(cache_key)
+    if plan is None:
+        ids, macros = load_catalog(version)
+        if not len(ids):
+            return targets, []
+        seed = int(hashlib.md5(bucket.encode()).hexdigest()[:8], 16)
+        plan = solve_plan(ids, macros, targets, days, seed=seed)
+        cache.set(cache_key, plan, PLAN_CACHE_TIMEOUT)
+    return targets, plan
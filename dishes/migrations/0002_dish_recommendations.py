@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DishNeighbors',
+            fields=[
+                ('dish', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='neighbors', serialize=False, to='dishes.dish')),
+                ('neighbors', models.JSONField(default=list)),
+                ('is_stale', models.BooleanField(db_index=True, default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DishCooccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cooccurrences', to='dishes.dish')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dishes.dish')),
+            ],
+            options={
+                'unique_together': {('dish', 'other')},
+            },
+        ),
+    ]
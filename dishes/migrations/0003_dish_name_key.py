@@ -0,0 +1,42 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:07
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+from transliterate import translit
+
+
+def normalize_name(name):
+    # Копия dishes.utils.normalize_name на момент миграции: правки функции не должны менять её результат
+    name = unicodedata.normalize('NFKC', name or '').lower().replace('ё', 'е')
+    name = translit(name, 'ru', reversed=True).lower()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', name).split())
+
+
+def fill_name_key(apps, schema_editor):
+    Dish = apps.get_model('dishes', 'Dish')
+    batch = []
+    for dish in Dish.objects.only('id', 'name').iterator(chunk_size=2000):
+        dish.name_key = normalize_name(dish.name)
+        batch.append(dish)
+        if len(batch) >= 2000:
+            Dish.objects.bulk_update(batch, ['name_key'])
+            batch = []
+    Dish.objects.bulk_update(batch, ['name_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0002_dish_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='name_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255, verbose_name='Нормализованное название'),
+        ),
+        migrations.RunPython(fill_name_key, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0003_dish_name_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DishImage',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='SHA-256')),
+                ('original', models.CharField(max_length=255, verbose_name='Путь к оригиналу')),
+                ('width', models.PositiveIntegerField(verbose_name='Ширина')),
+                ('height', models.PositiveIntegerField(verbose_name='Высота')),
+                ('size', models.PositiveIntegerField(verbose_name='Размер, байт')),
+                ('uploads', models.PositiveIntegerField(default=1, verbose_name='Число загрузок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='dishes', to='dishes.dishimage', verbose_name='Фото'),
+        ),
+    ]
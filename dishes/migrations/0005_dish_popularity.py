@@ -0,0 +1,43 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_save_counts(apps, schema_editor):
+    # Начальные значения — одним UPDATE с коррелированным подзапросом; дальше счётчик ведёт буфер
+    Dish = apps.get_model('dishes', 'Dish')
+    SavedDish = apps.get_model('dishes', 'SavedDish')
+    counts = (SavedDish.objects.filter(dish=OuterRef('pk'), is_saved=True).order_by()
+              .values('dish').annotate(total=Count('id')).values('total'))
+    Dish.objects.update(save_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0004_dish_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='save_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Число сохранений'),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='trend_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Затухающий рейтинг сохранений'),
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['save_count', 'id'], name='dish_save_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['trend_score', 'id'], name='dish_trend_score_idx'),
+        ),
+        migrations.RunPython(backfill_save_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0006_recipes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='trend_epoch',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Эпоха рейтинга'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:48
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    # Единственная строка счётчика; CatalogVersion.bump только обновляет её
+    apps.get_model('dishes', 'CatalogVersion').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0007_dish_trend_epoch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:51
+
+import re
+import unicodedata
+from functools import reduce
+from operator import or_
+
+from django.db import migrations
+from django.db.models import Q
+from transliterate import translit
+
+
+def normalize_name(name):
+    # Копия dishes.utils.normalize_name на момент миграции: ь/ъ выбрасываются до транслитерации
+    name = unicodedata.normalize('NFKC', name or '').lower().replace('ё', 'е').replace('ь', '').replace('ъ', '')
+    name = translit(name, 'ru', reversed=True).lower()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', name).split())
+
+
+def refill_name_key(apps, schema_editor):
+    # Ключ изменился только у названий с мягким или твёрдым знаком
+    Dish = apps.get_model('dishes', 'Dish')
+    signs = reduce(or_, (Q(name__contains=sign) for sign in 'ьъЬЪ'))
+    batch = []
+    for dish in Dish.objects.filter(signs).only('id', 'name').iterator(chunk_size=2000):
+        dish.name_key = normalize_name(dish.name)
+        batch.append(dish)
+        if len(batch) >= 2000:
+            Dish.objects.bulk_update(batch, ['name_key'])
+            batch = []
+    Dish.objects.bulk_update(batch, ['name_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0008_catalog_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(refill_name_key, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,23 @@
 # dishes/models.py
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+
+from .utils import normalize_name
+
+
+class DishImage(models.Model):
+    """Оригинал фото блюда, адресуемый по SHA-256 содержимого: одинаковые загрузки хранятся один раз."""
+    sha256 = models.CharField(max_length=64, primary_key=True, verbose_name='SHA-256')
+    original = models.CharField(max_length=255, verbose_name='Путь к оригиналу')
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    height = models.PositiveIntegerField(verbose_name='Высота')
+    size = models.PositiveIntegerField(verbose_name='Размер, байт')
+    uploads = models.PositiveIntegerField(default=1, verbose_name='Число загрузок')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')
+
+    def __str__(self):
+        return self.sha256
 
 
 class Dish(models.Model):
@@ -9,18 +26,86 @@ class Dish(models.Model):
     fats = models.FloatField(verbose_name='Жиры')
     proteins = models.FloatField(verbose_name='Протеин')
     carbohydrates = models.FloatField(verbose_name='Углеводы')
+    name_key = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False,
+                                verbose_name='Нормализованное название')
+    image = models.ForeignKey(DishImage, on_delete=models.SET_NULL, null=True, blank=True, related_name='dishes',
+                              verbose_name='Фото')
+    # Для рецептов БЖУ на 100 г не вводятся, а сворачиваются из ингредиентов (dishes.recipes)
+    is_recipe = models.BooleanField(default=False, editable=False, verbose_name='Рецепт')
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name='recipes', verbose_name='Автор рецепта')
+    # Денормализованные счётчики популярности, пишутся через буфер dishes.popularity
+    save_count = models.IntegerField(default=0, editable=False, verbose_name='Число сохранений')
+    trend_score = models.FloatField(default=0, editable=False, verbose_name='Затухающий рейтинг сохранений')
+    # Эпоха, к началу которой отнормирован trend_score (см. dishes.popularity.trend_epoch)
+    trend_epoch = models.IntegerField(default=0, editable=False, verbose_name='Эпоха рейтинга')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    # Время последней правки того, что видно в списках (название, БЖУ, фото): входит в ETag списков блюд.
+    # Массовые UPDATE (пересчёт рецептов, смена фото) проставляют его сами
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['save_count', 'id'], name='dish_save_count_idx'),
+            models.Index(fields=['trend_score', 'id'], name='dish_trend_score_idx'),
+        ]
+
+    MACRO_FIELDS = ('callories', 'proteins', 'fats', 'carbohydrates')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_macros = instance.macros()
+        return instance
+
+    def macros(self):
+        """БЖУ блюда или None, если какое-то из полей отложено (only/defer)."""
+        if self.get_deferred_fields() & set(self.MACRO_FIELDS):
+            return None
+        return tuple(getattr(self, field) for field in self.MACRO_FIELDS)
 
     def save(self, *args, **kwargs):
+        self.name_key = normalize_name(self.name)
         if not self.callories:
             self.callories = round(
                 (float(self.proteins) * 4) + (float(self.carbohydrates) * 4) + (float(self.fats) * 9))
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        # Версию каталога поднимают только изменённые БЖУ уже существующего блюда. Новое блюдо (в том числе
+        # анонимное из DishCreateView) в загруженном каталоге отсутствует и закэшированные планы не портит;
+        # переименование и смена фото на план не влияют. Неизвестные БЖУ (отложенные поля) считаем изменёнными
+        macros = self.macros()
+        if not adding and (macros is None or macros != getattr(self, '_loaded_macros', None)):
+            CatalogVersion.bump()
+        self._loaded_macros = macros
+
+    def delete(self, *args, **kwargs):
+        CatalogVersion.bump()
+        return super().delete(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
 
+class CatalogVersion(models.Model):
+    """
+    Версия каталога блюд для кэша плана питания: одна строка, которую поднимают правки БЖУ
+    (Dish.save существующего блюда с изменёнными БЖУ, Dish.delete, пересчёт рецептов, слияние,
+    генерация данных). Новые блюда версию не поднимают и попадают в план со следующей правкой.
+    Чтение — по первичному ключу.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        # После коммита и отдельным UPDATE: строка общая, блокировка не должна жить до конца чужой транзакции
+        transaction.on_commit(lambda: cls.objects.filter(pk=1).update(version=F('version') + 1))
+
+
 class SavedDish(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     dish = models.ForeignKey(Dish, on_delete=models.CASCADE)
@@ -28,3 +113,43 @@ class SavedDish(models.Model):
 
     class Meta:
         unique_together = ('user', 'dish')
+
+    @classmethod
+    def bump_versions_for(cls, dish_ids):
+        """
+        Поднимает saved_dishes_version у всех, кто сохранил эти блюда: содержимое строк в их списках
+        (БЖУ, фото) изменилось, и закэшированный клиентом ETag больше не должен давать 304.
+        """
+        from django.contrib.auth import get_user_model
+
+        saved_by = cls.objects.filter(dish_id__in=dish_ids, is_saved=True).values('user_id')
+        return get_user_model().objects.filter(pk__in=saved_by).update(
+            saved_dishes_version=F('saved_dishes_version') + 1)
+
+
+class RecipeIngredient(models.Model):
+    """Ребро графа рецептов: ингредиент (блюдо или другой рецепт) и его вес в граммах."""
+    recipe = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='ingredients')
+    ingredient = models.ForeignKey(Dish, on_delete=models.PROTECT, related_name='used_in')
+    grams = models.FloatField(verbose_name='Вес, г')
+
+    class Meta:
+        unique_together = ('recipe', 'ingredient')
+
+
+class DishCooccurrence(models.Model):
+    """Ненулевая ячейка разреженной матрицы совместных сохранений блюд (формат COO)."""
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='cooccurrences')
+    other = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='+')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('dish', 'other')
+
+
+class DishNeighbors(models.Model):
+    """Предрассчитанные top-N похожих блюд: чтение рекомендаций — поиск по ключу, а не join."""
+    dish = models.OneToOneField(Dish, on_delete=models.CASCADE, primary_key=True, related_name='neighbors')
+    neighbors = models.JSONField(default=list)  # [[dish_id, score], ...] по убыванию score
+    is_stale = models.BooleanField(default=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
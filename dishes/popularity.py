@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, Value, When
+from django.db.models.functions import Power
+from django.utils import timezone
+
+from core.counters import counters
+
+from .models import Dish, SavedDish
+
+# Вклад сохранения в trend_score вдвое меньше, чем у сохранения, сделанного неделю спустя
+TREND_HALF_LIFE = timedelta(days=7)
+# Вес сохранения растёт как 2^(t / half-life) от начала текущей эпохи trend_epoch: так старые очки
+# не нужно пересчитывать на каждое сохранение, а порядок по trend_score совпадает с порядком по
+# затухающей сумме. При смене эпохи очки один раз масштабируются к новой, поэтому вес не больше 2^4
+TREND_ORIGIN = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+TREND_EPOCH_LENGTH = timedelta(weeks=4)
+# Ниже этого очки неотличимы от нуля — при смене эпохи обнуляются, чтобы не тащить их бесконечно
+TREND_FLOOR = 1e-6
+RECONCILE_CHUNK = 1000
+
+
+def trend_epoch(now):
+    return (now - TREND_ORIGIN) // TREND_EPOCH_LENGTH
+
+
+def trend_weight(now):
+    """Вес сохранения в момент now относительно начала его эпохи."""
+    return 2.0 ** ((now - TREND_ORIGIN - trend_epoch(now) * TREND_EPOCH_LENGTH) / TREND_HALF_LIFE)
+
+
+def rebase_trend_scores(epoch):
+    """
+    Переводит очки из прошлых эпох в эпоху epoch: умножает на 2^(-прошедших half-life).
+    Затрагивает только строки старых эпох, так что повторный вызов ничего не делает.
+    """
+    per_epoch = TREND_EPOCH_LENGTH / TREND_HALF_LIFE
+    stale = Dish.objects.filter(trend_epoch__lt=epoch, trend_score__gt=0)
+    rebased = stale.update(trend_score=F('trend_score') * Power(Value(2.0), (F('trend_epoch') - epoch) * per_epoch),
+                           trend_epoch=epoch)
+    if rebased:
+        Dish.objects.filter(trend_score__gt=0, trend_score__lt=TREND_FLOOR).update(trend_score=0)
+    return rebased
+
+
+def write_trend_scores(deltas):
+    """
+    Сброс буфера для trend_score: в буфере копится число новых сохранений, вес берётся на момент
+    сброса (отличие от момента сохранения — секунды при половине жизни в неделю).
+    """
+    now = timezone.now()
+    epoch, weight = trend_epoch(now), trend_weight(now)
+    with transaction.atomic():
+        rebase_trend_scores(epoch)
+        Dish.objects.filter(pk__in=deltas).update(trend_epoch=epoch, trend_score=F('trend_score') + Case(
+            *[When(pk=pk, then=Value(count * weight)) for pk, count in deltas.items()],
+            default=Value(0.0), output_field=FloatField()))
+
+
+counters.register_writer(Dish, 'trend_score', write_trend_scores)
+
+
+def record_saves(deltas):
+    """
+    Ставит изменения сохранений {dish_id: +n/-n} в буфер счётчиков после коммита транзакции.
+    В trend_score идут только новые сохранения — это сигнал «сейчас сохраняют», а не текущее состояние.
+    """
+    deltas = {dish_id: delta for dish_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    def apply():
+        for dish_id, delta in deltas.items():
+            counters.add(Dish, dish_id, 'save_count', delta)
+            if delta > 0:
+                counters.add(Dish, dish_id, 'trend_score', delta)
+
+    transaction.on_commit(apply)
+
+
+def reconcile_save_counts():
+    """
+    Сверяет save_count с SavedDish: один GROUP BY, потоковое чтение счётчиков и
+    UPDATE ... CASE пачками только для разошедшихся строк. Возвращает число исправленных блюд.
+    trend_score так не сверить — у SavedDish нет времени сохранения; потерянные при сбое приращения
+    тренда не восстанавливаются, но их вклад затухает вместе с остальными за несколько недель.
+    Заодно очки тренда переводятся в текущую эпоху, если за эпоху не было ни одного сохранения.
+    """
+    counters.flush()
+    rebase_trend_scores(trend_epoch(timezone.now()))
+    actual = dict(SavedDish.objects.filter(is_saved=True).order_by().values('dish_id')
+                  .annotate(total=Count('id')).values_list('dish_id', 'total'))
+    drifted = {dish_id: actual.get(dish_id, 0)
+               for dish_id, save_count in Dish.objects.values_list('id', 'save_count').iterator(RECONCILE_CHUNK)
+               if save_count != actual.get(dish_id, 0)}
+
+    ids = list(drifted)
+    for start in range(0, len(ids), RECONCILE_CHUNK):
+        chunk = ids[start:start + RECONCILE_CHUNK]
+        Dish.objects.filter(pk__in=chunk).update(save_count=Case(
+            *[When(pk=dish_id, then=Value(drifted[dish_id])) for dish_id in chunk], output_field=IntegerField()))
+    return len(drifted)
+
+
+def popular_dishes(sort='saves', limit=20):
+    """Самые сохраняемые (sort=saves) или набирающие популярность (sort=trending) блюда — чтение по индексу."""
+    field = 'trend_score' if sort == 'trending' else 'save_count'
+    return Dish.objects.filter(**{f'{field}__gt': 0}).order_by(f'-{field}', '-id')[:limit]
@@ -0,0 +1,146 @@
+from graphlib import CycleError, TopologicalSorter
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import CatalogVersion, Dish, RecipeIngredient, SavedDish
+
+MACRO_FIELDS = ('callories', 'proteins', 'fats', 'carbohydrates')
+RECIPE_MAX_INGREDIENTS = 100
+RECIPE_MAX_GRAMS = 100000
+
+
+class RecipeError(ValueError):
+    pass
+
+
+class RecipeCycleError(RecipeError):
+    pass
+
+
+def ancestor_ids(dish_ids):
+    """
+    Все рецепты, в которые блюда входят прямо или через подрецепты, — одним рекурсивным CTE
+    вместо запроса на каждый уровень вложенности. UNION (а не UNION ALL) гарантирует остановку и на цикле.
+    """
+    dish_ids = list(dish_ids)
+    if not dish_ids:
+        return set()
+    edges = RecipeIngredient._meta.db_table
+    placeholders = ', '.join(['%s'] * len(dish_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH RECURSIVE ancestors(id) AS ("
+            f"SELECT recipe_id FROM {edges} WHERE ingredient_id IN ({placeholders}) "
+            f"UNION SELECT e.recipe_id FROM {edges} e JOIN ancestors a ON e.ingredient_id = a.id"
+            f") SELECT id FROM ancestors", dish_ids)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def rollup(items):
+    """БЖУ на 100 г смеси из [(grams, {поле: значение на 100 г})]. Калории округляются, как в Dish."""
+    total = sum(grams for grams, _ in items)
+    macros = {field: sum(grams * values[field] for grams, values in items) / total for field in MACRO_FIELDS}
+    macros['callories'] = round(macros['callories'])
+    for field in ('proteins', 'fats', 'carbohydrates'):
+        macros[field] = round(macros[field], 2)
+    return macros
+
+
+def recompute_recipes(recipe_ids):
+    """
+    Пересчитывает БЖУ рецептов и всех их предков: один запрос на предков, один на рёбра с макросами
+    ингредиентов, один bulk_update и UPDATE версий списков сохранённых и каталога. Порядок — топологический,
+    поэтому рецепт видит уже пересчитанные подрецепты. Возвращает число пересчитанных рецептов.
+    """
+    affected = set(recipe_ids) | ancestor_ids(recipe_ids)
+    if not affected:
+        return 0
+
+    graph = {recipe_id: set() for recipe_id in affected}
+    items = {recipe_id: [] for recipe_id in affected}
+    macros = {}
+    for recipe_id, ingredient_id, grams, *values in RecipeIngredient.objects.filter(recipe_id__in=affected).values_list(
+            'recipe_id', 'ingredient_id', 'grams', *(f'ingredient__{field}' for field in MACRO_FIELDS)):
+        items[recipe_id].append((ingredient_id, grams))
+        macros.setdefault(ingredient_id, dict(zip(MACRO_FIELDS, values)))
+        if ingredient_id in affected:
+            graph[recipe_id].add(ingredient_id)
+
+    try:
+        order = list(TopologicalSorter(graph).static_order())
+    except CycleError as error:
+        raise RecipeCycleError(f"Recipes form a cycle: {error.args[1]}")
+
+    recipes = []
+    now = timezone.now()
+    for recipe_id in order:
+        if not items[recipe_id]:
+            continue
+        macros[recipe_id] = rollup([(grams, macros[ingredient_id]) for ingredient_id, grams in items[recipe_id]])
+        recipes.append(Dish(id=recipe_id, updated_at=now, **macros[recipe_id]))
+    Dish.objects.bulk_update(recipes, [*MACRO_FIELDS, 'updated_at'], batch_size=500)
+    SavedDish.bump_versions_for([recipe.id for recipe in recipes])
+    CatalogVersion.bump()
+    return len(recipes)
+
+
+def parse_ingredients(data):
+    """Проверяет [{"id": 1, "grams": 150}, ...] и возвращает {dish_id: grams}; повтор id складывает граммы."""
+    if not isinstance(data, list) or not data or len(data) > RECIPE_MAX_INGREDIENTS:
+        raise RecipeError(f"ingredients must be a list of 1 to {RECIPE_MAX_INGREDIENTS} items")
+    ingredients = {}
+    for item in data:
+        try:
+            dish_id, grams = int(item['id']), float(item['grams'])
+        except (TypeError, KeyError, ValueError):
+            raise RecipeError("each ingredient needs an integer id and grams")
+        if not 0 < grams <= RECIPE_MAX_GRAMS:
+            raise RecipeError(f"grams must be between 0 and {RECIPE_MAX_GRAMS}")
+        ingredients[dish_id] = ingredients.get(dish_id, 0) + grams
+    return ingredients
+
+
+def set_ingredients(recipe, ingredients):
+    """
+    Заменяет состав рецепта и пересчитывает его вместе с предками. Ингредиент, который сам
+    (прямо или через подрецепты) содержит этот рецепт, дал бы цикл — такой состав отклоняется.
+    """
+    missing = set(ingredients) - set(Dish.objects.filter(id__in=ingredients).values_list('id', flat=True))
+    if missing:
+        raise RecipeError(f"Dish not found: {sorted(missing)}")
+
+    with transaction.atomic():
+        cyclic = set(ingredients) & (ancestor_ids([recipe.id]) | {recipe.id})
+        if cyclic:
+            raise RecipeCycleError(f"Ingredients would create a cycle: {sorted(cyclic)}")
+        RecipeIngredient.objects.filter(recipe=recipe).delete()
+        RecipeIngredient.objects.bulk_create(
+            [RecipeIngredient(recipe=recipe, ingredient_id=dish_id, grams=grams)
+             for dish_id, grams in ingredients.items()])
+        # Параллельная правка могла замкнуть цикл в обход проверки выше — тогда пересчёт его найдёт и откатит
+        recompute_recipes([recipe.id])
+    recipe.refresh_from_db(fields=MACRO_FIELDS)
+
+
+def repoint_ingredients(canonical_id, duplicate_ids):
+    """
+    При слиянии дубликатов рецепты начинают ссылаться на каноническое блюдо; если в рецепте
+    были оба, граммы складываются. Возвращает id рецептов, которые нужно пересчитать.
+    """
+    grams = {}
+    for recipe_id, weight in (RecipeIngredient.objects.filter(ingredient_id__in=[canonical_id, *duplicate_ids])
+                              .exclude(recipe_id__in=[canonical_id, *duplicate_ids])
+                              .values_list('recipe_id', 'grams')):
+        grams[recipe_id] = grams.get(recipe_id, 0) + weight
+    RecipeIngredient.objects.filter(ingredient_id__in=duplicate_ids).delete()
+    RecipeIngredient.objects.bulk_create(
+        [RecipeIngredient(recipe_id=recipe_id, ingredient_id=canonical_id, grams=weight)
+         for recipe_id, weight in grams.items()],
+        update_conflicts=True, unique_fields=['recipe', 'ingredient'], update_fields=['grams'])
+    return set(grams)
+
+
+def ingredient_rows(recipe):
+    return [{'id': dish_id, 'name': name, 'grams': grams} for dish_id, name, grams in
+            recipe.ingredients.order_by('id').values_list('ingredient_id', 'ingredient__name', 'grams')]
@@ -0,0 +1,142 @@
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+
+from .models import Dish, DishCooccurrence, DishNeighbors, SavedDish
+
+NEIGHBORS_PER_DISH = 20
+REFRESH_CHUNK_SIZE = 500
+# Не больше параметров в одном IN, чем допускает SQLite
+POPULARITY_BATCH_SIZE = 10000
+
+
+def record_save_change(user, dish_id, delta):
+    """
+    Инкрементально обновляет матрицу совместных сохранений, когда пользователь
+    сохранил (delta=1) или убрал из сохранённых (delta=-1) блюдо, и помечает
+    затронутые блюда на пересчёт соседей.
+    """
+    others = set(SavedDish.objects.filter(user=user, is_saved=True).exclude(dish_id=dish_id)
+                 .values_list('dish_id', flat=True))
+    after = others | {dish_id} if delta > 0 else others
+    before = others if delta > 0 else others | {dish_id}
+    record_saved_set_change(before, after)
+
+
+def record_saved_set_change(before, after):
+    """
+    Применяет к матрице разницу между набором сохранённых блюд пользователя до и после изменения
+    за постоянное число запросов: +1 для пар с добавленными блюдами, -1 для пар с убранными.
+    """
+    added, removed = after - before, before - after
+    if not added and not removed:
+        return
+    # Изменённые блюда помечаются всегда: даже без пар их число сохранений и соседи могли поменяться
+    touched = (after if added else set()) | (before if removed else set()) | added | removed
+
+    with transaction.atomic():
+        if added and len(after) > 1:
+            # Недостающие ячейки — одним INSERT ... SELECT по парам блюд: bulk_create на |added| * |after|
+            # ячеек разбился бы на десятки запросов из-за лимита параметров
+            create_missing_cells(added, after)
+            DishCooccurrence.objects.filter(Q(dish_id__in=added, other_id__in=after)
+                                            | Q(dish_id__in=after, other_id__in=added)).update(count=F('count') + 1)
+        if removed and len(before) > 1:
+            DishCooccurrence.objects.filter(Q(dish_id__in=removed, other_id__in=before)
+                                            | Q(dish_id__in=before, other_id__in=removed)).update(count=F('count') - 1)
+        DishNeighbors.objects.bulk_create([DishNeighbors(dish_id=pk, is_stale=True) for pk in touched],
+                                          update_conflicts=True, unique_fields=['dish'], update_fields=['is_stale'])
+
+
+def create_missing_cells(added, after):
+    """Создаёт нулевые ячейки для всех пар (a, b), a != b, из after, где хотя бы одно блюдо из added."""
+    dishes = Dish._meta.db_table
+    cooc = DishCooccurrence._meta.db_table
+    after, added = list(after), list(added)
+    after_in, added_in = ', '.join(['%s'] * len(after)), ', '.join(['%s'] * len(added))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {cooc} (dish_id, other_id, count) "
+            f"SELECT a.id, b.id, 0 FROM {dishes} a JOIN {dishes} b ON a.id <> b.id "
+            f"WHERE a.id IN ({after_in}) AND b.id IN ({after_in}) "
+            f"AND (a.id IN ({added_in}) OR b.id IN ({added_in})) "
+            f"ON CONFLICT (dish_id, other_id) DO NOTHING", after + after + added + added)
+
+
+def rebuild_cooccurrence():
+    """Полная перестройка матрицы одним INSERT ... SELECT по самосоединению сохранений."""
+    saved = SavedDish._meta.db_table
+    cooc = DishCooccurrence._meta.db_table
+    with transaction.atomic():
+        DishCooccurrence.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {cooc} (dish_id, other_id, count) "
+                f"SELECT a.dish_id, b.dish_id, COUNT(*) FROM {saved} a "
+                f"JOIN {saved} b ON a.user_id = b.user_id AND a.dish_id <> b.dish_id "
+                f"WHERE a.is_saved AND b.is_saved GROUP BY a.dish_id, b.dish_id")
+        DishNeighbors.objects.all().delete()
+        DishNeighbors.objects.bulk_create(
+            [DishNeighbors(dish_id=pk) for pk in
+             DishCooccurrence.objects.values_list('dish_id', flat=True).distinct().iterator()],
+            batch_size=REFRESH_CHUNK_SIZE)
+
+
+def refresh_neighbors(limit=NEIGHBORS_PER_DISH):
+    """
+    Пересчитывает top-N соседей только для помеченных блюд.
+    Оценка — косинусная мера: count / sqrt(n_a * n_b), где n — число сохранений блюда.
+    """
+    refreshed = 0
+    # Число сохранений блюда считается один раз за вызов: соседи соседних чанков в основном общие,
+    # и без этого каждый чанк заново агрегировал сохранения почти всего каталога
+    popularity = {}
+    while True:
+        stale_ids = list(DishNeighbors.objects.filter(is_stale=True).values_list('dish_id', flat=True)
+                         [:REFRESH_CHUNK_SIZE])
+        if not stale_ids:
+            return refreshed
+
+        pairs = defaultdict(list)
+        for dish_id, other_id, count in DishCooccurrence.objects.filter(dish_id__in=stale_ids, count__gt=0
+                                                                        ).values_list('dish_id', 'other_id', 'count'):
+            pairs[dish_id].append((other_id, count))
+
+        involved = set(stale_ids).union(other_id for rows in pairs.values() for other_id, _ in rows)
+        missing = sorted(involved.difference(popularity))
+        for start in range(0, len(missing), POPULARITY_BATCH_SIZE):
+            batch = missing[start:start + POPULARITY_BATCH_SIZE]
+            popularity.update(dict.fromkeys(batch, 0))
+            popularity.update(SavedDish.objects.filter(is_saved=True, dish_id__in=batch).values('dish_id')
+                              .annotate(n=Count('id')).values_list('dish_id', 'n'))
+
+        updated = []
+        for dish_id in stale_ids:
+            n_dish = popularity.get(dish_id, 0)
+            scored = [(other_id, count / math.sqrt(n_dish * popularity[other_id]))
+                      for other_id, count in pairs.get(dish_id, []) if n_dish and popularity.get(other_id)]
+            top = heapq.nlargest(limit, scored, key=lambda item: item[1])
+            updated.append(DishNeighbors(dish_id=dish_id, neighbors=[[pk, round(score, 4)] for pk, score in top],
+                                         is_stale=False))
+        # Upsert по первичному ключу вместо bulk_update: тот строит CASE WHEN на каждую строку, и на больших
+        # каталогах сборка выражений в Django занимала почти половину времени пересчёта
+        DishNeighbors.objects.bulk_create(updated, update_conflicts=True, unique_fields=['dish'],
+                                          update_fields=['neighbors', 'is_stale', 'updated_at'])
+        refreshed += len(updated)
+
+
+def recommend_for_user(user, limit=20):
+    """Рекомендации: суммирует предрассчитанных соседей сохранённых блюд, исключая уже сохранённые."""
+    saved_ids = set(SavedDish.objects.filter(user=user, is_saved=True).values_list('dish_id', flat=True))
+    if not saved_ids:
+        return []
+
+    scores = defaultdict(float)
+    for neighbors in DishNeighbors.objects.filter(dish_id__in=saved_ids).values_list('neighbors', flat=True):
+        for dish_id, score in neighbors:
+            if dish_id not in saved_ids:
+                scores[dish_id] += score
+    return [dish_id for dish_id, _ in heapq.nlargest(limit, scores.items(), key=lambda item: item[1])]
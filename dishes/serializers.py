@@ -1,21 +1,33 @@
+from django.db.models import Exists, OuterRef
 from rest_framework import serializers
 
+from core.fieldsets import SparseFieldsSerializerMixin
+
+from .images import image_url
 from .models import Dish, SavedDish
 
+DISH_LIST_FIELDS = ('id', 'name', 'callories', 'fats', 'proteins', 'carbohydrates')
+# Всё, что можно запросить через ?fields= у списков блюд
+DISH_ROW_FIELDS = (*DISH_LIST_FIELDS, 'image', 'is_saved')
+
 
-class DishSerializer(serializers.ModelSerializer):
+class DishSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     is_saved = serializers.SerializerMethodField()
+    image = serializers.SerializerMethodField()
 
     class Meta:
         model = Dish
-        fields = ['id', 'name', 'callories', 'fats', 'proteins', 'carbohydrates', 'is_saved']
+        fields = ['id', 'name', 'callories', 'fats', 'proteins', 'carbohydrates', 'image', 'is_saved']
         extra_kwargs = {'callories': {'required': False}}
 
     def get_is_saved(self, obj):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
-        return obj.saved_by.filter(id=request.user.id).exists()
+        return SavedDish.objects.filter(user=request.user, dish=obj, is_saved=True).exists()
+
+    def get_image(self, obj):
+        return image_url(obj.image_id)
 
     def create(self, validated_data):
         if 'callories' not in validated_data or validated_data['callories'] is None:
@@ -25,3 +37,28 @@ class DishSerializer(serializers.ModelSerializer):
             calories = round(proteins * 4 + carbs * 4 + fats * 9)
             validated_data['callories'] = calories
         return super().create(validated_data)
+
+
+def dish_rows(queryset, user, fields=None):
+    """
+    Быстрый путь для списков только на чтение: строки собираются через values(),
+    без создания экземпляров Dish и без полей DRF. Формат совпадает с DishSerializer;
+    фото отдаётся только адресом превью. fields (из ?fields=) сужает SELECT: невыбранные
+    колонки не читаются, а подзапрос is_saved не строится.
+    """
+    fields = DISH_ROW_FIELDS if fields is None else fields
+    columns = [name for name in DISH_LIST_FIELDS if name in fields]
+    if 'image' in fields:
+        columns.append('image_id')
+
+    if 'is_saved' not in fields:
+        rows = list(queryset.values(*columns))
+    elif not user or not user.is_authenticated:
+        rows = [dict(row, is_saved=False) for row in queryset.values(*columns)]
+    else:
+        saved = SavedDish.objects.filter(user=user, dish=OuterRef('pk'), is_saved=True)
+        rows = list(queryset.annotate(is_saved=Exists(saved)).values(*columns, 'is_saved'))
+    if 'image' in fields:
+        for row in rows:
+            row['image'] = image_url(row.pop('image_id'))
+    return rows
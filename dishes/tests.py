@@ -1,3 +1,269 @@
-from django.test import TestCase
+import io
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+import numpy as np
+from PIL import Image
+
+from core.testing import make_client
+from users.models import User
+from . import mealplan, popularity
+from .dedup import merge_dishes
+from .models import Dish, DishCooccurrence, DishNeighbors, RecipeIngredient, SavedDish
+from .utils import normalize_name
+
+
+def make_dishes(count):
+    return Dish.objects.bulk_create([Dish(name=f'Блюдо {i}', callories=100, fats=1, proteins=1, carbohydrates=1)
+                                     for i in range(count)])
+
+
+class SavedDishesBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=1, username='user', password='x')
+        self.client = make_client(self.user)
+        self.dishes = make_dishes(250)
+
+    def post_batch(self, changes):
+        return self.client.post('/api/dishes/my/batch/', {'changes': changes}, format='json')
+
+    def count_queries(self, dishes):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post_batch([{'id': dish.id, 'is_saved': True} for dish in dishes])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], len(dishes))
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        # Уже сохранённый набор: каждая новая ячейка матрицы пересекается с ним
+        self.post_batch([{'id': dish.id, 'is_saved': True} for dish in self.dishes[:100]])
+        single = self.count_queries(self.dishes[100:101])
+        hundred = self.count_queries(self.dishes[101:201])
+        self.assertEqual(single, hundred)
+        self.assertEqual(DishCooccurrence.objects.filter(dish=self.dishes[0]).count(), 200)
+
+    def test_is_saved_must_be_boolean(self):
+        for value in ('false', '0', 1, None):
+            response = self.post_batch([{'id': self.dishes[0].id, 'is_saved': value}])
+            self.assertEqual(response.status_code, 400, value)
+        self.assertFalse(SavedDish.objects.exists())
+
+        self.assertEqual(self.post_batch([{'id': self.dishes[0].id, 'is_saved': False}]).status_code, 200)
+        self.assertFalse(SavedDish.objects.filter(is_saved=True).exists())
+
+
+def png_upload(width=32, height=32):
+    output = io.BytesIO()
+    Image.new('L', (width, height)).save(output, 'PNG')
+    return SimpleUploadedFile('photo.png', output.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DishImageUploadTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(telegram_id=1, username='author', password='x')
+        self.dish = Dish.objects.create(name='Пирог', callories=250, fats=10, proteins=5, carbohydrates=35,
+                                        author=self.author)
+
+    def upload(self, user, image):
+        return make_client(user).post(f'/api/dishes/{self.dish.id}/image/', {'image': image}, format='multipart')
+
+    def test_only_author_or_staff_can_upload(self):
+        other = User.objects.create(telegram_id=2, username='other', password='x')
+        self.assertEqual(self.upload(other, png_upload()).status_code, 403)
+        self.assertEqual(self.upload(self.author, png_upload()).status_code, 200)
+
+        catalog_dish = make_dishes(1)[0]
+        staff = User.objects.create(telegram_id=3, username='staff', password='x', is_staff=True)
+        response = make_client(self.author).post(f'/api/dishes/{catalog_dish.id}/image/', {'image': png_upload()},
+                                                 format='multipart')
+        self.assertEqual(response.status_code, 403)
+        response = make_client(staff).post(f'/api/dishes/{catalog_dish.id}/image/', {'image': png_upload()},
+                                           format='multipart')
+        self.assertEqual(response.status_code, 200)
+
+    def test_oversized_images_are_rejected(self):
+        with mock.patch('dishes.images.MAX_PIXELS', 1000):
+            self.assertEqual(self.upload(self.author, png_upload(40, 40)).status_code, 400)
+        # Pillow отказывается открывать растр больше 2 * MAX_IMAGE_PIXELS ещё до нашей проверки
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 100):
+            self.assertEqual(self.upload(self.author, png_upload(40, 40)).status_code, 400)
+
+
+class SavedDishesConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=1, username='user', password='x')
+        self.client = make_client(self.user)
+        self.rice, self.oil = make_dishes(2)
+        response = self.client.post('/api/dishes/recipes/', {'name': 'Плов', 'ingredients': [
+            {'id': self.rice.id, 'grams': 90}, {'id': self.oil.id, 'grams': 10}]}, format='json')
+        self.recipe_id = response.json()['id']
+        self.client.post('/api/dishes/my/', {'id': self.recipe_id, 'is_saved': True}, format='json')
+
+    def get_saved(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/api/dishes/my/', **headers)
+
+    def test_unchanged_list_answers_304(self):
+        etag = self.get_saved()['ETag']
+        self.assertEqual(self.get_saved(etag).status_code, 304)
+        self.client.post('/api/dishes/my/', {'id': self.rice.id, 'is_saved': True}, format='json')
+        self.assertEqual(self.get_saved(etag).status_code, 200)
+
+    def test_recipe_edit_invalidates_saved_list(self):
+        etag = self.get_saved()['ETag']
+        self.client.put(f'/api/dishes/recipes/{self.recipe_id}/', {'ingredients': [
+            {'id': self.rice.id, 'grams': 50}]}, format='json')
+        self.assertEqual(self.get_saved(etag).status_code, 200)
+
+    def test_recipe_edit_invalidates_recent_list_of_other_users(self):
+        other = make_client(User.objects.create(telegram_id=2, username='other', password='x'))
+        etag = other.get('/api/dishes/recent/')['ETag']
+        self.assertEqual(other.get('/api/dishes/recent/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Dish.objects.filter(id=self.oil.id).update(callories=900)
+        self.client.put(f'/api/dishes/recipes/{self.recipe_id}/', {'ingredients': [
+            {'id': self.oil.id, 'grams': 50}]}, format='json')
+        response = other.get('/api/dishes/recent/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['callories'], 900)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_photo_upload_invalidates_saved_list(self):
+        etag = self.get_saved()['ETag']
+        response = self.client.post(f'/api/dishes/{self.recipe_id}/image/', {'image': png_upload()},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 200)
+        response = self.get_saved(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.json()[0]['image'])
+
+
+class TrendScoreTests(TestCase):
+    def setUp(self):
+        self.old, self.new = make_dishes(2)
+
+    def flush_saves_at(self, moment, counts):
+        with mock.patch('django.utils.timezone.now', return_value=moment):
+            popularity.write_trend_scores(counts)
+
+    def test_scores_are_rebased_to_current_epoch(self):
+        start = popularity.TREND_ORIGIN + 40 * popularity.TREND_EPOCH_LENGTH
+        self.flush_saves_at(start, {self.old.id: 8})
+        # Через 4 недели (4 периода полураспада) 8 сохранений весят как половина нового
+        self.flush_saves_at(start + timedelta(weeks=3, days=6), {self.new.id: 1})
+        self.flush_saves_at(start + timedelta(weeks=5), {self.new.id: 1})
+
+        old, new = Dish.objects.filter(id__in=[self.old.id, self.new.id]).order_by('id')
+        self.assertEqual((old.trend_epoch, new.trend_epoch), (41, 41))
+        self.assertLess(max(old.trend_score, new.trend_score), 2 ** 4)
+        self.assertAlmostEqual(new.trend_score / old.trend_score, (2 ** (-1 / 7) + 2) / 0.5, places=6)
+        self.assertEqual(list(popularity.popular_dishes('trending', 2).values_list('id', flat=True)),
+                         [self.new.id, self.old.id])
+
+
+class MealPlanTests(TestCase):
+    def test_catalog_version_follows_dish_edits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            dish = make_dishes(1)[0]
+            dish.save()
+        version = mealplan.catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            dish.proteins = 20
+            dish.save()
+        self.assertEqual(mealplan.catalog_version(), version + 1)
+
+    def test_inserts_and_renames_keep_catalog_version(self):
+        version = mealplan.catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().post('/api/dishes//', {'name': 'Сырники', 'callories': 220, 'fats': 9,
+                                                          'proteins': 15, 'carbohydrates': 20}, format='json')
+            dish = Dish.objects.get(id=response.json()['id'])
+            dish.name = 'Сырники со сметаной'
+            dish.save()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mealplan.catalog_version(), version)
+
+        # С отложенными БЖУ изменения не видны — версия поднимается на всякий случай
+        with self.captureOnCommitCallbacks(execute=True):
+            Dish.objects.only('id', 'name').get(id=dish.id).save()
+        self.assertEqual(mealplan.catalog_version(), version + 1)
+
+    def test_portions_are_sized_to_targets(self):
+        # Все блюда по 150 ккал на 100 г: без подбора веса день набрал бы 600 ккал вместо 2000
+        ids = np.arange(1, 21)
+        macros = np.tile([150.0, 10.0, 5.0, 15.0], (20, 1))
+        targets = {'callories': 2000, 'proteins': 120, 'fats': 65, 'carbohydrates': 230}
+        day = mealplan.solve_plan(ids, macros, targets, days=1)[0]
+        self.assertAlmostEqual(day['totals']['callories'], 2000, delta=50)
+        self.assertTrue(all(mealplan.PORTION_MIN_GRAMS <= meal['grams'] <= mealplan.PORTION_MAX_GRAMS
+                            for meal in day['meals']))
+
+
+class MergeDishesTests(TestCase):
+    def test_normalize_name_drops_soft_and_hard_signs(self):
+        self.assertEqual(normalize_name('Жульен'), 'zhulen')
+        self.assertEqual(normalize_name('Подъёмный  пирог!'), 'podemnyj pirog')
+
+    def test_saved_duplicate_keeps_canonical_saved(self):
+        user = User.objects.create(telegram_id=1, username='user', password='x')
+        canonical, duplicate = make_dishes(2)
+        SavedDish.objects.create(user=user, dish=canonical, is_saved=False)
+        SavedDish.objects.create(user=user, dish=duplicate, is_saved=True)
+
+        merge_dishes(canonical.id, [duplicate.id])
+        self.assertEqual(list(SavedDish.objects.filter(user=user).values_list('dish_id', 'is_saved')),
+                         [(canonical.id, True)])
+        canonical.refresh_from_db()
+        self.assertEqual(canonical.save_count, 1)
+
+
+class SaveChangeTests(TestCase):
+    def test_is_saved_must_be_boolean(self):
+        user = User.objects.create(telegram_id=1, username='user', password='x')
+        dish, = make_dishes(1)
+        for value in ('0', 'false', 1, None):
+            response = make_client(user).post('/api/dishes/my/', {'id': dish.id, 'is_saved': value}, format='json')
+            self.assertEqual(response.status_code, 400, value)
+        self.assertFalse(SavedDish.objects.exists())
+
+    def test_first_save_marks_dish_stale(self):
+        user = User.objects.create(telegram_id=1, username='user', password='x')
+        dish = make_dishes(1)[0]
+        DishNeighbors.objects.create(dish=dish, is_stale=False)
+        response = make_client(user).post('/api/dishes/my/', {'id': dish.id, 'is_saved': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(DishNeighbors.objects.get(dish=dish).is_stale)
+
+
+class RecipeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=1, username='user', password='x')
+        self.client = make_client(self.user)
+        self.rice, self.oil = make_dishes(2)
+
+    def create_recipe(self, name, ingredients):
+        response = self.client.post('/api/dishes/recipes/', {'name': name, 'ingredients': ingredients}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def test_nested_recipe_rolls_up_per_100_grams(self):
+        Dish.objects.filter(id=self.oil.id).update(callories=900, fats=100, proteins=0, carbohydrates=0)
+        base = self.create_recipe('Заправка', [{'id': self.oil.id, 'grams': 50}, {'id': self.rice.id, 'grams': 50}])
+        self.assertEqual(base['callories'], 500)
+        outer = self.create_recipe('Плов', [{'id': base['id'], 'grams': 100}, {'id': self.rice.id, 'grams': 300}])
+        self.assertEqual(outer['callories'], 200)
+
+    def test_cycle_is_rejected(self):
+        inner = self.create_recipe('Соус', [{'id': self.oil.id, 'grams': 10}])
+        outer = self.create_recipe('Блюдо с соусом', [{'id': inner['id'], 'grams': 20}])
+        response = self.client.put(f"/api/dishes/recipes/{inner['id']}/", {'ingredients': [
+            {'id': outer['id'], 'grams': 5}]}, format='json')
+        self.assertEqual(response.status_code, 409)
+        edges = RecipeIngredient.objects.filter(recipe_id=inner['id']).values_list('ingredient_id', flat=True)
+        self.assertEqual(list(edges), [self.oil.id])
@@ -1,9 +1,19 @@
 from django.urls import path
-from .views import RecentDishesView, DishSearchView, SavedDishesView, DishCreateView
+from .views import RecentDishesView, DishSearchView, SavedDishesView, DishCreateView, RecommendedDishesView, \
+    SavedDishesBatchView, MealPlanView, PopularDishesView, \
+    RecipeCreateView, RecipeDetailView, DishImageUploadView, dish_image_variant
 
 urlpatterns = [
     path('/', DishCreateView.as_view(), name='dish-create'),
     path('recent/', RecentDishesView.as_view(), name='recent-dishes'),
     path('', DishSearchView.as_view(), name='dish-search'),
     path('my/', SavedDishesView.as_view(), name='saved-dishes'),
+    path('my/batch/', SavedDishesBatchView.as_view(), name='saved-dishes-batch'),
+    path('recommended/', RecommendedDishesView.as_view(), name='recommended-dishes'),
+    path('popular/', PopularDishesView.as_view(), name='popular-dishes'),
+    path('recipes/', RecipeCreateView.as_view(), name='recipe-create'),
+    path('recipes/<int:pk>/', RecipeDetailView.as_view(), name='recipe-detail'),
+    path('plan/', MealPlanView.as_view(), name='meal-plan'),
+    path('<int:pk>/image/', DishImageUploadView.as_view(), name='dish-image-upload'),
+    path('images/<str:sha256>/<str:variant>.webp', dish_image_variant, name='dish-image-variant'),
 ]
@@ -0,0 +1,15 @@
+import re
+import unicodedata
+
+from transliterate import translit
+
+
+def normalize_name(name):
+    """
+    Ключ нормализованного названия: "Гречка", "гречка " и "Grechka" дают одно и то же "grechka".
+    Регистр, ё/е, ь/ъ, пунктуация и лишние пробелы не учитываются, кириллица транслитерируется
+    ("Жульен" — "zhulen", а не "zhul en": translit передаёт знаки апострофом).
+    """
+    name = unicodedata.normalize('NFKC', name or '').lower().replace('ё', 'е').replace('ь', '').replace('ъ', '')
+    name = translit(name, 'ru', reversed=True).lower()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', name).split())
@@ -1,63 +1,351 @@
+import hashlib
+
+from django.db import transaction
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition, require_GET
 from rest_framework import status
 from rest_framework.generics import CreateAPIView
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Dish, SavedDish
-from .serializers import DishSerializer
+from core.fieldsets import SparseFieldsMixin
+from core.outbox import publish_event, publish_events
+from core.renderers import ORJSONRenderer
+from core.sync import record_change, record_changes
+from users.models import User
+from core.throttling import TOKEN_BUCKET_THROTTLES
+from .dedup import find_existing_duplicate
+from .images import IMMUTABLE_CACHE_CONTROL, VARIANTS, InvalidImage, ensure_variant, image_urls, store_image
+from .mealplan import daily_targets, get_meal_plan
+from .models import Dish, DishImage, SavedDish
+from .popularity import popular_dishes, record_saves
+from .recipes import RecipeCycleError, RecipeError, ingredient_rows, parse_ingredients, set_ingredients
+from .recommendations import recommend_for_user, record_save_change, record_saved_set_change
+from .serializers import DISH_ROW_FIELDS, DishSerializer, dish_rows
 
 
-class DishCreateView(CreateAPIView):
+class DishCreateView(SparseFieldsMixin, CreateAPIView):
     queryset = Dish.objects.all()
     serializer_class = DishSerializer
+    throttle_classes = TOKEN_BUCKET_THROTTLES
+    throttle_scope = 'dish-create'
+    sparse_fields = tuple(DishSerializer.Meta.fields)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # Вместо почти-копии возвращаем уже существующее блюдо
+        existing = find_existing_duplicate(serializer.validated_data)
+        if existing is not None:
+            return Response(self.get_serializer(existing, fields=self.requested_fields).data,
+                            status=status.HTTP_200_OK)
+
+        self.perform_create(serializer)
+        data = self.get_serializer(serializer.instance, fields=self.requested_fields).data
+        headers = self.get_success_headers(data)
+        return Response(data, status=status.HTTP_201_CREATED, headers=headers)
+
+
+RECENT_DISHES_LIMIT = 10
+
+
+def saved_dishes_etag(request):
+    # Правки сохранённых блюд (фото, пересчёт рецептов) тоже поднимают версию — см. SavedDish.bump_versions_for
+    fields = request.query_params.get('fields', '')
+    return f"saved-{request.user.pk}-{request.user.saved_dishes_version}-{fields}"
+
 
+def recent_dishes_etag(request):
+    # updated_at меняется при любой правке, видной в строке (БЖУ, пересчёт рецепта, фото), — в том числе
+    # у блюд, которые этот пользователь не сохранял и чью правку saved_dishes_version не отражает
+    rows = Dish.objects.order_by('-id').values_list('id', 'updated_at')[:RECENT_DISHES_LIMIT]
+    saved_version = f"{request.user.pk}-{request.user.saved_dishes_version}" if request.user.is_authenticated else ''
+    fields = request.query_params.get('fields', '')
+    return hashlib.md5(f"{list(rows)}-{saved_version}-{fields}".encode()).hexdigest()
 
-class RecentDishesView(APIView):
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        context['request'] = self.request
-        return context
 
+class RecentDishesView(SparseFieldsMixin, APIView):
+    renderer_classes = [ORJSONRenderer]
+    use_read_replica = True
+    sparse_fields = DISH_ROW_FIELDS
+
+    @method_decorator(condition(etag_func=recent_dishes_etag))
     def get(self, request):
-        dishes = Dish.objects.all().order_by('-id')[:10]
-        serializer = DishSerializer(dishes, many=True)
-        return Response(serializer.data)
+        dishes = Dish.objects.all().order_by('-id')[:RECENT_DISHES_LIMIT]
+        return Response(dish_rows(dishes, request.user, self.requested_fields))
+
 
+class DishSearchView(SparseFieldsMixin, APIView):
+    renderer_classes = [ORJSONRenderer]
+    use_read_replica = True
+    sparse_fields = DISH_ROW_FIELDS
 
-class DishSearchView(APIView):
     def get(self, request):
         q = request.query_params.get('q', '')
         dishes = Dish.objects.filter(name__icontains=q)
-        serializer = DishSerializer(dishes, many=True)
-        return Response(serializer.data)
+        return Response(dish_rows(dishes, request.user, self.requested_fields))
 
 
-class SavedDishesView(APIView):
+class SavedDishesView(SparseFieldsMixin, APIView):
     permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
+    use_read_replica = True
+    sparse_fields = DISH_ROW_FIELDS
 
+    @method_decorator(condition(etag_func=saved_dishes_etag))
     def get(self, request):
         saved_dishes_ids = SavedDish.objects.filter(user=request.user, is_saved=True).values_list('dish_id', flat=True)
 
         dishes = Dish.objects.filter(id__in=saved_dishes_ids)
-        serializer = DishSerializer(dishes, many=True)
-        return Response(serializer.data)
+        return Response(dish_rows(dishes, request.user, self.requested_fields))
 
     def post(self, request):
         dish_id = request.data.get('id')
         is_saved = request.data.get('is_saved', False)
+        if not isinstance(is_saved, bool):
+            # "0"/"false" из формы иначе сохранились бы как False, а bool("0") пометил бы блюдо сохранённым
+            return Response({"error": "is_saved must be a boolean"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             dish = Dish.objects.get(id=dish_id)
 
-            saved_dish, created = SavedDish.objects.get_or_create(user=request.user, dish=dish,
-                defaults={'is_saved': is_saved})
+            with transaction.atomic():
+                saved_dish, created = SavedDish.objects.get_or_create(user=request.user, dish=dish,
+                    defaults={'is_saved': is_saved})
+                was_saved = False if created else saved_dish.is_saved
+
+                if not created:
+                    saved_dish.is_saved = is_saved
+                    saved_dish.save()
 
-            if not created:
-                saved_dish.is_saved = is_saved
-                saved_dish.save()
+                if is_saved != was_saved:
+                    User.objects.filter(pk=request.user.pk).update(saved_dishes_version=F('saved_dishes_version') + 1)
+                    record_save_change(request.user, dish.id, 1 if is_saved else -1)
+                    record_saves({dish.id: 1 if is_saved else -1})
+                    record_change(request.user.id, 'saved_dish', dish.id, deleted=not is_saved)
+                    publish_event('saved_dish.changed', request.user.id,
+                                  {'dish_id': dish.id, 'is_saved': is_saved},
+                                  compaction_key=f'saved_dish:{request.user.id}:{dish.id}')
 
             return Response({"status": "updated"}, status=status.HTTP_200_OK)
 
         except Dish.DoesNotExist:
             return Response({"error": "Dish not found"}, status=status.HTTP_404_NOT_FOUND)
+
+
+SAVED_BATCH_MAX_CHANGES = 500
+
+
+class SavedDishesBatchView(APIView):
+    """
+    Пакетная синхронизация сохранённых блюд: {"changes": [{"id": 1, "is_saved": true}, ...]}.
+    Число запросов не зависит от размера пакета; при повторе id побеждает последнее изменение.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        changes = request.data.get('changes')
+        if not isinstance(changes, list) or len(changes) > SAVED_BATCH_MAX_CHANGES:
+            return Response({"error": f"changes must be a list of at most {SAVED_BATCH_MAX_CHANGES} items"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        wanted = {}
+        try:
+            for change in changes:
+                is_saved = change.get('is_saved', False)
+                if not isinstance(is_saved, bool):
+                    raise ValueError
+                wanted[int(change['id'])] = is_saved
+        except (TypeError, KeyError, ValueError, AttributeError):
+            return Response({"error": "each change needs an integer id and a boolean is_saved"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        existing_ids = set(Dish.objects.filter(id__in=wanted).values_list('id', flat=True))
+        missing = sorted(set(wanted) - existing_ids)
+        if missing:
+            return Response({"error": "Dish not found", "ids": missing}, status=status.HTTP_404_NOT_FOUND)
+
+        user = request.user
+        with transaction.atomic():
+            current = dict(SavedDish.objects.select_for_update().filter(user=user)
+                           .values_list('dish_id', 'is_saved'))
+            changed = {dish_id: is_saved for dish_id, is_saved in wanted.items()
+                       if current.get(dish_id, False) != is_saved}
+
+            if changed:
+                SavedDish.objects.bulk_create(
+                    [SavedDish(user=user, dish_id=dish_id, is_saved=is_saved) for dish_id, is_saved in changed.items()],
+                    update_conflicts=True, unique_fields=['user', 'dish'], update_fields=['is_saved'])
+                User.objects.filter(pk=user.pk).update(saved_dishes_version=F('saved_dishes_version') + 1)
+
+                before = {dish_id for dish_id, is_saved in current.items() if is_saved}
+                after = (before | {dish_id for dish_id, is_saved in changed.items() if is_saved}) \
+                    - {dish_id for dish_id, is_saved in changed.items() if not is_saved}
+                record_saved_set_change(before, after)
+                record_saves({dish_id: 1 if is_saved else -1 for dish_id, is_saved in changed.items()})
+                record_changes(user.id, 'saved_dish', [dish_id for dish_id, is_saved in changed.items() if is_saved])
+                record_changes(user.id, 'saved_dish', [dish_id for dish_id, is_saved in changed.items() if not is_saved],
+                               deleted=True)
+                publish_events(('saved_dish.changed', user.id, {'dish_id': dish_id, 'is_saved': is_saved},
+                                f'saved_dish:{user.id}:{dish_id}') for dish_id, is_saved in changed.items())
+
+            version = User.objects.values_list('saved_dishes_version', flat=True).get(pk=user.pk)
+
+        return Response({"saved_dishes_version": version, "updated": len(changed)}, status=status.HTTP_200_OK)
+
+
+class RecommendedDishesView(SparseFieldsMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
+    use_read_replica = True
+    sparse_fields = DISH_ROW_FIELDS
+
+    def get(self, request):
+        dish_ids = recommend_for_user(request.user)
+        rows = {row['id']: row for row in dish_rows(Dish.objects.filter(id__in=dish_ids), request.user,
+                                                    self.requested_fields)}
+        return Response([rows[dish_id] for dish_id in dish_ids if dish_id in rows])
+
+
+class PopularDishesView(SparseFieldsMixin, APIView):
+    """
+    Популярные блюда: ?sort=saves — по числу сохранений, ?sort=trending — по затухающему
+    рейтингу недавних сохранений. Обе сортировки читают top-N по индексу без агрегации SavedDish.
+    """
+    renderer_classes = [ORJSONRenderer]
+    use_read_replica = True
+    sparse_fields = DISH_ROW_FIELDS
+    max_limit = 100
+
+    def get(self, request):
+        sort = request.query_params.get('sort', 'saves')
+        if sort not in ('saves', 'trending'):
+            return Response({"error": "sort must be saves or trending"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), self.max_limit)
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(dish_rows(popular_dishes(sort, limit), request.user, self.requested_fields))
+
+
+class RecipeCreateView(APIView):
+    """
+    Домашний рецепт из ингредиентов: {"name": "...", "ingredients": [{"id": 1, "grams": 150}, ...]}.
+    Ингредиентом может быть и другой рецепт; БЖУ на 100 г считаются из состава и хранятся в самом блюде.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
+
+    def post(self, request):
+        name = request.data.get('name')
+        if not isinstance(name, str) or not name.strip():
+            return Response({"error": "name is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ingredients = parse_ingredients(request.data.get('ingredients'))
+            with transaction.atomic():
+                recipe = Dish.objects.create(name=name.strip()[:255], is_recipe=True, author=request.user,
+                                             callories=0, proteins=0, fats=0, carbohydrates=0)
+                set_ingredients(recipe, ingredients)
+        except RecipeError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(recipe_data(recipe, request), status=status.HTTP_201_CREATED)
+
+
+class RecipeDetailView(APIView):
+    """Рецепт с составом; PUT (только автору) заменяет состав и пересчитывает все рецепты, куда он входит."""
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
+
+    def get(self, request, pk):
+        recipe = get_object_or_404(Dish, pk=pk, is_recipe=True)
+        return Response(recipe_data(recipe, request))
+
+    def put(self, request, pk):
+        recipe = get_object_or_404(Dish, pk=pk, is_recipe=True)
+        if recipe.author_id != request.user.id:
+            return Response({"error": "Only the author can edit a recipe"}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            set_ingredients(recipe, parse_ingredients(request.data.get('ingredients')))
+        except RecipeCycleError as error:
+            return Response({"error": str(error)}, status=status.HTTP_409_CONFLICT)
+        except RecipeError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(recipe_data(recipe, request))
+
+
+def recipe_data(recipe, request):
+    return dict(DishSerializer(recipe, context={'request': request}).data, ingredients=ingredient_rows(recipe))
+
+
+MEAL_PLAN_MAX_DAYS = 7
+
+
+class MealPlanView(APIView):
+    """План питания на день или неделю (?days=1..7) под дневную норму из профиля пользователя."""
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
+    use_read_replica = True
+
+    def get(self, request):
+        try:
+            days = min(max(int(request.query_params.get('days', 1)), 1), MEAL_PLAN_MAX_DAYS)
+        except ValueError:
+            return Response({"error": "days must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        targets = daily_targets(request.user)
+        if targets is None:
+            return Response({"error": "Fill in height, weight, gender and birth date in the profile"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        targets, plan = get_meal_plan(targets, days)
+        dish_ids = {meal['dish_id'] for day in plan for meal in day['meals']}
+        rows = {row['id']: row for row in dish_rows(Dish.objects.filter(id__in=dish_ids), request.user)}
+        return Response({'targets': targets, 'days': [
+            {'meals': [{'meal': meal['meal'], 'grams': meal['grams'], 'dish': rows.get(meal['dish_id'])}
+                       for meal in day['meals']],
+             'totals': day['totals']} for day in plan]})
+
+
+class DishImageUploadView(APIView):
+    """Загрузка фото блюда (multipart, поле image) автором рецепта или персоналом. Возвращает адреса вариантов."""
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, pk):
+        dish = get_object_or_404(Dish, pk=pk)
+        if not request.user.is_staff and (dish.author_id is None or dish.author_id != request.user.id):
+            return Response({"error": "Only the author or staff can change the photo"},
+                            status=status.HTTP_403_FORBIDDEN)
+        upload = request.FILES.get('image')
+        if upload is None:
+            return Response({"error": "image file is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            image = store_image(upload)
+        except InvalidImage as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            Dish.objects.filter(pk=dish.pk).update(image=image, updated_at=timezone.now())
+            SavedDish.bump_versions_for([dish.pk])
+        return Response({"id": dish.pk, "image": image_urls(image.sha256)}, status=status.HTTP_200_OK)
+
+
+@require_GET
+@condition(etag_func=lambda request, sha256, variant: f'{sha256}-{variant}')
+def dish_image_variant(request, sha256, variant):
+    """Вариант фото в WebP; создаётся при первом запросе, дальше отдаётся из хранилища с вечным кэшем."""
+    if variant not in VARIANTS:
+        raise Http404
+    image = get_object_or_404(DishImage, pk=sha256)
+    response = FileResponse(default_storage.open(ensure_variant(image, variant)), content_type='image/webp')
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
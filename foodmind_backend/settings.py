@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 
+import dj_database_url
 from dotenv import load_dotenv
 from datetime import timedelta
 
@@ -34,6 +35,8 @@ DEBUG = os.getenv("DEBUG", "False") == "True"
 ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "*").split(",")
 
 TELEGRAM_TOKEN = os.environ.get('TELEGRAM_TOKEN')
+# Можно направить на локальный stub Bot API для тестов
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
 
 
 # Application definition
@@ -52,19 +55,32 @@ INSTALLED_APPS = [
     'payment',
     'training',
     'users',
+    'core',
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.RouteProfileMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
+]
+
+# Цепочка для маршрутов с сессиями (админка); API аутентифицируется только JWT и её пропускает
+SESSION_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'corsheaders.middleware.CorsMiddleware',
-    'users.middleware.CheckTrialMiddleware'
+    'users.middleware.CheckTrialMiddleware',
 ]
+LEAN_MIDDLEWARE_PREFIXES = ('/api/',)
+
+# Сессии, аутентификация и сообщения подключены через RouteProfileMiddleware, которую проверки админки не видят
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
 
 ROOT_URLCONF = 'foodmind_backend.urls'
 
@@ -90,17 +106,87 @@ WSGI_APPLICATION = 'foodmind_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': 'django.db.backends.postgresql',
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        # Пул и постоянные соединения взаимоисключающие: с пулом Django требует CONN_MAX_AGE = 0
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+        'OPTIONS': {},
     }
 }
 
+if DB_POOL:
+    # Пул соединений psycopg 3 (Django 5.1+)
+    # https://docs.djangoproject.com/en/5.1/ref/databases/#connection-pool
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+        'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', '3600')),
+        'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '600')),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+    }
+    if os.getenv('DB_POOL_HEALTH_CHECKS', 'True') == 'True':
+        from psycopg_pool import ConnectionPool
+
+        DATABASES['default']['OPTIONS']['pool']['check'] = ConnectionPool.check_connection
+
+# Реплики только для чтения: DB_REPLICA_URLS="postgres://...,sqlite:///replica.sqlite3"
+# Чтения read-only view уходят на реплики, после записи пользователь REPLICA_STICKY_SECONDS читает с primary
+DB_REPLICA_URLS = [url for url in os.getenv('DB_REPLICA_URLS', '').split(',') if url]
+
+for index, url in enumerate(DB_REPLICA_URLS, start=1):
+    DATABASES[f'replica_{index}'] = {
+        **dj_database_url.parse(url, conn_max_age=DATABASES['default']['CONN_MAX_AGE'],
+                                conn_health_checks=DATABASES['default']['CONN_HEALTH_CHECKS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.db_routers.PrimaryReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '15'))
+
+# Outbox доменных событий: приёмник подключаемый, в продакшене Kafka
+OUTBOX_SINK = os.getenv('OUTBOX_SINK', 'core.outbox.KafkaSink')
+OUTBOX_SINK_OPTIONS = {'bootstrap.servers': os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092')} \
+    if OUTBOX_SINK.endswith('KafkaSink') else {}
+OUTBOX_TOPIC = os.getenv('OUTBOX_TOPIC', 'foodmind.events')
+# Опубликованные события хранятся столько дней (для разбора инцидентов), потом их удаляет publish_outbox
+OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', '7'))
+
+# Профилирование запросов: доля сэмплируемых запросов и разрешение подписанного заголовка X-Debug-Profile.
+# При PROFILING_SAMPLE_RATE = 0 и выключенном заголовке middleware не подключается вовсе
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_ALLOW_HEADER = os.getenv('PROFILING_ALLOW_HEADER', 'True') == 'True'
+PROFILING_INTERVAL = float(os.getenv('PROFILING_INTERVAL', '0.005'))
+# Бюджет холодного старта воркера (profile_startup --budget), проверяется и в тестах core
+STARTUP_BUDGET_SECONDS = float(os.getenv('STARTUP_BUDGET_SECONDS', '2.0'))
+# Хранение профилей: не старше стольких дней и не больше стольких строк (см. prune_request_profiles)
+PROFILING_RETENTION_DAYS = int(os.getenv('PROFILING_RETENTION_DAYS', '7'))
+PROFILING_MAX_ROWS = int(os.getenv('PROFILING_MAX_ROWS', '10000'))
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Лидерборды по калориям: sorted sets в Redis, без Redis — инкрементальная таблица LeaderboardEntry.
+# training.leaderboard.MemoryStore живёт в памяти одного процесса — только для разработки
+LEADERBOARD_STORE = os.getenv('LEADERBOARD_STORE', 'training.leaderboard.RedisStore' if REDIS_URL
+                              else 'training.leaderboard.DatabaseStore')
+LEADERBOARD_STORE_OPTIONS = {'url': REDIS_URL} if LEADERBOARD_STORE.endswith('RedisStore') else {}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -121,8 +207,21 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    )
+        "core.authentication.LeanJWTAuthentication",
+    ),
+    # Сколько доверенных прокси добавляют X-Forwarded-For перед приложением (за прокси хостинга — 1).
+    # При 0 IP клиента берётся из REMOTE_ADDR: иначе заголовок подделывается и обходит лимиты по IP
+    "NUM_PROXIES": int(os.getenv('NUM_PROXIES', '0')),
+}
+
+# Token bucket лимиты по view.throttle_scope: 'ёмкость/период' (ёмкость корзины и скорость пополнения)
+THROTTLE_CACHE = 'default'
+TOKEN_BUCKET_RATES = {
+    'tma-auth': {'ip': os.getenv('THROTTLE_TMA_AUTH_IP', '20/min'),
+                 'endpoint': os.getenv('THROTTLE_TMA_AUTH_ENDPOINT', '600/min')},
+    'dish-create': {'ip': os.getenv('THROTTLE_DISH_CREATE_IP', '30/min'),
+                    'user': os.getenv('THROTTLE_DISH_CREATE_USER', '30/min'),
+                    'endpoint': os.getenv('THROTTLE_DISH_CREATE_ENDPOINT', '300/min')},
 }
 
 SIMPLE_JWT = {
@@ -150,6 +249,15 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', BASE_DIR / 'media')
+
+# Потоки для ленивой генерации превью фото блюд (Pillow отпускает GIL при ресайзе и кодировании)
+DISH_IMAGE_WORKERS = int(os.getenv('DISH_IMAGE_WORKERS', os.cpu_count() or 2))
+
+# Раз в сколько секунд буфер счётчиков (core.counters) пишет накопленные приращения; 0 — писать сразу
+COUNTER_FLUSH_INTERVAL = float(os.getenv('COUNTER_FLUSH_INTERVAL', 5))
+
 CORS_ALLOW_ALL_ORIGINS = True
 
 # Default primary key field type
@@ -6,4 +6,5 @@ urlpatterns = [
     path('api/', include('users.urls'), name='users'),
     path('api/', include('training.urls'), name='training'),
     path('api/dishes/', include('dishes.urls'), name='dishes'),
+    path('api/', include('core.urls'), name='core'),
 ]
@@ -0,0 +1,142 @@
+import datetime
+import heapq
+import zlib
+
+import orjson
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.sync import record_changes_many
+from .models import Training, TrainingArchive
+
+ARCHIVE_FIELDS = ('id', 'type', 'duration', 'intensity', 'callories', 'created_at')
+# Пользователей в одной транзакции archive_users
+ARCHIVE_BATCH_USERS = 200
+
+
+def pack(rows):
+    """Строки -> zlib(JSON по колонкам); даты хранятся как unix timestamp."""
+    columns = {field: [row[field] for row in rows] for field in ARCHIVE_FIELDS}
+    columns['created_at'] = [moment.timestamp() for moment in columns['created_at']]
+    return zlib.compress(orjson.dumps(columns), 9)
+
+
+def unpack(payload):
+    columns = orjson.loads(zlib.decompress(payload))
+    columns['created_at'] = [datetime.datetime.fromtimestamp(ts, tz=datetime.timezone.utc)
+                             for ts in columns['created_at']]
+    return [dict(zip(ARCHIVE_FIELDS, values)) for values in zip(*(columns[field] for field in ARCHIVE_FIELDS))]
+
+
+def _month_start(moment):
+    return timezone.localtime(moment).date().replace(day=1)
+
+
+def _month_moment(month):
+    return timezone.make_aware(datetime.datetime.combine(month, datetime.time()))
+
+
+def archive_user(user_id, cutoff):
+    """archive_users для одного пользователя."""
+    return archive_users([user_id], cutoff)
+
+
+def archive_users(user_ids, cutoff):
+    """
+    Переносит тренировки пользователей старше cutoff в помесячные архивы (дописывая к существующим)
+    и удаляет их из горячей таблицы, оставляя в ней по строке-сводке на пользователя и месяц: агрегаты по
+    Training не теряют архивные калории. Клиенты синхронизации получают tombstone перенесённых
+    тренировок и новые сводки. Пачка пользователей — одна транзакция и постоянное число запросов,
+    а не десяток на пользователя. Возвращает (строк перенесено, байт до сжатия, байт после).
+    """
+    with transaction.atomic():
+        old = Training.objects.filter(user_id__in=user_ids, created_at__lt=cutoff).exclude(type=Training.SUMMARY)
+        rows = list(old.select_for_update().order_by('user_id', 'created_at').values('user_id', *ARCHIVE_FIELDS))
+        if not rows:
+            return 0, 0, 0
+
+        months = {}
+        for row in rows:
+            months.setdefault((row.pop('user_id'), _month_start(row['created_at'])), []).append(row)
+
+        existing = {(archive.user_id, archive.month): archive for archive in
+                    TrainingArchive.objects.select_for_update().filter(
+                        user_id__in=user_ids, month__in={month for _, month in months})}
+        raw_bytes = packed_bytes = 0
+        to_create, to_update = [], []
+        for (user_id, month), month_rows in months.items():
+            archive = existing.get((user_id, month))
+            if archive is not None:
+                month_rows = unpack(archive.payload) + month_rows
+            else:
+                archive = TrainingArchive(user_id=user_id, month=month)
+            archive.payload = pack(month_rows)
+            archive.count = len(month_rows)
+            archive.callories = sum(row['callories'] or 0 for row in month_rows)
+            archive.duration = sum(row['duration'] or 0 for row in month_rows)
+            raw_bytes += len(orjson.dumps(month_rows))
+            packed_bytes += len(archive.payload)
+            (to_update if archive.pk else to_create).append(archive)
+
+        TrainingArchive.objects.bulk_create(to_create, batch_size=500)
+        TrainingArchive.objects.bulk_update(to_update, ['payload', 'count', 'callories', 'duration'], batch_size=500)
+        # Те же строки, что выбраны под блокировкой выше, — без списка id в запросе
+        old.delete()
+        summaries = write_summaries(to_create + to_update)
+        changes = [(user_id, row['id'], True) for (user_id, _), month_rows in months.items() for row in month_rows]
+        changes += [(summary.user_id, summary.id, False) for summary in summaries]
+        record_changes_many('training', changes)
+    return len(rows), raw_bytes, packed_bytes
+
+
+def write_summaries(archives):
+    """Создаёт или обновляет строки-сводки месяцев архивов в горячей таблице и возвращает их."""
+    moments = {(archive.user_id, _month_moment(archive.month)): archive for archive in archives}
+    # Фильтр по пользователям и месяцам по отдельности шире нужных пар — лишние отбрасываются в памяти
+    candidates = Training.objects.filter(user_id__in={user_id for user_id, _ in moments}, type=Training.SUMMARY,
+                                         created_at__in={moment for _, moment in moments})
+    summaries = {key: summary for summary in candidates
+                 if (key := (summary.user_id, summary.created_at)) in moments}
+    missing = [key for key in moments if key not in summaries]
+    created = Training.objects.bulk_create([Training(user_id=user_id, type=Training.SUMMARY) for user_id, _ in missing],
+                                           batch_size=500)
+    # auto_now_add перезаписывает дату при вставке — начало месяца проставляется вторым проходом
+    summaries.update(zip(missing, created))
+    for (user_id, moment), summary in summaries.items():
+        summary.created_at = moment
+        summary.callories = moments[user_id, moment].callories
+        summary.duration = moments[user_id, moment].duration
+    # Одним executemany по первичному ключу: bulk_update собирает CASE WHEN на каждую строку и поле,
+    # и на пачке пользователей эта сборка занимала больше половины времени архивации
+    fields = [Training._meta.get_field(name) for name in ('created_at', 'callories', 'duration')]
+    assignments = ', '.join(f'{connection.ops.quote_name(field.column)} = %s' for field in fields)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {connection.ops.quote_name(Training._meta.db_table)} SET {assignments} WHERE id = %s',
+            [[field.get_db_prep_save(getattr(summary, field.attname), connection) for field in fields] + [summary.pk]
+             for summary in summaries.values()])
+    return list(summaries.values())
+
+
+def iter_history(user, since=None, until=None):
+    """
+    История тренировок пользователя, новые сначала: горячая таблица и архив читаются
+    прозрачно, из архива распаковываются только месяцы, попадающие в диапазон.
+    """
+    live = Training.objects.filter(user=user).exclude(type=Training.SUMMARY).order_by('-created_at')
+    archives = TrainingArchive.objects.filter(user=user).order_by('-month')
+    if since is not None:
+        live = live.filter(created_at__gte=since)
+        archives = archives.filter(month__gte=_month_start(since))
+    if until is not None:
+        live = live.filter(created_at__lte=until)
+        archives = archives.filter(month__lte=_month_start(until))
+
+    def archived_rows():
+        for payload in archives.values_list('payload', flat=True).iterator(chunk_size=12):
+            for row in reversed(unpack(bytes(payload))):
+                if (since is None or row['created_at'] >= since) and (until is None or row['created_at'] <= until):
+                    yield row
+
+    return heapq.merge(live.values(*ARCHIVE_FIELDS).iterator(chunk_size=2000), archived_rows(),
+                       key=lambda row: row['created_at'], reverse=True)
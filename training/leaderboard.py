@@ -0,0 +1,251 @@
+import threading
+from bisect import bisect_left, insort
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import LeaderboardEntry, Training
+
+PERIODS = ('week', 'month')
+# Сколько хранить доски прошедших периодов
+RETENTION = {'week': timedelta(weeks=8), 'month': timedelta(days=400)}
+
+
+class MemoryStore:
+    """
+    In-process аналог sorted set для тестов и разработки без Redis. Список (-score, member)
+    держится отсортированным: top-N — срез, ранг — бинарный поиск.
+    """
+
+    def __init__(self, **options):
+        self.scores = {}
+        self.ordered = {}
+        self.lock = threading.Lock()
+
+    def _remove(self, board, member):
+        ordered = self.ordered[board]
+        del ordered[bisect_left(ordered, (-self.scores[board][member], member))]
+
+    def incr(self, board, member, amount):
+        with self.lock:
+            scores = self.scores.setdefault(board, {})
+            self.ordered.setdefault(board, [])
+            if member in scores:
+                self._remove(board, member)
+            scores[member] = scores.get(member, 0) + amount
+            insort(self.ordered[board], (-scores[member], member))
+
+    def top(self, board, limit):
+        return [(member, -score) for score, member in self.ordered.get(board, [])[:limit]]
+
+    def rank(self, board, member):
+        """(ранг с нуля, очки) или None, если участника нет на доске."""
+        score = self.scores.get(board, {}).get(member)
+        if score is None:
+            return None
+        return bisect_left(self.ordered[board], (-score, member)), score
+
+    def scores_of(self, board, members):
+        scores = self.scores.get(board, {})
+        return {member: scores[member] for member in members if member in scores}
+
+    def replace(self, board, mapping):
+        with self.lock:
+            self.scores[board] = dict(mapping)
+            self.ordered[board] = sorted((-score, member) for member, score in mapping.items())
+
+    def expire(self, board, seconds):
+        pass
+
+
+class DatabaseStore:
+    """
+    Доски без Redis в таблице LeaderboardEntry: запись — UPDATE score = score + n по (board, user),
+    top-N — чтение индекса (board, -score, user), ранг — COUNT по тому же индексу до позиции участника.
+    Одна доска на все процессы, и ничего не теряется при рестарте — для продакшена без Redis.
+    """
+
+    def __init__(self, **options):
+        pass
+
+    def incr(self, board, member, amount):
+        entries = LeaderboardEntry.objects.filter(board=board, user_id=member)
+        if entries.update(score=F('score') + amount):
+            return
+        try:
+            with transaction.atomic():
+                LeaderboardEntry.objects.create(board=board, user_id=member, score=amount)
+        except IntegrityError:
+            # Параллельная запись успела создать строку раньше
+            entries.update(score=F('score') + amount)
+
+    def top(self, board, limit):
+        return list(LeaderboardEntry.objects.filter(board=board).order_by('-score', 'user_id')
+                    .values_list('user_id', 'score')[:limit])
+
+    def rank(self, board, member):
+        score = next(iter(LeaderboardEntry.objects.filter(board=board, user_id=member)
+                          .values_list('score', flat=True)), None)
+        if score is None:
+            return None
+        ahead = LeaderboardEntry.objects.filter(
+            Q(score__gt=score) | Q(score=score, user_id__lt=member), board=board).count()
+        return ahead, score
+
+    def scores_of(self, board, members):
+        return dict(LeaderboardEntry.objects.filter(board=board, user_id__in=list(members))
+                    .values_list('user_id', 'score'))
+
+    def replace(self, board, mapping):
+        with transaction.atomic():
+            LeaderboardEntry.objects.filter(board=board).delete()
+            LeaderboardEntry.objects.bulk_create(
+                [LeaderboardEntry(board=board, user_id=member, score=score) for member, score in mapping.items()],
+                batch_size=1000)
+
+    def expire(self, board, seconds):
+        # Строки прошедших периодов удаляет prune_expired при сверке
+        pass
+
+
+class RedisStore:
+    """Доски в Redis sorted sets: ZINCRBY на запись, ZREVRANGE/ZREVRANK на чтение — всё O(log n)."""
+
+    def __init__(self, url, **options):
+        import redis
+
+        self.client = redis.Redis.from_url(url, **options)
+
+    def incr(self, board, member, amount):
+        self.client.zincrby(board, amount, member)
+
+    def top(self, board, limit):
+        return [(int(member), score) for member, score in self.client.zrevrange(board, 0, limit - 1, withscores=True)]
+
+    def rank(self, board, member):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zrevrank(board, member)
+        pipe.zscore(board, member)
+        rank, score = pipe.execute()
+        return None if rank is None else (rank, score)
+
+    def scores_of(self, board, members):
+        members = list(members)
+        if not members:
+            return {}
+        return {member: score for member, score in zip(members, self.client.zmscore(board, members))
+                if score is not None}
+
+    def replace(self, board, mapping):
+        # Собираем доску во временном ключе и подменяем её атомарным RENAME
+        staging = f'{board}:rebuild'
+        pipe = self.client.pipeline()
+        pipe.delete(staging)
+        if mapping:
+            pipe.zadd(staging, mapping)
+            pipe.rename(staging, board)
+        else:
+            pipe.delete(board)
+        pipe.execute()
+
+    def expire(self, board, seconds):
+        self.client.expire(board, int(seconds))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = import_string(settings.LEADERBOARD_STORE)(**settings.LEADERBOARD_STORE_OPTIONS)
+        return _store
+
+
+def period_bounds(period, day):
+    """Начало и конец (не включительно) недели или месяца, куда попадает day, в локальном времени."""
+    if period == 'week':
+        start = day - timedelta(days=day.weekday())
+        end = start + timedelta(weeks=1)
+    else:
+        start = day.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+    tz = timezone.get_current_timezone()
+    return datetime.combine(start, time(), tzinfo=tz), datetime.combine(end, time(), tzinfo=tz)
+
+
+def board_key(period, day):
+    if period == 'week':
+        year, week, _ = day.isocalendar()
+        return f'leaderboard:week:{year}-W{week:02d}'
+    return f'leaderboard:month:{day:%Y-%m}'
+
+
+def board_period(key):
+    """Границы периода по ключу доски — обратное к board_key."""
+    _, period, label = key.split(':')
+    if period == 'week':
+        year, week = label.split('-W')
+        day = date.fromisocalendar(int(year), int(week), 1)
+    else:
+        year, month = label.split('-')
+        day = date(int(year), int(month), 1)
+    return period_bounds(period, day)
+
+
+def record_training(training):
+    """Добавляет калории тренировки в доски её недели и месяца после коммита транзакции."""
+    if not training.callories:
+        return
+    day = timezone.localdate(training.created_at)
+
+    def apply():
+        store = get_store()
+        for period in PERIODS:
+            key = board_key(period, day)
+            store.incr(key, training.user_id, training.callories)
+            store.expire(key, RETENTION[period].total_seconds())
+
+    transaction.on_commit(apply)
+
+
+def reconcile(period, day):
+    """Пересчитывает доску периода из базы одним GROUP BY и атомарно подменяет её. Возвращает число участников."""
+    start, end = period_bounds(period, day)
+    totals = dict(Training.objects.filter(created_at__gte=start, created_at__lt=end, callories__gt=0)
+                  .values('user_id').annotate(total=Sum('callories')).values_list('user_id', 'total'))
+    key = board_key(period, day)
+    store = get_store()
+    store.replace(key, totals)
+    store.expire(key, RETENTION[period].total_seconds())
+    return len(totals)
+
+
+def prune_expired(now=None):
+    """Удаляет из LeaderboardEntry доски, чей период закончился раньше срока хранения. Возвращает число строк."""
+    now = now or timezone.now()
+    expired = [board for board in LeaderboardEntry.objects.values_list('board', flat=True).distinct()
+               if board_period(board)[1] + RETENTION[board.split(':')[1]] < now]
+    if not expired:
+        return 0
+    return LeaderboardEntry.objects.filter(board__in=expired).delete()[0]
+
+
+def top(period, day, limit=10):
+    return get_store().top(board_key(period, day), limit)
+
+
+def my_rank(period, day, user_id):
+    return get_store().rank(board_key(period, day), user_id)
+
+
+def friends_board(period, day, user_ids):
+    """Доска среди друзей: очки берутся из общей доски одним ZMSCORE, ранжирование — в памяти."""
+    scores = get_store().scores_of(board_key(period, day), user_ids)
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from training.archive import ARCHIVE_BATCH_USERS, archive_users
+from training.models import Training
+
+
+class Command(BaseCommand):
+    help = 'Переносит тренировки старше заданного срока в сжатый помесячный архив.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=365, help='Архивировать тренировки старше N дней')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        user_ids = list(Training.objects.filter(created_at__lt=cutoff).order_by('user_id')
+                        .values_list('user_id', flat=True).distinct())
+
+        archived = raw_bytes = packed_bytes = 0
+        for start in range(0, len(user_ids), ARCHIVE_BATCH_USERS):
+            rows, raw, packed = archive_users(user_ids[start:start + ARCHIVE_BATCH_USERS], cutoff)
+            archived += rows
+            raw_bytes += raw
+            packed_bytes += packed
+
+        ratio = raw_bytes / packed_bytes if packed_bytes else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} trainings older than {cutoff:%Y-%m-%d}: "
+            f"{raw_bytes / 1024:.1f} KiB as JSON -> {packed_bytes / 1024:.1f} KiB compressed ({ratio:.1f}x)"))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from training.leaderboard import PERIODS, board_key, period_bounds, prune_expired, reconcile
+
+
+class Command(BaseCommand):
+    help = ('Ночная сверка лидербордов с базой: пересчитывает доски текущих и предыдущих периодов '
+            'и удаляет устаревшие доски из таблицы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periods', type=int, default=2,
+                            help='Сколько последних недель и месяцев пересчитать (включая текущие)')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        for period in PERIODS:
+            day = today
+            for _ in range(options['periods']):
+                members = reconcile(period, day)
+                self.stdout.write(f"{board_key(period, day)}: {members} users")
+                start, _ = period_bounds(period, day)
+                day = start.date() - timedelta(days=1)
+        self.stdout.write(f"Pruned {prune_expired()} expired entries")
+        self.stdout.write(self.style.SUCCESS("Leaderboards reconciled"))
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0002_alter_training_callories_alter_training_created_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainingArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Месяц')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество тренировок')),
+                ('callories', models.PositiveIntegerField(default=0, verbose_name='Калории')),
+                ('duration', models.PositiveIntegerField(default=0, verbose_name='Длительность')),
+                ('payload', models.BinaryField(verbose_name='Сжатые тренировки')),
+                ('archived_at', models.DateTimeField(auto_now=True, verbose_name='Дата архивации')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='training_archives', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Архив тренировок',
+                'verbose_name_plural': 'Архив тренировок',
+                'unique_together': {('user', 'month')},
+            },
+        ),
+    ]
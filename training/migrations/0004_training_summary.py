@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0003_trainingarchive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='training',
+            name='type',
+            field=models.CharField(choices=[('run', 'Run'), ('gym', 'Gym'), ('manual', 'Manual'), ('summary', 'Archived month')], max_length=10, verbose_name='Тип тренировки'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0004_training_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='training',
+            index=models.Index(fields=['created_at', 'user', 'callories'], name='training_period_idx'),
+        ),
+    ]
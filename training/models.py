@@ -4,7 +4,9 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 
 
 class Training(models.Model):
-    TYPE_CHOICES = [('run', 'Run'), ('gym', 'Gym'), ('manual', 'Manual'), ]
+    TYPE_CHOICES = [('run', 'Run'), ('gym', 'Gym'), ('manual', 'Manual'), ('summary', 'Archived month'), ]
+    # Строка-сводка заархивированного месяца: калории и минуты за месяц, дата — начало месяца
+    SUMMARY = 'summary'
     INTENSITY_CHOICES = [('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ]
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='trainings', verbose_name='Пользователь')
@@ -14,6 +16,12 @@ class Training(models.Model):
     callories = models.PositiveIntegerField(null=True, blank=True, verbose_name='Калории')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
 
+    class Meta:
+        indexes = [
+            # Пересборка досок лидерборда (reconcile) суммирует калории за период прямо по этому индексу
+            models.Index(fields=['created_at', 'user', 'callories'], name='training_period_idx'),
+        ]
+
     def calculate_calories(self):
         if self.type == 'manual':
             return self.callories
@@ -28,9 +36,54 @@ class Training(models.Model):
         return round(factor * float(weight) * (self.duration / 60))
 
     def save(self, *args, **kwargs):
-        if self.type != 'manual':
+        if self.type not in ('manual', self.SUMMARY):
             self.callories = self.calculate_calories()
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Тренировка от {self.user.username} - {self.type} ({self.created_at.date()})"
+
+
+class TrainingArchive(models.Model):
+    """
+    Архив старых тренировок: одна строка на пользователя и месяц. Сводка (count, калории,
+    минуты) хранится в колонках, сами тренировки — сжатым колоночным JSON в payload.
+    В горячей таблице вместо них остаётся одна Training с type='summary' на месяц.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='training_archives',
+                             verbose_name='Пользователь')
+    month = models.DateField(verbose_name='Месяц')
+    count = models.PositiveIntegerField(default=0, verbose_name='Количество тренировок')
+    callories = models.PositiveIntegerField(default=0, verbose_name='Калории')
+    duration = models.PositiveIntegerField(default=0, verbose_name='Длительность')
+    payload = models.BinaryField(verbose_name='Сжатые тренировки')
+    archived_at = models.DateTimeField(auto_now=True, verbose_name='Дата архивации')
+
+    class Meta:
+        unique_together = ('user', 'month')
+        verbose_name = 'Архив тренировок'
+        verbose_name_plural = 'Архив тренировок'
+
+    def __str__(self):
+        return f"Архив {self.user_id} за {self.month:%m.%Y}: {self.count}"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Очки пользователя на доске лидерборда без Redis: одна строка на доску и участника.
+    Обновляется инкрементально при записи тренировки и пересобирается сверкой; индекс
+    (board, -score, user) отдаёт top-N и ранг без агрегации тренировок.
+    """
+    board = models.CharField(max_length=40, verbose_name='Доска')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='leaderboard_entries',
+                             verbose_name='Пользователь')
+    score = models.PositiveIntegerField(default=0, verbose_name='Калории')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['board', 'user'], name='leaderboard_entry_unique')]
+        indexes = [models.Index(fields=['board', '-score', 'user'], name='leaderboard_rank_idx')]
+        verbose_name = 'Место в лидерборде'
+        verbose_name_plural = 'Места в лидербордах'
+
+    def __str__(self):
+        return f"{self.board}: {self.user_id} — {self.score}"
@@ -10,6 +10,8 @@ class TrainingSerializer(serializers.ModelSerializer):
         read_only_fields = ['callories', 'created_at']
 
     def validate(self, data):
+        if data['type'] == Training.SUMMARY:
+            raise serializers.ValidationError("Summary rows are created only by archiving.")
         if data['type'] == 'manual':
             if 'callories' not in data:
                 raise serializers.ValidationError("For manual training, callories is required.")
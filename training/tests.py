@@ -1,3 +1,136 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.sync import record_changes
+from core.testing import make_client
+from users.models import User
+from . import leaderboard
+from .archive import archive_user, archive_users
+from .models import LeaderboardEntry, Training, TrainingArchive
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=1, username='user', password='x')
+        self.client = make_client(self.user)
+        trainings = Training.objects.bulk_create([
+            Training(user=self.user, type='manual', callories=100 + day, duration=30) for day in range(90)])
+        now = timezone.now()
+        for day, training in enumerate(trainings):
+            training.created_at = now - timedelta(days=day * 5)
+        Training.objects.bulk_update(trainings, ['created_at'])
+        record_changes(self.user.id, 'training', [training.id for training in trainings])
+        self.total = Training.objects.aggregate(total=Sum('callories'))['total']
+        self.cutoff = now - timedelta(days=200)
+
+    def test_live_aggregates_keep_archived_calories(self):
+        archived, _, _ = archive_user(self.user.id, self.cutoff)
+        self.assertGreater(archived, 0)
+        self.assertEqual(Training.objects.aggregate(total=Sum('callories'))['total'], self.total)
+        self.assertEqual(Training.objects.filter(type=Training.SUMMARY).count(), TrainingArchive.objects.count())
+
+        # Повторный прогон дописывает в те же месяцы и обновляет сводки, а не плодит их
+        Training.objects.create(user=self.user, type='manual', callories=7, duration=10)
+        archive_user(self.user.id, timezone.now() + timedelta(days=1))
+        self.assertEqual(Training.objects.aggregate(total=Sum('callories'))['total'], self.total + 7)
+        self.assertEqual(Training.objects.filter(type=Training.SUMMARY).count(), TrainingArchive.objects.count())
+
+    def test_batch_query_count_does_not_depend_on_users(self):
+        def archive_queries(count):
+            users = User.objects.bulk_create([User(telegram_id=1000 * count + index, username=f'u{count}-{index}',
+                                                   password='x') for index in range(count)])
+            trainings = Training.objects.bulk_create([Training(user=user, type='manual', callories=10, duration=5)
+                                                      for user in users for _ in range(3)])
+            for index, training in enumerate(trainings):
+                training.created_at = self.cutoff - timedelta(days=1 + 40 * (index % 3))
+            Training.objects.bulk_update(trainings, ['created_at'])
+            with CaptureQueriesContext(connection) as queries:
+                archived, _, _ = archive_users([user.id for user in users], self.cutoff)
+            self.assertEqual(archived, 3 * count)
+            return len(queries)
+
+        self.assertEqual(archive_queries(1), archive_queries(20))
+        self.assertEqual(TrainingArchive.objects.filter(count=1).count(), 63)
+
+    def test_history_limit_is_clamped(self):
+        for limit, expected in ((-1, 1), (0, 1), (5000, 90)):
+            response = self.client.get('/api/training/history/', {'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()), expected)
+
+    def test_history_reads_through_without_summaries(self):
+        archive_user(self.user.id, self.cutoff)
+        rows = self.client.get('/api/training/history/', {'limit': 1000}).json()
+        self.assertEqual(len(rows), 90)
+        self.assertNotIn(Training.SUMMARY, {row['type'] for row in rows})
+
+    def test_sync_sees_tombstones_and_summaries(self):
+        since = self.client.get('/api/sync/', {'since': 0, 'limit': 1000}).json()['next']
+        archived_ids = set(Training.objects.filter(created_at__lt=self.cutoff).values_list('id', flat=True))
+        archive_user(self.user.id, self.cutoff)
+
+        body = self.client.get('/api/sync/', {'since': since, 'limit': 1000}).json()
+        self.assertEqual(set(body['deleted']['trainings']), archived_ids)
+        self.assertEqual({row['type'] for row in body['changed']['trainings']}, {Training.SUMMARY})
+
+        full = self.client.get('/api/sync/', {'since': 0, 'limit': 1000}).json()
+        self.assertEqual(sum(row['callories'] for row in full['changed']['trainings']), self.total)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(telegram_id=index, username=f'user{index}', password='x',
+                                          telegram_username=f'user{index}') for index in range(1, 4)]
+        with self.captureOnCommitCallbacks(execute=True):
+            for user, callories in zip(self.users, (300, 200, 400)):
+                leaderboard.record_training(Training.objects.create(user=user, type='manual', callories=callories,
+                                                                    duration=30))
+            leaderboard.record_training(Training.objects.create(user=self.users[1], type='manual', callories=300,
+                                                                duration=30))
+        self.client = make_client(self.users[0])
+
+    def get_board(self, **params):
+        return self.client.get('/api/training/leaderboard/', params)
+
+    def test_database_store_ranks_from_entries(self):
+        self.assertEqual(LeaderboardEntry.objects.filter(board__startswith='leaderboard:week:').count(), 3)
+        with self.assertNumQueries(5):
+            # Пользователь, top-N, очки, ранг и имена — без агрегации тренировок
+            body = self.get_board().json()
+        self.assertEqual([row['user_id'] for row in body['top']], [self.users[1].id, self.users[2].id, self.users[0].id])
+        self.assertEqual(body['top'][0]['callories'], 500)
+        self.assertEqual(body['me'], {'rank': 3, 'callories': 300})
+
+    def test_reconcile_rebuilds_entries_and_prunes_expired(self):
+        day = timezone.localdate()
+        board = leaderboard.board_key('week', day)
+        LeaderboardEntry.objects.filter(board=board, user=self.users[0]).update(score=1)
+        LeaderboardEntry.objects.create(board='leaderboard:week:2020-W01', user=self.users[0], score=5)
+        self.assertEqual(leaderboard.reconcile('week', day), 3)
+        self.assertEqual(leaderboard.my_rank('week', day, self.users[0].id), (2, 300))
+        self.assertEqual(leaderboard.prune_expired(), 1)
+        self.assertFalse(LeaderboardEntry.objects.filter(board='leaderboard:week:2020-W01').exists())
+
+    def test_friends_scope(self):
+        self.assertEqual(self.get_board(scope='friends').json()['top'][0]['user_id'], self.users[0].id)
+        self.users[0].friends.add(self.users[2])
+
+        body = self.get_board(scope='friends').json()
+        self.assertEqual([row['user_id'] for row in body['top']], [self.users[2].id, self.users[0].id])
+        self.assertEqual(body['me']['rank'], 2)
+
+        self.users[0].friends.remove(self.users[2])
+        self.assertEqual(len(self.get_board(scope='friends').json()['top']), 1)
+
+    def test_limit_is_clamped(self):
+        self.assertEqual(len(self.get_board(limit=-1).json()['top']), 1)
+        self.assertEqual(len(self.get_board(limit=1000).json()['top']), 3)
 
-# Create your tests here.
+    def test_invalid_date_is_rejected(self):
+        self.assertEqual(self.get_board(date='2025-02-30').status_code, 400)
+        self.assertEqual(self.get_board(date='2025-02-28').status_code, 200)
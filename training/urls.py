@@ -1,5 +1,7 @@
 from django.urls import path
 
-from .views import TrainingCreateView
+from .views import TrainingCreateView, TrainingHistoryView, LeaderboardView
 
-urlpatterns = [path('training/', TrainingCreateView.as_view(), name='create-training'), ]
+urlpatterns = [path('training/', TrainingCreateView.as_view(), name='create-training'),
+               path('training/history/', TrainingHistoryView.as_view(), name='training-history'),
+               path('training/leaderboard/', LeaderboardView.as_view(), name='training-leaderboard'), ]
@@ -1,7 +1,18 @@
+from itertools import islice
+
+from django.db import transaction
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from core.outbox import publish_event
+from core.renderers import ORJSONRenderer
+from core.sync import record_change
+from . import leaderboard
+from .archive import iter_history
 from .serializers import TrainingSerializer
 
 
@@ -11,6 +22,76 @@ class TrainingCreateView(APIView):
     def post(self, request):
         serializer = TrainingSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(user=request.user)
+            with transaction.atomic():
+                training = serializer.save(user=request.user)
+                leaderboard.record_training(training)
+                record_change(request.user.id, 'training', training.id)
+                publish_event('training.created', request.user.id, serializer.data)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class TrainingHistoryView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
+    use_read_replica = True
+    max_limit = 1000
+
+    def get(self, request):
+        bounds = {}
+        for param in ('since', 'until'):
+            value = request.query_params.get(param)
+            if value:
+                bounds[param] = parse_datetime(value)
+                if bounds[param] is None:
+                    return Response({"detail": f"{param} must be an ISO datetime"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 100)), 1), self.max_limit)
+        except ValueError:
+            return Response({"detail": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(list(islice(iter_history(request.user, **bounds), limit)))
+
+
+class LeaderboardView(APIView):
+    """
+    Лидерборд по сожжённым калориям: ?period=week|month, ?scope=global|friends, ?date=YYYY-MM-DD, ?limit=.
+    Читается из хранилища досок (LEADERBOARD_STORE); scope=friends — среди User.friends.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
+    use_read_replica = True
+    max_limit = 100
+
+    def get(self, request):
+        period = request.query_params.get('period', 'week')
+        scope = request.query_params.get('scope', 'global')
+        if period not in leaderboard.PERIODS or scope not in ('global', 'friends'):
+            return Response({"detail": "period must be week|month, scope must be global|friends"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            day = parse_date(request.query_params.get('date', '')) or timezone.localdate()
+        except ValueError:
+            return Response({"detail": "date must be a valid YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), self.max_limit)
+        except ValueError:
+            return Response({"detail": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        user_id = request.user.id
+        if scope == 'friends':
+            members = [user_id, *request.user.friends.values_list('id', flat=True)]
+            ranked = leaderboard.friends_board(period, day, members)
+            rows = ranked[:limit]
+            me = next(((rank, score) for rank, (member, score) in enumerate(ranked) if member == user_id), None)
+        else:
+            rows = leaderboard.top(period, day, limit)
+            me = leaderboard.my_rank(period, day, user_id)
+
+        names = dict(get_user_model().objects.filter(id__in=[member for member, _ in rows])
+                     .values_list('id', 'first_name'))
+        return Response({
+            'period': period, 'scope': scope, 'key': leaderboard.board_key(period, day),
+            'top': [{'rank': rank + 1, 'user_id': member, 'name': names.get(member), 'callories': int(score)}
+                    for rank, (member, score) in enumerate(rows)],
+            'me': {'rank': me[0] + 1, 'callories': int(me[1])} if me else None})
@@ -1,8 +1,10 @@
 from django.contrib import admin
+from django.db import transaction
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.html import format_html
 
+from core.outbox import publish_event
 from .models import User
 
 
@@ -140,26 +142,37 @@ class UserAdmin(admin.ModelAdmin):
 
     # ⚡ Действия
     def activate_trial(self, request, queryset):
-        for user in queryset:
-            if user.trial_status == 'NOT_STARTED':
+        for user in queryset.filter(trial_status='NOT_STARTED'):
+            with transaction.atomic():
                 user.trial_status = 'IN_PROGRESS'
                 user.trial_end_date = timezone.now() + timezone.timedelta(days=7)
                 user.save()
+                publish_event('entitlement.trial_started', user.id, {'trial_end_date': user.trial_end_date},
+                              compaction_key=f'entitlement:trial_started:{user.id}')
         self.message_user(request, "Пробный период активирован для выбранных пользователей")
 
     activate_trial.short_description = "Активировать пробный период"
 
     def deactivate_trial(self, request, queryset):
-        queryset.update(trial_status='ENDED')
+        # По одному через save(): updated_at (ETag профиля и статуса триала) и запись в журнал синхронизации
+        for user in queryset.exclude(trial_status='ENDED'):
+            with transaction.atomic():
+                user.trial_status = 'ENDED'
+                user.save()
+                publish_event('entitlement.trial_ended', user.id, {'trial_end_date': user.trial_end_date},
+                              compaction_key=f'entitlement:trial_ended:{user.id}')
         self.message_user(request, "Пробный период деактивирован")
 
     deactivate_trial.short_description = "Завершить пробный период"
 
     def grant_premium(self, request, queryset):
         for user in queryset:
-            user.is_premium = True
-            user.premium_end_date = timezone.now() + timezone.timedelta(days=30)
-            user.save()
+            with transaction.atomic():
+                user.is_premium = True
+                user.premium_end_date = timezone.now() + timezone.timedelta(days=30)
+                user.save()
+                publish_event('entitlement.premium_granted', user.id, {'premium_end_date': user.premium_end_date},
+                              compaction_key=f'entitlement:premium_granted:{user.id}')
         self.message_user(request, "Премиум доступ выбранным пользователям")
 
     grant_premium.short_description = "Выдать премиум доступ"
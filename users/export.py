@@ -0,0 +1,73 @@
+import csv
+
+import orjson
+
+from dishes.models import SavedDish
+from training.archive import ARCHIVE_FIELDS, iter_history
+from .models import BodyMeasurement
+from .serializers import ProfileSerializer
+
+EXPORT_CHUNK_SIZE = 2000
+
+SAVED_DISH_FIELDS = ('dish_id', 'dish__name', 'dish__callories', 'dish__fats', 'dish__proteins',
+                     'dish__carbohydrates', 'is_saved')
+MEASUREMENT_FIELDS = ('id', 'measured_at', 'weight', 'waist', 'hips', 'chest', 'body_fat')
+
+# Разделы выгрузки: имя -> (функция, возвращающая ленивый итератор строк пользователя, поля).
+# Новые истории (например, дневник питания) добавляются сюда же.
+EXPORT_SECTIONS = {
+    'saved_dishes': (lambda user: SavedDish.objects.filter(user=user).order_by('id').values(*SAVED_DISH_FIELDS)
+                     .iterator(chunk_size=EXPORT_CHUNK_SIZE), SAVED_DISH_FIELDS),
+    # Тренировки читаются вместе с архивом
+    'trainings': (iter_history, ARCHIVE_FIELDS),
+    'measurements': (lambda user: BodyMeasurement.objects.filter(user=user).order_by('measured_at')
+                     .values(*MEASUREMENT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE), MEASUREMENT_FIELDS),
+}
+
+
+def iter_sections(user):
+    """
+    Отдаёт (section, fields, rows) по одному разделу; rows — ленивый итератор
+    поверх queryset.iterator(), поэтому в памяти держится не больше одного чанка.
+    """
+    profile = dict(ProfileSerializer(user).data)
+    yield 'profile', tuple(profile), iter([profile])
+    for section, (get_rows, fields) in EXPORT_SECTIONS.items():
+        yield section, fields, get_rows(user)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return orjson.dumps(value).decode()
+    return value
+
+
+def stream_csv(user):
+    """CSV: первая колонка — раздел, у каждого раздела своя строка-заголовок."""
+    writer = csv.writer(_Echo())
+    for section, fields, rows in iter_sections(user):
+        yield writer.writerow(['section', *fields])
+        for row in rows:
+            yield writer.writerow([section, *(_csv_value(row[field]) for field in fields)])
+
+
+def stream_json(user):
+    """JSON-объект {раздел: [...]} собирается по кускам, без построения целого документа в памяти."""
+    yield b'{'
+    for index, (section, fields, rows) in enumerate(iter_sections(user)):
+        yield (b',' if index else b'') + orjson.dumps(section) + b':['
+        for position, row in enumerate(rows):
+            yield (b',' if position else b'') + orjson.dumps(row, default=str)
+        yield b']'
+    yield b'}'
+
+
+EXPORT_FORMATS = {
+    'json': (stream_json, 'application/json'),
+    'csv': (stream_csv, 'text/csv; charset=utf-8'),
+}
@@ -0,0 +1,78 @@
+import gzip
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from users.export import EXPORT_FORMATS
+from users.models import User
+
+
+def _open_output(path, compress):
+    return gzip.open(path, 'wb') if compress else open(path, 'wb')
+
+
+def _write_export(user, export_format, output):
+    stream, _ = EXPORT_FORMATS[export_format]
+    for chunk in stream(user):
+        output.write(chunk.encode() if isinstance(chunk, str) else chunk)
+
+
+def _init_worker():
+    # На платформах со spawn (Windows, macOS) дочерний процесс стартует без настроенного Django
+    django.setup()
+
+
+def _export_one(user_id, export_format, output_dir, compress):
+    user = User.objects.get(pk=user_id)
+    suffix = f'.{export_format}.gz' if compress else f'.{export_format}'
+    with _open_output(Path(output_dir) / f'user_{user_id}{suffix}', compress) as output:
+        _write_export(user, export_format, output)
+    return user_id
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка всех данных пользователя (профиль, сохранённые блюда, тренировки) в CSV/JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--telegram-id', type=int, help='Выгрузить одного пользователя')
+        parser.add_argument('--all', action='store_true', help='Выгрузить всех пользователей в --output-dir')
+        parser.add_argument('--format', dest='export_format', choices=list(EXPORT_FORMATS), default='json')
+        parser.add_argument('--output', help='Файл для одного пользователя (по умолчанию stdout)')
+        parser.add_argument('--output-dir', default='exports', help='Каталог для выгрузки всех пользователей')
+        parser.add_argument('--gzip', action='store_true', help='Сжимать файлы gzip на лету')
+        parser.add_argument('--workers', type=int, default=4, help='Число процессов для --all')
+
+    def handle(self, *args, **options):
+        export_format = options['export_format']
+
+        if options['all']:
+            output_dir = Path(options['output_dir'])
+            output_dir.mkdir(parents=True, exist_ok=True)
+            user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+            # Соединения родителя не должны наследоваться форкнутыми воркерами
+            connections.close_all()
+            exported = 0
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as executor:
+                for _ in executor.map(_export_one, user_ids, [export_format] * len(user_ids),
+                                      [output_dir] * len(user_ids), [options['gzip']] * len(user_ids),
+                                      chunksize=64):
+                    exported += 1
+            self.stdout.write(self.style.SUCCESS(f"Exported {exported} users to {output_dir}"))
+            return
+
+        if options['telegram_id'] is None:
+            raise CommandError("Pass --telegram-id or --all")
+        try:
+            user = User.objects.get(telegram_id=options['telegram_id'])
+        except User.DoesNotExist:
+            raise CommandError(f"User with telegram_id={options['telegram_id']} not found")
+
+        if options['output']:
+            with _open_output(options['output'], options['gzip']) as output:
+                _write_export(user, export_format, output)
+        else:
+            _write_export(user, export_format, sys.stdout.buffer)
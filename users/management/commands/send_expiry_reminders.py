@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from users.models import Notification
+from users.notifications import send_reminders
+
+
+class Command(BaseCommand):
+    help = 'Рассылает в Telegram напоминания об окончании пробного периода и подписки.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours-before', type=int, default=24, help='За сколько часов до окончания напоминать')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=20, help='Одновременных запросов к Bot API')
+        parser.add_argument('--api-url', help='Адрес Bot API (например, локальный stub)')
+
+    def handle(self, *args, **options):
+        lead = timedelta(hours=options['hours_before'])
+        for kind in Notification.Kind:
+            sent, failed = send_reminders(kind, lead, batch_size=options['batch_size'],
+                                          concurrency=options['concurrency'], api_url=options['api_url'])
+            self.stdout.write(f"{kind.label}: sent {sent}, failed {failed}")
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:08
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_premium_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BodyMeasurement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('measured_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата измерения')),
+                ('weight', models.DecimalField(blank=True, decimal_places=1, max_digits=5, null=True, validators=[django.core.validators.MinValueValidator(Decimal('20.0'), message='Вес не может быть меньше 20 кг.'), django.core.validators.MaxValueValidator(Decimal('300.0'), message='Вес не может быть больше 300 кг.')], verbose_name='Вес')),
+                ('waist', models.DecimalField(blank=True, decimal_places=1, max_digits=5, null=True, verbose_name='Талия')),
+                ('hips', models.DecimalField(blank=True, decimal_places=1, max_digits=5, null=True, verbose_name='Бёдра')),
+                ('chest', models.DecimalField(blank=True, decimal_places=1, max_digits=5, null=True, verbose_name='Грудь')),
+                ('body_fat', models.DecimalField(blank=True, decimal_places=1, max_digits=4, null=True, verbose_name='Процент жира')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='measurements', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Измерение',
+                'verbose_name_plural': 'Измерения',
+                'indexes': [models.Index(fields=['user', 'measured_at'], name='users_bodym_user_id_cd98dd_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_bodymeasurement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='saved_dishes_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия списка сохранённых блюд'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения профиля'),
+        ),
+    ]
@@ -4,9 +4,12 @@ from decimal import Decimal
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
+from core.outbox import publish_event
+from core.sync import record_change
+
 
 class User(AbstractUser):
     class Gender(models.TextChoices):
@@ -54,7 +57,11 @@ class User(AbstractUser):
     premium_end_date = models.DateTimeField(blank=True, null=True, verbose_name='Окончание подписки')
 
     created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name='Дата создания профиля')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения профиля')
+    saved_dishes_version = models.PositiveIntegerField(default=0, editable=False,
+                                                       verbose_name='Версия списка сохранённых блюд')
     source = models.CharField(max_length=100, null=True, blank=True, verbose_name='Откуда узнали о приложении')
+    friends = models.ManyToManyField('self', blank=True, verbose_name='Друзья')
 
     USERNAME_FIELD = 'telegram_id'
     REQUIRED_FIELDS = []
@@ -63,6 +70,8 @@ class User(AbstractUser):
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['trial_status', 'trial_end_date']),
+                   models.Index(fields=['is_premium', 'premium_end_date'])]
 
     def start_trial(self, days=3):
         if self.trial_status == self.TrialStatus.NOT_STARTED:
@@ -72,8 +81,11 @@ class User(AbstractUser):
 
     def check_trial_status(self):
         if self.trial_status == self.TrialStatus.IN_PROGRESS and self.trial_end_date <= timezone.now():
-            self.trial_status = self.TrialStatus.ENDED
-            self.save()
+            with transaction.atomic():
+                self.trial_status = self.TrialStatus.ENDED
+                self.save()
+                publish_event('entitlement.trial_ended', self.id, {'trial_end_date': self.trial_end_date},
+                              compaction_key=f'entitlement:trial_ended:{self.id}')
         return self.trial_status
 
     def get_bmi_status(self):
@@ -119,16 +131,94 @@ class User(AbstractUser):
         if self.weight and (self.weight < 20 or self.weight > 300):
             raise ValidationError({'weight': "Вес должен быть между 20 и 300 кг."})
 
+    def calculate_bmi(self, weight=None):
+        weight = self.weight if weight is None else weight
+        if self.height and weight:
+            height_in_m = Decimal(self.height) / Decimal(100)
+            return (Decimal(weight) / (height_in_m ** 2)).quantize(Decimal('0.01'))
+        return None
+
     def save(self, *args, **kwargs):
         self.full_clean()
         if not self.pk:
             self.created_at = timezone.now()
         if self.height and self.weight:
-            height_in_m = Decimal(self.height) / Decimal(100)
-            self.bmi = (self.weight / (height_in_m ** 2)).quantize(Decimal('0.01'))
+            self.bmi = self.calculate_bmi()
         if self.birth_date:
             self.age = self.calculate_age()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            record_change(self.pk, 'profile', self.pk)
 
     def __str__(self):
         return f"{self.telegram_username or self.telegram_id}"
+
+
+class BodyMeasurement(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='measurements', verbose_name='Пользователь')
+    measured_at = models.DateTimeField(default=timezone.now, verbose_name='Дата измерения')
+    weight = models.DecimalField(max_digits=5, decimal_places=1, blank=True, null=True, verbose_name='Вес', validators=[
+        MinValueValidator(Decimal('20.0'), message="Вес не может быть меньше 20 кг."),
+        MaxValueValidator(Decimal('300.0'), message="Вес не может быть больше 300 кг.")])  # В кг
+    waist = models.DecimalField(max_digits=5, decimal_places=1, blank=True, null=True, verbose_name='Талия')  # В см
+    hips = models.DecimalField(max_digits=5, decimal_places=1, blank=True, null=True, verbose_name='Бёдра')  # В см
+    chest = models.DecimalField(max_digits=5, decimal_places=1, blank=True, null=True, verbose_name='Грудь')  # В см
+    body_fat = models.DecimalField(max_digits=4, decimal_places=1, blank=True, null=True,
+                                   verbose_name='Процент жира')
+
+    CHART_FIELDS = ('weight', 'waist', 'hips', 'chest', 'body_fat')
+
+    class Meta:
+        verbose_name = 'Измерение'
+        verbose_name_plural = 'Измерения'
+        indexes = [models.Index(fields=['user', 'measured_at'])]
+
+    def mirror_to_user(self):
+        """
+        Если это самое свежее измерение веса, переносит вес и ИМТ в User одним UPDATE,
+        без full_clean и сохранения всей модели.
+        """
+        if self.weight is None:
+            return
+        newer = BodyMeasurement.objects.filter(user_id=self.user_id, weight__isnull=False,
+                                               measured_at__gt=self.measured_at).exists()
+        if newer:
+            return
+        self.user.weight = self.weight
+        self.user.bmi = self.user.calculate_bmi()
+        self.user.updated_at = timezone.now()
+        User.objects.filter(pk=self.user_id).update(weight=self.user.weight, bmi=self.user.bmi,
+                                                    updated_at=self.user.updated_at)
+        record_change(self.user_id, 'profile', self.user_id)
+
+    def __str__(self):
+        return f"{self.user} - {self.measured_at:%d.%m.%Y}"
+
+
+class Notification(models.Model):
+    """Отправленные напоминания: уникальность по (user, kind, end_date) не даёт прислать одно и то же дважды."""
+
+    class Kind(models.TextChoices):
+        TRIAL_EXPIRY = 'TRIAL_EXPIRY', 'Окончание пробного периода'
+        PREMIUM_EXPIRY = 'PREMIUM_EXPIRY', 'Окончание подписки'
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'В очереди'
+        SENT = 'SENT', 'Отправлено'
+        FAILED = 'FAILED', 'Ошибка'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications', verbose_name='Пользователь')
+    kind = models.CharField(max_length=20, choices=Kind.choices, verbose_name='Тип')
+    end_date = models.DateTimeField(verbose_name='Дата окончания')
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING, verbose_name='Статус')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попытки')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата отправки')
+
+    class Meta:
+        verbose_name = 'Уведомление'
+        verbose_name_plural = 'Уведомления'
+        unique_together = ('user', 'kind', 'end_date')
+
+    def __str__(self):
+        return f"{self.kind} для {self.user_id} ({self.status})"
@@ -0,0 +1,162 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Notification, User
+
+# Лимиты Bot API: ~30 сообщений в секунду всего и не чаще 1 сообщения в секунду в один чат
+GLOBAL_RATE = 30
+PER_CHAT_INTERVAL = 1.0
+MAX_ATTEMPTS = 4
+# Сколько попыток всего (за все запуски) даётся одному напоминанию, прежде чем оно станет FAILED
+MAX_TOTAL_ATTEMPTS = 12
+
+REMINDERS = {
+    Notification.Kind.TRIAL_EXPIRY: {
+        'filter': {'trial_status': User.TrialStatus.IN_PROGRESS},
+        'end_field': 'trial_end_date',
+        'text': "Пробный период FoodMind закончится {end:%d.%m.%Y в %H:%M}. Оформите подписку, чтобы не потерять доступ.",
+    },
+    Notification.Kind.PREMIUM_EXPIRY: {
+        'filter': {'is_premium': True},
+        'end_field': 'premium_end_date',
+        'text': "Подписка FoodMind закончится {end:%d.%m.%Y в %H:%M}. Продлите её, чтобы сохранить премиум-доступ.",
+    },
+}
+
+
+def iter_due_batches(kind, lead, batch_size=1000):
+    """
+    Пользователи, у которых trial/premium кончается в ближайшие lead и напоминание ещё не отправлено
+    и не брошено (SENT/FAILED). PENDING-записи — после падения между созданием и отправкой или после
+    временных ошибок — попадают в выборку снова. Выборка идёт по индексу (статус, дата окончания)
+    с keyset-пагинацией по pk.
+    """
+    reminder = REMINDERS[kind]
+    end_field = reminder['end_field']
+    now = timezone.now()
+    already = Notification.objects.filter(user=OuterRef('pk'), kind=kind, end_date=OuterRef(end_field),
+                                          status__in=[Notification.Status.SENT, Notification.Status.FAILED])
+    users = (User.objects.filter(**reminder['filter'], **{f'{end_field}__gt': now, f'{end_field}__lte': now + lead},
+                                 telegram_id__isnull=False)
+             .exclude(Exists(already)).order_by('pk'))
+    last_pk = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_pk).values_list('pk', 'telegram_id', end_field)[:batch_size])
+        if not batch:
+            return
+        last_pk = batch[-1][0]
+        yield batch
+
+
+class RateLimiter:
+    """Глобальный лимит отправки: не больше rate запросов в секунду, с общей паузой после 429."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        self.next_at = max(self.next_at, time.monotonic() + seconds)
+
+
+def retry_after_of(response):
+    """retry_after из тела 429; тело может оказаться не JSON (например, от прокси перед Bot API)."""
+    try:
+        return float(response.json().get('parameters', {}).get('retry_after', 1))
+    except (ValueError, AttributeError, TypeError):
+        return 1.0
+
+
+async def send_messages(messages, concurrency=20, rate=GLOBAL_RATE, api_url=None, token=None, transport=None):
+    """
+    Отправляет [(key, chat_id, text), ...] через Bot API с ограниченной параллельностью.
+    На 429 ждёт retry_after и приостанавливает всю отправку, на сетевые ошибки и 5xx — экспоненциальный backoff.
+    Возвращает {key: (ok, attempts, retryable)}; retryable — ошибка временная и стоит повторить в следующий запуск.
+    """
+    import httpx  # тяжёлая зависимость нужна только отправителю
+
+    api_url = api_url or settings.TELEGRAM_API_URL
+    token = token or settings.TELEGRAM_TOKEN
+    url = f"{api_url}/bot{token}/sendMessage"
+    limiter = RateLimiter(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    chat_last_sent = {}
+    results = {}
+
+    async def send(client, key, chat_id, text):
+        async with semaphore:
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                chat_delay = chat_last_sent.get(chat_id, 0) + PER_CHAT_INTERVAL - time.monotonic()
+                if chat_delay > 0:
+                    await asyncio.sleep(chat_delay)
+                await limiter.wait()
+                chat_last_sent[chat_id] = time.monotonic()
+                try:
+                    response = await client.post(url, json={'chat_id': chat_id, 'text': text})
+                except httpx.HTTPError:
+                    await asyncio.sleep(2 ** attempt / 4)
+                    continue
+                if response.status_code == 429:
+                    retry_after = retry_after_of(response)
+                    limiter.pause(retry_after)
+                    await asyncio.sleep(retry_after)
+                    continue
+                if response.status_code >= 500:
+                    await asyncio.sleep(2 ** attempt / 4)
+                    continue
+                # 4xx кроме 429 (бот заблокирован, чат не найден) повторять бессмысленно
+                results[key] = (response.status_code == 200, attempt, False)
+                return
+            results[key] = (False, MAX_ATTEMPTS, True)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=10, limits=limits, transport=transport) as client:
+        await asyncio.gather(*(send(client, *message) for message in messages))
+    return results
+
+
+def send_reminders(kind, lead, batch_size=1000, concurrency=20, api_url=None, transport=None):
+    """
+    Создаёт записи Notification (PENDING) для пачки пользователей до отправки — уникальный ключ
+    гарантирует, что отправленное напоминание не придёт снова, — затем отправляет и проставляет статусы.
+    Временные ошибки оставляют запись PENDING до MAX_TOTAL_ATTEMPTS попыток, постоянные (бот
+    заблокирован) сразу делают её FAILED. Возвращает (отправлено, ошибок).
+    """
+    text = REMINDERS[kind]['text']
+    sent = failed = 0
+    for batch in iter_due_batches(kind, lead, batch_size):
+        Notification.objects.bulk_create([Notification(user_id=pk, kind=kind, end_date=end) for pk, _, end in batch],
+                                         ignore_conflicts=True)
+        pending = {(n.user_id, n.end_date): n for n in Notification.objects.filter(
+            kind=kind, status=Notification.Status.PENDING, user_id__in=[pk for pk, _, _ in batch])}
+        messages = [((pk, end), chat_id, text.format(end=timezone.localtime(end)))
+                    for pk, chat_id, end in batch if (pk, end) in pending]
+
+        results = asyncio.run(send_messages(messages, concurrency=concurrency, api_url=api_url, transport=transport))
+
+        now = timezone.now()
+        for key, (ok, attempts, retryable) in results.items():
+            notification = pending[key]
+            notification.attempts += attempts
+            if ok:
+                notification.status = Notification.Status.SENT
+            elif not retryable or notification.attempts >= MAX_TOTAL_ATTEMPTS:
+                notification.status = Notification.Status.FAILED
+            notification.sent_at = now if ok else None
+            sent += ok
+            failed += not ok
+        Notification.objects.bulk_update([pending[key] for key in results], ['status', 'attempts', 'sent_at'])
+    return sent, failed
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 
-from .models import User
+from core.fieldsets import SparseFieldsSerializerMixin
+
+from .models import User, BodyMeasurement
 
 
 class UserUpdateSerializer(serializers.ModelSerializer):
@@ -23,7 +25,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     bmi_status = serializers.CharField(source='get_bmi_status', read_only=True)
 
     class Meta:
@@ -31,3 +33,14 @@ class ProfileSerializer(serializers.ModelSerializer):
         fields = ['id', 'first_name', 'last_name', 'gender', 'birth_date', 'age', 'height', 'weight',
                   'bmi', 'bmi_status', 'meta', 'trial_status', 'trial_end_date', 'is_premium', 'premium_type']
 
+
+class BodyMeasurementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BodyMeasurement
+        fields = ['id', 'measured_at', 'weight', 'waist', 'hips', 'chest', 'body_fat']
+        extra_kwargs = {'measured_at': {'required': False}}
+
+    def validate(self, data):
+        if not any(data.get(field) is not None for field in BodyMeasurement.CHART_FIELDS):
+            raise serializers.ValidationError("At least one measurement is required.")
+        return data
@@ -0,0 +1,37 @@
+from dishes.models import Dish
+from dishes.serializers import dish_rows
+from training.models import Training
+from .export import MEASUREMENT_FIELDS
+from .models import BodyMeasurement
+from .serializers import ProfileSerializer
+
+TRAINING_FIELDS = ('id', 'type', 'duration', 'intensity', 'callories', 'created_at')
+
+# Сущности журнала синхронизации: entity -> (ключ в ответе, функция (user, ids) -> строки с полем 'id').
+# Для сохранённых блюд id — это id блюда.
+SYNC_SECTIONS = {
+    'profile': ('profile', lambda user, ids: [dict(ProfileSerializer(user).data)]),
+    'saved_dish': ('saved_dishes', lambda user, ids: dish_rows(Dish.objects.filter(id__in=ids), user)),
+    'training': ('trainings', lambda user, ids: list(Training.objects.filter(user=user, id__in=ids)
+                                                     .values(*TRAINING_FIELDS))),
+    'measurement': ('measurements', lambda user, ids: list(BodyMeasurement.objects.filter(user=user, id__in=ids)
+                                                           .values(*MEASUREMENT_FIELDS))),
+}
+
+
+def collect_changes(user, changes):
+    """
+    Собирает ответ синхронизации по строкам журнала (entity, entity_id, deleted):
+    изменённые сущности загружаются одним запросом на тип, удалённые отдаются только id.
+    """
+    upserts, deleted = {}, {}
+    for entity, entity_id, is_deleted in changes:
+        (deleted if is_deleted else upserts).setdefault(entity, []).append(entity_id)
+
+    payload = {'changed': {}, 'deleted': {}}
+    for entity, (section, load_rows) in SYNC_SECTIONS.items():
+        if entity in upserts:
+            payload['changed'][section] = load_rows(user, upserts[entity])
+        if entity in deleted:
+            payload['deleted'][section] = deleted[entity]
+    return payload
@@ -1,3 +1,198 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from django.core.cache import caches
+from django.contrib.admin.sites import AdminSite
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import OutboxEvent, SyncChange
+from core.sync import record_change, record_changes
+from core.testing import make_client
+from dishes.dedup import merge_dishes
+from dishes.models import Dish, SavedDish
+from .admin import UserAdmin
+from .models import BodyMeasurement, Notification, User
+from .notifications import send_reminders
+
+
+class MeasurementChartTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=1, username='user', password='x')
+        start = timezone.now() - timedelta(days=100)
+        BodyMeasurement.objects.bulk_create([
+            BodyMeasurement(user=self.user, measured_at=start + timedelta(days=day), weight=70 + day % 7)
+            for day in range(100)])
+
+    def chart(self, points):
+        response = make_client(self.user).get('/api/measurements/chart/', {'points': points})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_points_are_clamped_from_below(self):
+        for points in (0, -5, 2):
+            body = self.chart(points)
+            self.assertEqual(body['total'], 100)
+            self.assertEqual(len(body['points']), 3)
+
+    def test_points_are_capped_from_above(self):
+        self.assertEqual(len(self.chart(50)['points']), 50)
+        self.assertEqual(len(self.chart(10 ** 6)['points']), 100)
+
+
+@override_settings(TOKEN_BUCKET_RATES={'tma-auth': {'ip': '2/min', 'endpoint': '3/min'}})
+class TMAAuthThrottleTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def auth(self, ip, **headers):
+        return APIClient().post('/api/auth/tma/', {}, format='json', REMOTE_ADDR=ip, **headers)
+
+    def test_rejects_with_retry_after(self):
+        self.assertNotEqual(self.auth('10.0.0.1').status_code, 429)
+        self.assertNotEqual(self.auth('10.0.0.1').status_code, 429)
+        response = self.auth('10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+
+    def test_rejected_requests_do_not_drain_endpoint_bucket(self):
+        for _ in range(10):
+            self.auth('10.0.0.1')
+        # Из общей корзины ушло только 2 токена разрешённых запросов
+        self.assertNotEqual(self.auth('10.0.0.2').status_code, 429)
+
+    def test_forwarded_for_does_not_open_new_buckets(self):
+        statuses = [self.auth('10.0.0.1', HTTP_X_FORWARDED_FOR=f'192.0.2.{n}').status_code for n in range(3)]
+        self.assertEqual(statuses[-1], 429)
+
+
+@mock.patch('users.notifications.PER_CHAT_INTERVAL', 0)
+@mock.patch('users.notifications.MAX_ATTEMPTS', 1)
+@mock.patch('users.notifications.MAX_TOTAL_ATTEMPTS', 2)
+class ExpiryReminderTests(TestCase):
+    kind = Notification.Kind.TRIAL_EXPIRY
+
+    def setUp(self):
+        self.end = timezone.now() + timedelta(hours=2)
+        self.user = User.objects.create(telegram_id=100, username='user', password='x',
+                                        trial_status=User.TrialStatus.IN_PROGRESS, trial_end_date=self.end)
+
+    def send(self, *statuses):
+        replies = iter(statuses)
+
+        def handler(request):
+            code = next(replies)
+            return httpx.Response(code, text='Too Many Requests') if code == 429 else httpx.Response(code, json={})
+        return send_reminders(self.kind, timedelta(hours=24), transport=httpx.MockTransport(handler))
+
+    def notification(self):
+        return Notification.objects.get(user=self.user, kind=self.kind)
+
+    def test_pending_row_left_by_a_crash_is_sent(self):
+        Notification.objects.create(user=self.user, kind=self.kind, end_date=self.end)
+        self.assertEqual(self.send(200), (1, 0))
+        self.assertEqual(self.notification().status, Notification.Status.SENT)
+        self.assertEqual(self.send(), (0, 0))
+
+    def test_non_json_429_does_not_abort_the_run(self):
+        self.assertEqual(self.send(429), (0, 1))
+        self.assertEqual(self.notification().status, Notification.Status.PENDING)
+        self.assertEqual(self.send(200), (1, 0))
+
+    def test_transient_errors_are_retried_up_to_the_cap(self):
+        self.send(502)
+        self.assertEqual(self.notification().status, Notification.Status.PENDING)
+        self.send(502)
+        self.assertEqual(self.notification().status, Notification.Status.FAILED)
+        self.assertEqual(self.notification().attempts, 2)
+        self.assertEqual(self.send(), (0, 0))
+
+    def test_permanent_errors_are_not_retried(self):
+        self.send(403)
+        self.assertEqual(self.notification().status, Notification.Status.FAILED)
+        self.assertEqual(self.send(), (0, 0))
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=1, username='user', password='x')
+        self.client = make_client(self.user)
+
+    def sync(self, since):
+        response = self.client.get('/api/sync/', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_sequence_is_per_user(self):
+        start = int(self.sync(0)['next'])
+        other = User.objects.create(telegram_id=2, username='other', password='x')
+        record_change(other.id, 'profile', other.id)
+        record_changes(self.user.id, 'training', [10, 11])
+        first = self.sync(start)
+        self.assertEqual(first['next'], str(start + 2))
+        self.assertEqual(first['deleted'], {})
+
+        record_changes(self.user.id, 'training', [11], deleted=True)
+        second = self.sync(first['next'])
+        self.assertEqual((second['next'], second['deleted']), (str(start + 3), {'trainings': [11]}))
+        self.assertEqual(self.sync(second['next'])['next'], str(start + 3))
+
+    def test_merge_writes_tombstones_for_duplicates(self):
+        canonical, duplicate = Dish.objects.bulk_create([
+            Dish(name=name, callories=100, fats=1, proteins=1, carbohydrates=1) for name in ('Борщ', 'Борщь')])
+        SavedDish.objects.create(user=self.user, dish=duplicate)
+        token = self.sync(0)['next']
+
+        merge_dishes(canonical.id, [duplicate.id])
+        changes = self.sync(token)
+        self.assertEqual(changes['deleted'], {'saved_dishes': [duplicate.id]})
+        self.assertEqual([row['id'] for row in changes['changed']['saved_dishes']], [canonical.id])
+
+    def test_merge_query_count_does_not_depend_on_users(self):
+        def merge_queries(users):
+            canonical, duplicate = Dish.objects.bulk_create([
+                Dish(name=name, callories=100, fats=1, proteins=1, carbohydrates=1) for name in ('Щи', 'Щи')])
+            SavedDish.objects.bulk_create([SavedDish(user=user, dish=duplicate) for user in users])
+            with CaptureQueriesContext(connection) as queries:
+                merge_dishes(canonical.id, [duplicate.id])
+            return len(queries)
+
+        users = User.objects.bulk_create([User(telegram_id=100 + index, username=f'bulk{index}', password='x')
+                                          for index in range(50)])
+        self.assertEqual(merge_queries(users[:1]), merge_queries(users[1:]))
+        record_change(users[0].id, 'profile', users[0].id)
+        seqs = list(SyncChange.objects.filter(user=users[0]).order_by('seq').values_list('entity', 'seq'))
+        self.assertEqual([seq for _, seq in seqs], [1, 2, 3])
+
+
+class TrialAdminActionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=1, username='user', password='x')
+        self.user.start_trial()
+        self.client = make_client(self.user)
+        self.admin = UserAdmin(User, AdminSite())
+        self.request = RequestFactory().post('/admin/')
+
+    def test_deactivate_trial_invalidates_etag_and_records_changes(self):
+        etag = self.client.get('/api/subscription/trial/status/')['ETag']
+        since = self.client.get('/api/sync/', {'since': 0}).json()['next']
+        with mock.patch.object(UserAdmin, 'message_user'):
+            self.admin.deactivate_trial(self.request, User.objects.filter(pk=self.user.pk))
+
+        self.assertEqual(User.objects.get(pk=self.user.pk).trial_status, 'ENDED')
+        response = self.client.get('/api/subscription/trial/status/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        profile, = self.client.get('/api/sync/', {'since': since}).json()['changed']['profile']
+        self.assertEqual(profile['trial_status'], 'ENDED')
+        self.assertTrue(OutboxEvent.objects.filter(event_type='entitlement.trial_ended', key=str(self.user.id)).exists())
+
+    def test_activate_trial_publishes_event(self):
+        user = User.objects.create(telegram_id=2, username='new', password='x')
+        with mock.patch.object(UserAdmin, 'message_user'):
+            self.admin.activate_trial(self.request, User.objects.filter(pk=user.pk))
+        self.assertEqual(User.objects.get(pk=user.pk).trial_status, 'IN_PROGRESS')
+        self.assertTrue(OutboxEvent.objects.filter(event_type='entitlement.trial_started', key=str(user.id)).exists())
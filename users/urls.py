@@ -1,11 +1,16 @@
 from django.urls import path
 
-from .views import TMAAuthView, UserUpdateView, TrialStartView, TrialStatusView, ProfileView
+from .views import (TMAAuthView, UserUpdateView, TrialStartView, TrialStatusView, ProfileView, UserExportView,
+                    BodyMeasurementView, MeasurementChartView, SyncView)
 
 urlpatterns = [
     path('auth/tma/', TMAAuthView.as_view(), name='tma-auth'),
     path('update-profile/', UserUpdateView.as_view(), name='user-update'),
     path('profile/', ProfileView.as_view(), name='profile'),
+    path('export/', UserExportView.as_view(), name='user-export'),
+    path('measurements/', BodyMeasurementView.as_view(), name='measurements'),
+    path('measurements/chart/', MeasurementChartView.as_view(), name='measurements-chart'),
+    path('sync/', SyncView.as_view(), name='sync'),
     path('subscription/trial/status/', TrialStatusView.as_view(), name='trial-status'),
     path('subscription/trial/start/', TrialStartView.as_view(), name='trial-start'),
 ]
@@ -1,5 +1,9 @@
 from django.contrib.auth import get_user_model
 from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.utils.timezone import now
 from django.utils.crypto import get_random_string
 from rest_framework import permissions, status
@@ -7,7 +11,17 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .serializers import UserUpdateSerializer, ProfileSerializer
+from core.downsampling import lttb
+from core.fieldsets import SparseFieldsMixin
+from core.outbox import publish_event
+from core.models import SyncChange
+from core.renderers import ORJSONRenderer
+from core.sync import record_change
+from core.throttling import TOKEN_BUCKET_THROTTLES
+from .export import EXPORT_FORMATS
+from .models import BodyMeasurement
+from .sync import collect_changes
+from .serializers import UserUpdateSerializer, ProfileSerializer, BodyMeasurementSerializer
 from .tma import extract_user_from_init_data, TMAValidationError, TMATokenExpired
 
 User = get_user_model()
@@ -20,6 +34,8 @@ def get_tokens_for_user(user):
 
 class TMAAuthView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = TOKEN_BUCKET_THROTTLES
+    throttle_scope = 'tma-auth'
 
     def post(self, request):
         auth_header = request.headers.get("Authorization", "")
@@ -58,6 +74,7 @@ class TMAAuthView(APIView):
                                                         last_name=user_data.get("last_name") or "",
                                                         language_code=user_data.get("language_code", "ru"),
                                                         is_bot=user_data.get("is_bot", False), )
+                        publish_event('user.signed_up', user.id, {'telegram_id': telegram_id})
                     except TypeError:
                         user = User.objects.create(username=username, telegram_id=telegram_id,
                                                    telegram_username=user_data.get("username"),
@@ -67,6 +84,7 @@ class TMAAuthView(APIView):
                                                    is_bot=user_data.get("is_bot", False), password=random_password, )
                         user.set_password(random_password)
                         user.save(update_fields=["password"])
+                        publish_event('user.signed_up', user.id, {'telegram_id': telegram_id})
 
                     except IntegrityError:
                         try:
@@ -126,19 +144,42 @@ class UserUpdateView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ProfileView(APIView):
+def profile_etag(request):
+    fields = request.query_params.get('fields', '')
+    return f"profile-{request.user.pk}-{request.user.updated_at.timestamp()}-{fields}"
+
+
+def profile_last_modified(request):
+    return request.user.updated_at
+
+
+def trial_status_etag(request):
+    # Статус меняется и без записи в БД — когда проходит trial_end_date
+    trial_end_date = request.user.trial_end_date
+    trial_active = bool(trial_end_date and trial_end_date > now())
+    return f"trial-{request.user.pk}-{request.user.updated_at.timestamp()}-{int(trial_active)}"
+
+
+class ProfileView(SparseFieldsMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
+    use_read_replica = True
+    sparse_fields = tuple(ProfileSerializer.Meta.fields)
 
+    @method_decorator(condition(etag_func=profile_etag, last_modified_func=profile_last_modified))
     def get(self, request):
         user = request.user
 
-        serializer = ProfileSerializer(user)
+        # meta не загружен при аутентификации и читается, только если попал в ?fields= (или fields не задан)
+        serializer = ProfileSerializer(user, fields=self.requested_fields)
         return Response(serializer.data)
 
 
 class TrialStatusView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    use_read_replica = True
 
+    @method_decorator(condition(etag_func=trial_status_etag))
     def get(self, request):
         user = request.user
         if hasattr(user, 'trial_end_date') and user.trial_end_date:
@@ -162,6 +203,100 @@ class TrialStartView(APIView):
             return Response({"detail": "Trial has already ended", "trial_status": user.trial_status},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        user.start_trial()
+        with transaction.atomic():
+            user.start_trial()
+            publish_event('entitlement.trial_started', user.id, {'trial_end_date': user.trial_end_date},
+                          compaction_key=f'entitlement:trial_started:{user.id}')
 
         return Response({"detail": "Trial started", "trial_ends": user.trial_end_date}, status=status.HTTP_201_CREATED)
+
+
+class UserExportView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        export_format = request.query_params.get('export_format', 'json')
+        if export_format not in EXPORT_FORMATS:
+            return Response({"detail": f"export_format must be one of: {', '.join(EXPORT_FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Сжатие gzip на лету делает GZipMiddleware, если клиент его принимает
+        stream, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(stream(request.user), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="foodmind_export_{request.user.id}.{export_format}"'
+        return response
+
+
+class BodyMeasurementView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = BodyMeasurementSerializer(data=request.data)
+        if serializer.is_valid():
+            with transaction.atomic():
+                measurement = serializer.save(user=request.user)
+                measurement.mirror_to_user()
+                record_change(request.user.id, 'measurement', measurement.id)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class MeasurementChartView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
+    use_read_replica = True
+    min_points = 3  # меньше LTTB не умеет: первая, последняя и хотя бы одна точка между ними
+    max_points = 500
+
+    def get(self, request):
+        field = request.query_params.get('field', 'weight')
+        if field not in BodyMeasurement.CHART_FIELDS:
+            return Response({"detail": f"field must be one of: {', '.join(BodyMeasurement.CHART_FIELDS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            points = min(max(int(request.query_params.get('points', 300)), self.min_points), self.max_points)
+        except ValueError:
+            return Response({"detail": "points must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        measurements = request.user.measurements.filter(**{f'{field}__isnull': False})
+        for param, lookup in (('since', 'measured_at__gte'), ('until', 'measured_at__lte')):
+            value = request.query_params.get(param)
+            if value:
+                moment = parse_datetime(value)
+                if moment is None:
+                    return Response({"detail": f"{param} must be an ISO datetime"}, status=status.HTTP_400_BAD_REQUEST)
+                measurements = measurements.filter(**{lookup: moment})
+
+        series = [(measured_at.timestamp(), float(value), measured_at) for measured_at, value in
+                  measurements.order_by('measured_at').values_list('measured_at', field).iterator(chunk_size=2000)]
+        sampled = lttb(series, points)
+        return Response({"field": field, "total": len(series),
+                         "points": [[measured_at, value] for _, value, measured_at in sampled]})
+
+
+class SyncView(APIView):
+    """
+    Дельта-синхронизация: ?since=<token> возвращает только сущности, изменённые после токена,
+    и id удалённых. Если has_more, следующую пачку нужно запросить с since=next.
+    Первая синхронизация — since=0.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [ORJSONRenderer]
+    max_limit = 1000
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = min(int(request.query_params.get('limit', 500)), self.max_limit)
+        except ValueError:
+            return Response({"detail": "since and limit must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or limit < 1:
+            return Response({"detail": "since must be >= 0 and limit >= 1"}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = list(SyncChange.objects.filter(user=request.user, seq__gt=since).order_by('seq')
+                    .values_list('seq', 'entity', 'entity_id', 'deleted')[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        payload = collect_changes(request.user, [row[1:] for row in rows])
+        return Response({**payload, 'next': str(rows[-1][0] if rows else since), 'has_more': has_more})